@@ -0,0 +1,171 @@
+# Collection throughput benchmark against the local CFBD stand-in
+#
+# Run from the project root:
+#   python -m benchmarks.bench_collection --start-year 2015 --end-year 2023 --latency 0.05
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from benchmarks.cfbd_stub_server import start_stub_server
+from src.data import api_client, collection, fetch_executor, fetch_metrics, response_cache, warehouse
+
+
+def count_rows(tables):
+    if not os.path.exists(warehouse.DB_FILE):
+        return 0
+    conn = sqlite3.connect(warehouse.DB_FILE)
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    total = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables if table in existing)
+    conn.close()
+    return total
+
+def get_stages(start_year, end_year, division=collection.BULK_DIVISION):
+    # (stage name, callable, warehouse tables it writes)
+    return [
+        ('games', lambda: collection.fetch_games(start_year, end_year, use_last_season=False, division=division), ['games']),
+        ('team_game_stats', lambda: collection.fetch_team_game_stats(start_year, end_year, use_last_season=False, division=division), ['team_game_stats']),
+        ('advanced_team_game_stats', lambda: collection.fetch_advanced_team_game_stats(start_year, end_year, use_last_season=False), ['advanced_team_game_stats']),
+        ('ratings', lambda: collection.fetch_all_ratings(start_year, end_year, use_last_season=False), ['elo_ratings', 'fpi_ratings', 'sp_ratings', 'srs_ratings']),
+        ('team_talent', lambda: collection.fetch_team_talent(start_year, end_year, use_last_season=False), ['team_talent']),
+        ('team_recruiting', lambda: collection.fetch_team_recruiting(start_year, end_year, use_last_season=False), ['team_recruiting']),
+        ('betting_lines', lambda: collection.fetch_betting_lines(start_year, end_year, use_last_season=False), ['betting_lines']),
+        ('pregame_win_probabilities', lambda: collection.fetch_pregame_win_probabilities(start_year, end_year, use_last_season=False), ['pregame_win_probabilities']),
+        ('calendar', lambda: collection.get_calendar(start_year, end_year), ['calendar'])
+    ]
+
+def run_benchmark(start_year, end_year, latency=0.05, jitter=0.0, error_rate=0.0, workers=None,
+                  requests_per_second=None, fixtures_dir=None, verbose=False, metrics_dir=None,
+                  division=collection.BULK_DIVISION, stages=None):
+    """
+    Run every collection stage against a fresh warehouse and the local stand-in server.
+
+    Per-call metrics for the whole run are written to metrics_dir (JSON summary and
+    Prometheus textfile), or to a temporary directory when it is not given. division=None runs games and box scores with one
+    request per conference instead of one division-wide request; stages limits the run to
+    the named stages.
+
+    Returns:
+    list: One dict per stage with calls, rows, wall time, calls/sec and rows/sec.
+    """
+    server, state = start_stub_server(
+        latency=latency, jitter=jitter, error_rate=error_rate, retry_after=0, fixtures_dir=fixtures_dir
+    )
+    tmp_dir = tempfile.TemporaryDirectory()
+    original_settings = (warehouse.DB_FILE, response_cache.CACHE_FILE, response_cache.CACHE_MODE, api_client.API_HOST)
+
+    warehouse.DB_FILE = os.path.join(tmp_dir.name, 'college_football.db')
+    response_cache.CACHE_FILE = os.path.join(tmp_dir.name, 'cfbd_responses.db')
+    response_cache.set_cache_mode('disabled')
+    api_client.API_HOST = f"http://127.0.0.1:{server.server_port}"
+    api_client.close_api_client()
+    fetch_executor.configure_fetch_executor(max_workers=workers, requests_per_second=requests_per_second)
+
+    report = []
+    # Every collector is its own metrics_run; wrapping the stages makes them one run
+    metrics_dir = metrics_dir or tmp_dir.name
+    try:
+        with fetch_metrics.metrics_run(
+            os.path.join(metrics_dir, 'collection_metrics.json'), os.path.join(metrics_dir, 'collection_metrics.prom')
+        ):
+            for name, stage, tables in get_stages(start_year, end_year, division):
+                if stages and name not in stages:
+                    continue
+                before = state.counters()
+                started = time.perf_counter()
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    stage()
+                wall_time = time.perf_counter() - started
+                after = state.counters()
+                if verbose:
+                    print(output.getvalue())
+
+                calls = after['requests'] - before['requests']
+                rows = count_rows(tables)
+                report.append({
+                    'stage': name,
+                    'calls': calls,
+                    'rate_limited': after['rate_limited'] - before['rate_limited'],
+                    'bytes': after['bytes_sent'] - before['bytes_sent'],
+                    'rows': rows,
+                    'wall_time': wall_time,
+                    'calls_per_sec': calls / wall_time if wall_time else 0.0,
+                    'rows_per_sec': rows / wall_time if wall_time else 0.0
+                })
+    finally:
+        warehouse.DB_FILE, response_cache.CACHE_FILE, cache_mode, api_client.API_HOST = original_settings
+        response_cache.set_cache_mode(cache_mode)
+        api_client.close_api_client()
+        warehouse.close_connection()
+        server.shutdown()
+        tmp_dir.cleanup()
+    return report
+
+def print_report(report):
+    print(f"{'stage':<28}{'calls':>8}{'429s':>6}{'rows':>10}{'wall (s)':>10}{'calls/s':>10}{'rows/s':>12}")
+    for stage in report:
+        print(f"{stage['stage']:<28}{stage['calls']:>8}{stage['rate_limited']:>6}{stage['rows']:>10}"
+              f"{stage['wall_time']:>10.2f}{stage['calls_per_sec']:>10.1f}{stage['rows_per_sec']:>12.1f}")
+    total_calls = sum(stage['calls'] for stage in report)
+    total_rows = sum(stage['rows'] for stage in report)
+    total_time = sum(stage['wall_time'] for stage in report)
+    print(f"{'total':<28}{total_calls:>8}{'':>6}{total_rows:>10}{total_time:>10.2f}"
+          f"{total_calls / total_time:>10.1f}{total_rows / total_time:>12.1f}")
+
+def compare_bulk_mode(start_year, end_year, **settings):
+    """Run the games and box score stages per conference and division-wide, and print the difference."""
+    stages = ['games', 'team_game_stats']
+    collection._bulk_unsupported.clear()
+    fanout = run_benchmark(start_year, end_year, division=None, stages=stages, **settings)
+    bulk = run_benchmark(start_year, end_year, stages=stages, **settings)
+    print(f"{'stage':<28}{'calls':>14}{'wall (s)':>18}{'rows':>14}")
+    for before, after in zip(fanout, bulk):
+        print(f"{before['stage']:<28}{before['calls']:>6} -> {after['calls']:<5}"
+              f"{before['wall_time']:>9.2f} -> {after['wall_time']:<6.2f}{before['rows']:>6} -> {after['rows']:<6}")
+    calls_before, calls_after = sum(stage['calls'] for stage in fanout), sum(stage['calls'] for stage in bulk)
+    time_before, time_after = sum(stage['wall_time'] for stage in fanout), sum(stage['wall_time'] for stage in bulk)
+    print(f"Calls: {calls_before} -> {calls_after} ({1 - calls_after / calls_before:.0%} fewer); "
+          f"wall time: {time_before:.2f}s -> {time_after:.2f}s ({1 - time_after / time_before:.0%} less)")
+    return fanout, bulk
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fetch_* collectors against a local CFBD stand-in")
+    parser.add_argument('--start-year', type=int, default=2015)
+    parser.add_argument('--end-year', type=int, default=2023)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every stub response")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of stub responses that are 429s")
+    parser.add_argument('--workers', type=int, default=None, help="Fetch executor threads")
+    parser.add_argument('--rps', type=float, default=1000.0, help="Token-bucket rate limit for the run")
+    parser.add_argument('--fixtures', default=None, help="Directory of recorded responses")
+    parser.add_argument('--json', default=None, help="Also write the report to this JSON file")
+    parser.add_argument('--metrics', default=None, help="Directory for the per-endpoint metrics JSON and Prometheus textfile")
+    parser.add_argument('--compare-bulk', action='store_true', help="Compare per-conference and division-wide games/box score fetches")
+    parser.add_argument('--verbose', action='store_true', help="Show collector output")
+    args = parser.parse_args()
+
+    if args.compare_bulk:
+        compare_bulk_mode(
+            args.start_year, args.end_year, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+            workers=args.workers, requests_per_second=args.rps, fixtures_dir=args.fixtures, verbose=args.verbose
+        )
+        return
+
+    report = run_benchmark(
+        args.start_year, args.end_year, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        workers=args.workers, requests_per_second=args.rps, fixtures_dir=args.fixtures, verbose=args.verbose,
+        metrics_dir=args.metrics
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
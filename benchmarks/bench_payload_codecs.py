@@ -0,0 +1,104 @@
+# Payload codec benchmark: warehouse size and read throughput per codec
+#
+# Run from the project root:
+#   python -m benchmarks.bench_payload_codecs --start-year 2015 --end-year 2023 --archive
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import tempfile
+import time
+from benchmarks.cfbd_stub_server import SyntheticSeason
+from src.data import warehouse
+from src.data.payload_codecs import available_codecs
+
+
+def snake_case(value):
+    # The stand-in server answers in the API's camelCase; the warehouse stores cfbd's snake_case
+    if isinstance(value, dict):
+        return {re.sub(r'(?<!^)(?=[A-Z])', '_', key).lower(): snake_case(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [snake_case(item) for item in value]
+    return value
+
+def build_records(start_year, end_year):
+    """Return {table: records} for the stand-in seasons, shaped like the collectors store them."""
+    records = {'games': [], 'team_game_stats': [], 'advanced_team_game_stats': [], 'betting_lines': []}
+    for year in range(start_year, end_year + 1):
+        season = SyntheticSeason(year)
+        for game in season.games:
+            records['games'].append(game)
+            records['team_game_stats'].append(snake_case(season.team_game_stats(game)))
+            records['advanced_team_game_stats'].extend(snake_case(season.advanced_stats(game)))
+            records['betting_lines'].append(snake_case(season.lines(game)))
+    return records
+
+def store(records):
+    with warehouse.transaction():
+        warehouse.store_raw_data(records['games'], 'games')
+        warehouse.store_team_game_stats(records['team_game_stats'], 'team_game_stats')
+        warehouse.store_advanced_team_game_stats(records['advanced_team_game_stats'], 'advanced_team_game_stats')
+        warehouse.store_raw_data(records['betting_lines'], 'betting_lines')
+
+def run_codec(codec, records, archive=False, repeat=3):
+    """Store records with one codec in a fresh warehouse and time full-table reads."""
+    tmp_dir = tempfile.TemporaryDirectory()
+    original_settings = (warehouse.DB_FILE, warehouse.PAYLOAD_CODEC, warehouse.ARCHIVE_RAW_JSON)
+    warehouse.DB_FILE = os.path.join(tmp_dir.name, 'college_football.db')
+    warehouse.PAYLOAD_CODEC = codec
+    warehouse.ARCHIVE_RAW_JSON = archive
+    try:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            store(records)
+        write_time = time.perf_counter() - started
+        warehouse.create_connection().execute("VACUUM")
+        size = os.path.getsize(warehouse.DB_FILE)
+
+        rows = sum(len(table_records) for table_records in records.values())
+        read_times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for table_name in records:
+                warehouse.fetch_raw_data(table_name)
+            read_times.append(time.perf_counter() - started)
+        read_time = min(read_times)
+        return {
+            'codec': codec,
+            'archive': archive,
+            'rows': rows,
+            'db_bytes': size,
+            'write_time': write_time,
+            'read_time': read_time,
+            'read_rows_per_sec': rows / read_time if read_time else 0.0
+        }
+    finally:
+        warehouse.close_connection()
+        warehouse.DB_FILE, warehouse.PAYLOAD_CODEC, warehouse.ARCHIVE_RAW_JSON = original_settings
+        tmp_dir.cleanup()
+
+def print_report(report):
+    baseline = report[0]
+    print(f"{'codec':<12}{'archive':>8}{'DB MB':>9}{'size':>7}{'write s':>9}{'read s':>8}{'rows/s':>10}{'speed':>7}")
+    for result in report:
+        print(f"{result['codec']:<12}{str(result['archive']):>8}{result['db_bytes'] / 1e6:>9.2f}"
+              f"{result['db_bytes'] / baseline['db_bytes']:>7.0%}{result['write_time']:>9.2f}{result['read_time']:>8.2f}"
+              f"{result['read_rows_per_sec']:>10.0f}{baseline['read_time'] / result['read_time']:>6.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare warehouse payload codecs against plain JSON")
+    parser.add_argument('--start-year', type=int, default=2015)
+    parser.add_argument('--end-year', type=int, default=2023)
+    parser.add_argument('--archive', action='store_true', help="Also keep each record in a data column")
+    parser.add_argument('--codecs', nargs='*', default=None, help="Codecs to compare; defaults to every installed codec")
+    args = parser.parse_args()
+
+    records = build_records(args.start_year, args.end_year)
+    codecs = args.codecs or available_codecs()
+    print_report([run_codec(codec, records, archive=args.archive) for codec in codecs])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Team game stats benchmark: row-by-row vs columnar expansion of the nested 'teams' column,
+# for collection.process_team_game_stats and transformations.transform_team_game_stats
+#
+# Run from the project root:
+#   python -m benchmarks.bench_team_game_stats --start-year 2000 --end-year 2023
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.bench_payload_codecs import snake_case
+from benchmarks.cfbd_stub_server import SyntheticSeason
+from src.data.collection import process_team_game_stats, to_numeric_or_keep
+from src.data.transformations import get_field, pivot_team_stats, transform_team_game_stats
+
+
+def row_process_team_game_stats(df):
+    # collection.process_team_game_stats before it was vectorized
+    df = df.explode('teams')
+    df = pd.concat([df.drop(['teams'], axis=1), df['teams'].apply(pd.Series)], axis=1)
+    df = df.rename(columns={'school_id': 'team_id', 'school': 'team_name', 'conference': 'team_conference'})
+
+    def process_stats(stats):
+        if isinstance(stats, list):
+            return {item['category']: item['stat'] for item in stats if isinstance(item, dict) and 'category' in item and 'stat' in item}
+        return {}
+
+    stats_df = df['stats'].apply(process_stats).apply(pd.Series)
+    df = pd.concat([df.drop('stats', axis=1), stats_df], axis=1)
+    numeric_columns = df.columns.drop(['id', 'team_id', 'team_name', 'team_conference', 'home_away'])
+    # Same conversion as before; pd.to_numeric(errors='ignore') is gone from current pandas
+    df[numeric_columns] = df[numeric_columns].apply(to_numeric_or_keep)
+    return df
+
+def columnar_transform_team_game_stats(json_data):
+    # transform_team_game_stats built like process_team_game_stats: one explode of the teams,
+    # the team fields read column-wise and the stats pivoted with pivot_team_stats. It gives the
+    # same frame as the row loop but is slower, so the loop is kept
+    games = pd.DataFrame({'id': get_field(json_data, 'id'), 'teams': get_field(json_data, 'teams')})
+    has_teams = np.array([isinstance(teams, list) for teams in games['teams']], dtype=bool)
+    teams = games[has_teams].explode('teams').dropna(subset=['teams'])
+    team_list = list(teams['teams'])
+    df = pd.DataFrame({'id': teams['id'].to_numpy()})
+    for field in ['school_id', 'school', 'conference', 'home_away', 'points']:
+        df[field] = [team.get(field, '') for team in team_list]
+    stats_df = pivot_team_stats(pd.Series([team.get('stats', []) for team in team_list], dtype=object))
+    return pd.concat([df, stats_df], axis=1)
+
+def build_records(start_year, end_year):
+    """Return the stand-in seasons' team_game_stats records, shaped like the warehouse stores them."""
+    records = []
+    for year in range(start_year, end_year + 1):
+        season = SyntheticSeason(year)
+        records.extend(snake_case(season.team_game_stats(game)) for game in season.games)
+    return records
+
+def best_time(fn, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(arg)
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare row-by-row and columnar team game stats expansion")
+    parser.add_argument('--start-year', type=int, default=2000)
+    parser.add_argument('--end-year', type=int, default=2023)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    records = build_records(args.start_year, args.end_year)
+    # get_team_game_stats_df hands process_team_game_stats the (id, teams) frame read_raw_data returns
+    frame = pd.DataFrame({'id': [record['id'] for record in records], 'teams': [record['teams'] for record in records]})
+    print(f"{args.end_year - args.start_year + 1} seasons, {len(records)} games")
+    row_time, expected = best_time(row_process_team_game_stats, frame, args.repeat)
+    columnar_time, result = best_time(process_team_game_stats, frame, args.repeat)
+    pd.testing.assert_frame_equal(result, expected)
+    print(f"process_team_game_stats    rows: {row_time:.3f}s  columnar: {columnar_time:.3f}s  speedup: {row_time / columnar_time:.2f}x")
+
+    # transform_table hands transform_team_game_stats the decoded records
+    row_time, expected = best_time(transform_team_game_stats, records, args.repeat)
+    columnar_time, result = best_time(columnar_transform_team_game_stats, records, args.repeat)
+    pd.testing.assert_frame_equal(result, expected)
+    print(f"transform_team_game_stats  rows: {row_time:.3f}s  columnar: {columnar_time:.3f}s  speedup: {row_time / columnar_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+# Local CFBD API stand-in for offline collection benchmarks
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Query abbreviation -> name used in records; two non-Power 5 FBS conferences give
+# division-wide queries something to filter out
+CONFERENCES = {
+    'SEC': 'SEC',
+    'B1G': 'Big Ten',
+    'ACC': 'ACC',
+    'B12': 'Big 12',
+    'PAC': 'Pac-12',
+    'AAC': 'American Athletic',
+    'MWC': 'Mountain West'
+}
+TEAMS_PER_CONFERENCE = 14
+REGULAR_SEASON_WEEKS = 12
+BOWL_GAMES = 20
+LINE_PROVIDERS = ['consensus', 'Bovada']
+
+
+def team_name(conference, index):
+    return f"{conference} Team {index + 1}"
+
+def all_teams():
+    return [(team_name(conference, index), name) for conference, name in CONFERENCES.items() for index in range(TEAMS_PER_CONFERENCE)]
+
+def team_id(team):
+    return zlib.crc32(team.encode('utf-8')) % 100000
+
+
+class SyntheticSeason:
+    """Deterministic schedule and stats for one season of the FBS conferences in CONFERENCES."""
+
+    def __init__(self, year):
+        self.year = year
+        self.rng = random.Random(year)
+        self.teams = all_teams()
+        self.games = self.build_games()
+
+    def build_games(self):
+        games = []
+        teams = list(self.teams)
+        for week in range(1, REGULAR_SEASON_WEEKS + 1):
+            # Rotate the pairing every week so conferences meet each other and play inside
+            self.rng.shuffle(teams)
+            for index in range(0, len(teams), 2):
+                games.append(self.build_game(len(games), teams[index], teams[index + 1], week, 'regular'))
+        for index in range(BOWL_GAMES):
+            home, away = self.rng.sample(self.teams, 2)
+            games.append(self.build_game(len(games), home, away, 1, 'postseason'))
+        return games
+
+    def build_game(self, index, home, away, week, season_type):
+        (home_team, home_conference), (away_team, away_conference) = home, away
+        return {
+            'id': self.year * 10000 + index,
+            'season': self.year,
+            'week': week,
+            'season_type': season_type,
+            'start_date': f"{self.year}-09-{min(week, 28):02d}T19:00:00.000Z",
+            'start_time_tbd': False,
+            'completed': True,
+            'neutral_site': season_type == 'postseason',
+            'conference_game': home_conference == away_conference,
+            'attendance': self.rng.randint(20000, 100000),
+            'venue_id': team_id(home_team) % 1000,
+            'venue': f"{home_team} Stadium",
+            'home_id': team_id(home_team),
+            'home_team': home_team,
+            'home_conference': home_conference,
+            'home_division': 'fbs',
+            'home_points': self.rng.randint(0, 56),
+            'home_line_scores': [self.rng.randint(0, 14) for _ in range(4)],
+            'home_post_win_prob': round(self.rng.random(), 4),
+            'home_pregame_elo': self.rng.randint(1200, 2200),
+            'home_postgame_elo': self.rng.randint(1200, 2200),
+            'away_id': team_id(away_team),
+            'away_team': away_team,
+            'away_conference': away_conference,
+            'away_division': 'fbs',
+            'away_points': self.rng.randint(0, 56),
+            'away_line_scores': [self.rng.randint(0, 14) for _ in range(4)],
+            'away_post_win_prob': round(self.rng.random(), 4),
+            'away_pregame_elo': self.rng.randint(1200, 2200),
+            'away_postgame_elo': self.rng.randint(1200, 2200),
+            'excitement_index': round(self.rng.random() * 10, 2),
+            'highlights': None,
+            'notes': None
+        }
+
+    def filter_games(self, query):
+        games = self.games
+        if 'seasonType' in query:
+            games = [game for game in games if game['season_type'] == query['seasonType']]
+        if 'week' in query:
+            games = [game for game in games if game['week'] == int(query['week'])]
+        if 'conference' in query:
+            conference = CONFERENCES.get(query['conference'], query['conference'])
+            games = [game for game in games if conference in (game['home_conference'], game['away_conference'])]
+        # Every synthetic team is FBS
+        division = query.get('division') or query.get('classification')
+        if division:
+            games = [game for game in games if division in (game['home_division'], game['away_division'])]
+        return games
+
+    def team_game_stats(self, game):
+        teams = []
+        for side in ['home', 'away']:
+            rng = random.Random(game['id'] * 2 + (side == 'away'))
+            teams.append({
+                'schoolId': game[f'{side}_id'],
+                'school': game[f'{side}_team'],
+                'conference': game[f'{side}_conference'],
+                'homeAway': side,
+                'points': game[f'{side}_points'],
+                'stats': [
+                    {'category': 'totalYards', 'stat': str(rng.randint(150, 650))},
+                    {'category': 'netPassingYards', 'stat': str(rng.randint(50, 450))},
+                    {'category': 'rushingYards', 'stat': str(rng.randint(20, 350))},
+                    {'category': 'rushingAttempts', 'stat': str(rng.randint(15, 55))},
+                    {'category': 'firstDowns', 'stat': str(rng.randint(8, 35))},
+                    {'category': 'turnovers', 'stat': str(rng.randint(0, 5))},
+                    {'category': 'thirdDownEff', 'stat': f"{rng.randint(2, 9)}-{rng.randint(10, 18)}"},
+                    {'category': 'completionAttempts', 'stat': f"{rng.randint(10, 30)}-{rng.randint(31, 45)}"},
+                    {'category': 'totalPenaltiesYards', 'stat': f"{rng.randint(2, 12)}-{rng.randint(15, 110)}"},
+                    {'category': 'possessionTime', 'stat': f"{rng.randint(22, 38)}:{rng.randint(0, 59):02d}"}
+                ]
+            })
+        return {'id': game['id'], 'teams': teams}
+
+    def advanced_stats(self, game):
+        rows = []
+        for side, other in [('home', 'away'), ('away', 'home')]:
+            rng = random.Random(game['id'] * 3 + (side == 'away'))
+
+            def unit():
+                plays = {'ppa': rng.uniform(-0.5, 0.8), 'successRate': rng.random(), 'explosiveness': rng.uniform(0.8, 1.8)}
+                totals = dict(plays, totalPPA=rng.uniform(-20, 40))
+                return {
+                    'plays': rng.randint(50, 90), 'drives': rng.randint(8, 16),
+                    'ppa': rng.uniform(-0.5, 0.8), 'totalPPA': rng.uniform(-20, 40),
+                    'successRate': rng.random(), 'explosiveness': rng.uniform(0.8, 1.8),
+                    'powerSuccess': rng.random(), 'stuffRate': rng.random(),
+                    'lineYards': rng.uniform(1, 4), 'lineYardsTotal': rng.uniform(30, 150),
+                    'secondLevelYards': rng.uniform(0, 2), 'secondLevelYardsTotal': rng.randint(0, 60),
+                    'openFieldYards': rng.uniform(0, 2), 'openFieldYardsTotal': rng.randint(0, 80),
+                    'standardDowns': plays, 'passingDowns': plays,
+                    'rushingPlays': totals, 'passingPlays': totals
+                }
+
+            rows.append({
+                'gameId': game['id'], 'season': game['season'], 'week': game['week'],
+                'team': game[f'{side}_team'], 'opponent': game[f'{other}_team'],
+                'offense': unit(), 'defense': unit()
+            })
+        return rows
+
+    def lines(self, game):
+        rng = random.Random(game['id'] * 5)
+        spread = round(rng.uniform(-21, 21) * 2) / 2
+        return {
+            'id': game['id'], 'season': game['season'], 'week': game['week'], 'seasonType': game['season_type'],
+            'startDate': game['start_date'], 'homeTeam': game['home_team'], 'homeConference': game['home_conference'],
+            'homeScore': game['home_points'], 'awayTeam': game['away_team'], 'awayConference': game['away_conference'],
+            'awayScore': game['away_points'],
+            'lines': [
+                {
+                    'provider': provider, 'spread': spread, 'formattedSpread': f"{game['home_team']} {spread}",
+                    'spreadOpen': spread + 0.5, 'overUnder': 52.5, 'overUnderOpen': 51.5,
+                    'homeMoneyline': -150, 'awayMoneyline': 130
+                }
+                for provider in LINE_PROVIDERS
+            ]
+        }
+
+    def pregame_win_probability(self, game):
+        rng = random.Random(game['id'] * 7)
+        return {
+            'season': game['season'], 'seasonType': game['season_type'], 'week': game['week'],
+            'gameId': game['id'], 'homeTeam': game['home_team'], 'awayTeam': game['away_team'],
+            'spread': round(rng.uniform(-21, 21), 1), 'homeWinProb': round(rng.random(), 3)
+        }
+
+    def calendar(self):
+        weeks = [
+            {
+                'season': self.year, 'week': week, 'seasonType': 'regular',
+                'firstGameStart': f"{self.year}-09-{min(week, 28):02d}T16:00:00.000Z",
+                'lastGameStart': f"{self.year}-09-{min(week, 28):02d}T23:00:00.000Z"
+            }
+            for week in range(1, REGULAR_SEASON_WEEKS + 1)
+        ]
+        weeks.append({
+            'season': self.year, 'week': 1, 'seasonType': 'postseason',
+            'firstGameStart': f"{self.year}-12-20T16:00:00.000Z", 'lastGameStart': f"{self.year + 1}-01-08T00:00:00.000Z"
+        })
+        return weeks
+
+    def team_ratings(self, rating_type):
+        rows = []
+        for index, (team, conference) in enumerate(self.teams):
+            rng = random.Random(self.year * 1000 + index)
+            row = {'year': self.year, 'team': team, 'conference': conference}
+            if rating_type == 'elo':
+                row['elo'] = rng.randint(1200, 2200)
+            elif rating_type == 'fpi':
+                row['fpi'] = round(rng.uniform(-20, 30), 1)
+            elif rating_type == 'sp':
+                row.update({'rating': round(rng.uniform(-20, 30), 1), 'ranking': index + 1})
+            elif rating_type == 'srs':
+                row.update({'division': None, 'rating': round(rng.uniform(-20, 30), 1), 'ranking': index + 1})
+            rows.append(row)
+        return rows
+
+    def talent(self):
+        return [
+            {'year': self.year, 'school': team, 'talent': round(random.Random(self.year + index).uniform(400, 1000), 2)}
+            for index, (team, _) in enumerate(self.teams)
+        ]
+
+    def recruiting(self):
+        return [
+            {'year': self.year, 'rank': index + 1, 'team': team, 'points': round(300 - index * 2.5, 2)}
+            for index, (team, _) in enumerate(self.teams)
+        ]
+
+
+class StubState:
+    """Server settings plus counters the benchmark reads between stages."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, retry_after=1, fixtures_dir=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.fixtures_dir = fixtures_dir
+        self.rng = random.Random(seed)
+        self.seasons = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.bytes_sent = 0
+
+    def season(self, year):
+        with self.lock:
+            if year not in self.seasons:
+                self.seasons[year] = SyntheticSeason(year)
+            return self.seasons[year]
+
+    def counters(self):
+        with self.lock:
+            return {'requests': self.requests, 'rate_limited': self.rate_limited, 'bytes_sent': self.bytes_sent}
+
+
+def fixture_path(fixtures_dir, path, query):
+    # Recorded responses are stored as <path with / replaced by _>__<sorted query>.json
+    name = path.strip('/').replace('/', '_') + '__' + '&'.join(f"{key}={query[key]}" for key in sorted(query))
+    return os.path.join(fixtures_dir, name + '.json')
+
+# Filters the real API insists on: at least one of these must be present
+REQUIRED_FILTERS = {'/games/teams': ['week', 'team', 'conference']}
+
+def synthetic_response(state, path, query):
+    year = int(query.get('year', 0))
+    season = state.season(year)
+    if path == '/games':
+        return season.filter_games(query)
+    if path == '/games/teams':
+        return [season.team_game_stats(game) for game in season.filter_games(query)]
+    if path == '/stats/game/advanced':
+        return [row for game in season.filter_games(query) for row in season.advanced_stats(game)]
+    if path == '/lines':
+        return [season.lines(game) for game in season.filter_games(query)]
+    if path == '/metrics/wp/pregame':
+        return [season.pregame_win_probability(game) for game in season.filter_games(query)]
+    if path == '/calendar':
+        return season.calendar()
+    if path.startswith('/ratings/'):
+        return season.team_ratings(path.rsplit('/', 1)[1])
+    if path == '/talent':
+        return season.talent()
+    if path == '/recruiting/teams':
+        return season.recruiting()
+    return None
+
+
+def make_handler(state):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+
+            delay = state.latency + (state.rng.uniform(0, state.jitter) if state.jitter else 0)
+            if delay:
+                time.sleep(delay)
+
+            with state.lock:
+                state.requests += 1
+                rate_limited = state.error_rate and state.rng.random() < state.error_rate
+                if rate_limited:
+                    state.rate_limited += 1
+            if rate_limited:
+                self.send_json(429, {'message': 'Too Many Requests'}, {'Retry-After': str(state.retry_after)})
+                return
+
+            body = None
+            if state.fixtures_dir:
+                path = fixture_path(state.fixtures_dir, parsed.path, query)
+                if os.path.exists(path):
+                    with open(path) as f:
+                        body = json.load(f)
+            required = REQUIRED_FILTERS.get(parsed.path)
+            if body is None and required and not any(key in query for key in required):
+                self.send_json(400, {'message': f"Either {', '.join(required)} must be specified"})
+                return
+            if body is None:
+                body = synthetic_response(state, parsed.path, query)
+            if body is None:
+                self.send_json(404, {'message': f"Unknown endpoint {parsed.path}"})
+                return
+            self.send_json(200, body)
+
+        def send_json(self, status, body, headers=None):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+            with state.lock:
+                state.bytes_sent += len(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_server(host='127.0.0.1', port=0, **settings):
+    """
+    Start the stand-in server on a background thread.
+
+    Args:
+    host (str): Interface to bind.
+    port (int): Port to bind; 0 picks a free port.
+    **settings: StubState options (latency, jitter, error_rate, retry_after, fixtures_dir, seed).
+
+    Returns:
+    tuple: (server, state). The API base URL is f"http://{host}:{server.server_port}".
+    """
+    state = StubState(**settings)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic or recorded CFBD API responses")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency of up to this many seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument('--fixtures', default=None, help="Directory of recorded responses to serve first")
+    args = parser.parse_args()
+
+    server, _ = start_stub_server(
+        args.host, args.port,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        retry_after=args.retry_after, fixtures_dir=args.fixtures
+    )
+    print(f"CFBD stand-in listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# CFBD API Client
+
+import os
+import threading
+import cfbd
+import urllib3
+from dotenv import load_dotenv
+from . import fetch_executor
+from .fetch_metrics import record_response_bytes
+
+# Keep-alive connections held open to the CFBD API; None means one per fetch worker,
+# read from fetch_executor.MAX_WORKERS whenever the pool is built
+POOL_SIZE = None
+
+# Base URL of the API; point this at a local stand-in for offline benchmarks
+API_HOST = 'https://api.collegefootballdata.com'
+
+# urllib3 retries connection errors itself, but no responses: its default Retry would resend
+# a 429 or 503 after sleeping out its Retry-After, unseen by fetch_executor.call_with_retries,
+# which pauses every worker on it and counts it in the collection metrics
+API_RETRIES = urllib3.Retry(total=3, status_forcelist=None, respect_retry_after_header=False)
+
+_api_key = None
+_api_client = None
+_lock = threading.Lock()
+
+
+class MeteredApiClient(cfbd.ApiClient):
+    """
+    cfbd.ApiClient that reports each response body's size to the collection metrics.
+
+    Its pool uses API_RETRIES, so 429 and 5xx responses reach call_with_retries as ApiExceptions.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rest_client.pool_manager.connection_pool_kw['retries'] = API_RETRIES
+
+    def request(self, *args, **kwargs):
+        response = super().request(*args, **kwargs)
+        if isinstance(response.data, str):
+            record_response_bytes(len(response.data.encode('utf-8')))
+        return response
+
+
+def load_api_key():
+    global _api_key
+    if _api_key is None:
+        load_dotenv()
+        _api_key = os.getenv("API_KEY")
+    return _api_key
+
+def configure_api(api_key, pool_size=None):
+    configuration = cfbd.Configuration()
+    configuration.api_key['Authorization'] = api_key
+    configuration.api_key_prefix['Authorization'] = 'Bearer'
+    configuration.host = API_HOST
+    configuration.connection_pool_maxsize = pool_size or POOL_SIZE or fetch_executor.MAX_WORKERS
+    return configuration
+
+def get_api_client(pool_size=None):
+    """
+    Return the process-wide cfbd.ApiClient, creating it on first use.
+
+    All API families share this client, so a collection run loads credentials once
+    and reuses one urllib3 keep-alive pool for every request.
+
+    Args:
+    pool_size (int, optional): Connections kept in the pool. Only used when the
+    client is first created; call close_api_client() to rebuild with a new size.
+    Without it, a client whose pool is smaller than the current fetch worker count
+    (after configure_fetch_executor raised it) is rebuilt, since urllib3 would discard
+    the connections of the extra workers and open new ones for every request.
+
+    Returns:
+    cfbd.ApiClient: The shared client.
+    """
+    global _api_client
+    with _lock:
+        if (_api_client is not None and pool_size is None and POOL_SIZE is None
+                and _api_client.configuration.connection_pool_maxsize < fetch_executor.MAX_WORKERS):
+            _api_client.rest_client.pool_manager.clear()
+            _api_client = None
+        if _api_client is None:
+            configuration = configure_api(load_api_key(), pool_size)
+            # cfbd builds a Configuration for every deserialized model; copying a default
+            # is several times cheaper than constructing one from scratch
+            cfbd.Configuration.set_default(configuration)
+            _api_client = MeteredApiClient(configuration)
+        return _api_client
+
+def close_api_client():
+    global _api_client
+    with _lock:
+        if _api_client is not None:
+            _api_client.rest_client.pool_manager.clear()
+        _api_client = None
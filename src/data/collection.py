@@ -1,18 +1,32 @@
 import cfbd
 from cfbd.rest import ApiException
-import os
-from dotenv import load_dotenv
 import pandas as pd
-import random
 import time
+from datetime import datetime, timezone
+from .api_client import get_api_client
+from .response_cache import cached_api_call
+from .response_cache import current_season
+from collections import Counter, namedtuple
+from itertools import groupby
+from operator import itemgetter
+from .fetch_executor import WorkUnit, Partition, call_with_retries, get_rate_limiter, iter_work_units, run_work_units, stream_partitions
+from .fetch_metrics import fallback_endpoint, get_metrics, metrics_run, take_response_bytes
+from .transformations import pivot_team_stats
 from .warehouse import (
     store_raw_data,
+    store_raw_partitions,
     get_last_update,
-    fetch_raw_data,
+    read_raw_data,
     store_calendar_data,
     fetch_calendar_data,
     store_team_game_stats,
-    store_advanced_team_game_stats
+    store_advanced_team_game_stats,
+    record_fetch,
+    get_complete_partitions,
+    record_failed_units,
+    clear_failed_units,
+    get_failed_units,
+    transaction
 )
 
 # Define Power 5 conferences
@@ -24,144 +38,245 @@ POWER_5_CONFERENCES = {
     'Pac-12': 'PAC'
 }
 
+# Conference names as they appear in game records, used to filter division-wide responses
+POWER_5_NAMES = set(POWER_5_CONFERENCES)
+
+# Division queried by the bulk games and box score fetches; None falls back to one request per conference
+BULK_DIVISION = 'fbs'
+
+SEASON_TYPES = ['regular', 'postseason']
+
+# Work unit of the combined ratings fetch; the remaining fields keep it compatible with WorkUnit
+RatingUnit = namedtuple('RatingUnit', ['year', 'rating_type', 'conference', 'season_type', 'week'], defaults=(None, None, None))
+
+# Endpoints that rejected a division-wide query with a 400 during this process
+_bulk_unsupported = set()
+
+def get_season_types(season_type=None):
+    return [season_type] if season_type is not None else SEASON_TYPES
+
+def get_pending_units(endpoint, units):
+    # Skip partitions the fetch manifest already marks as complete
+    complete = get_complete_partitions(endpoint)
+    pending = [unit for unit in units if (unit.year, unit.week, unit.season_type) not in complete]
+    if len(pending) < len(units):
+        print(f"Skipping {len(units) - len(pending)} {endpoint} requests for partitions already complete")
+    return pending
+
+def get_partial_partitions(units):
+    # Partitions being fetched with only some of their conferences (a resume of failed conference
+    # requests) already hold the other conferences' rows, so their records are appended instead
+    counts = Counter(Partition(unit.year, unit.season_type, unit.week) for unit in units if unit.conference is not None)
+    return {partition for partition, count in counts.items() if count < len(POWER_5_CONFERENCES)}
+
+def get_conference_units(years, season_types, week=None, division=None):
+    # With a division, each partition is one division-wide request instead of one per conference
+    conferences = [None] if division else POWER_5_CONFERENCES.values()
+    return [
+        WorkUnit(year, conference, season_type, week)
+        for year in years
+        for season_type in season_types
+        for conference in conferences
+    ]
+
+def is_power_5_game(game):
+    return game.get('home_conference') in POWER_5_NAMES or game.get('away_conference') in POWER_5_NAMES
+
+def is_power_5_box_score(game):
+    return any(team.get('conference') in POWER_5_NAMES for team in game.get('teams') or [])
+
+def fetch_conference_unit(endpoint, api_method, unit, division_param, division, keep, description=None):
+    """
+    Fetch one WorkUnit of a conference-filtered endpoint.
+
+    Units with a conference make a single conference request. Units without one make a
+    division-wide request and keep the records matching keep(), which gives the same records
+    as the five conference requests in one call. If the API rejects the division query with
+    a 400, the unit falls back to the conference requests, and so do later units of the endpoint.
+    Each fallback request is retried and metered on its own under fallback_endpoint(description)
+    (description is the API method name, defaulting to endpoint); the unit's call counts the
+    fallback instead of the requests, so request totals are not inflated.
+    """
+    params = dict(year=unit.year, week=unit.week, season_type=unit.season_type)
+    description = description or endpoint
+    if unit.conference is not None:
+        return cached_api_call(endpoint, api_method, conference=unit.conference, **params)
+    if endpoint not in _bulk_unsupported:
+        started = time.perf_counter()
+        try:
+            records = cached_api_call(endpoint, api_method, **{division_param: division}, **params)
+            return [record for record in records if keep(record)]
+        except ApiException as e:
+            if e.status != 400:
+                raise
+            print(f"Division-wide {endpoint} request rejected ({e.reason}); falling back to one request per conference")
+            _bulk_unsupported.add(endpoint)
+            # The rejected request is the unit's own call; record_fallback keeps the executor from recording it again
+            get_metrics().record_call(description, unit.year, unit.season_type, time.perf_counter() - started,
+                                      response_bytes=take_response_bytes(), error=True)
+    records = []
+    try:
+        for conference in POWER_5_CONFERENCES.values():
+            records.extend(call_with_retries(
+                lambda conference_unit: cached_api_call(endpoint, api_method, conference=conference_unit.conference, **params),
+                unit._replace(conference=conference), get_rate_limiter(), fallback_endpoint(description)
+            ))
+    finally:
+        get_metrics().record_fallback(description, unit.year, unit.season_type)
+    return records
+
+def record_partition(endpoint, stream, summary):
+    # Called inside the same transaction() as the partition's store_* call, so the data and
+    # its manifest entry are committed together
+    partition = stream.partition
+    if stream.duplicates:
+        print(f"Removed {stream.duplicates} duplicate {endpoint} records for year {partition.year} {partition.season_type or ''}".rstrip())
+    # Checkpoint failed units for resume_failed_fetches and clear the ones that succeeded
+    record_failed_units(endpoint, stream.failures)
+    clear_failed_units(endpoint, stream.succeeded_units)
+    # Partitions with a failed unit are left out of the manifest so the next run refetches them
+    if stream.complete:
+        record_fetch(
+            endpoint, partition.year, summary,
+            week=partition.week, season_type=partition.season_type,
+            complete=partition.year < current_season()
+        )
+
 #! maybe remove
 def convert_to_dataframe(games):
     return pd.DataFrame([game.to_dict() for game in games])
 
-def load_api_key():
-    load_dotenv()
-    return os.getenv("API_KEY")
-
-def configure_api(api_key):
-    configuration = cfbd.Configuration()
-    configuration.api_key['Authorization'] = api_key
-    configuration.api_key_prefix['Authorization'] = 'Bearer'
-    return configuration
-
 def initialize_games_api():
-    api_key = load_api_key()
-    configuration = configure_api(api_key)
-    return cfbd.GamesApi(cfbd.ApiClient(configuration))
+    return cfbd.GamesApi(get_api_client())
 
 def initialize_stats_api():
-    api_key = load_api_key()
-    configuration = configure_api(api_key)
-    return cfbd.StatsApi(cfbd.ApiClient(configuration))
+    return cfbd.StatsApi(get_api_client())
 
 def initialize_teams_api():
-    api_key = load_api_key()
-    configuration = configure_api(api_key)
-    return cfbd.TeamsApi(cfbd.ApiClient(configuration))
+    return cfbd.TeamsApi(get_api_client())
 
 def initialize_ratings_api():
-    api_key = load_api_key()
-    configuration = configure_api(api_key)
-    return cfbd.RatingsApi(cfbd.ApiClient(configuration))
+    return cfbd.RatingsApi(get_api_client())
 
 def initialize_metrics_api():
-    api_key = load_api_key()
-    configuration = configure_api(api_key)
-    return cfbd.MetricsApi(cfbd.ApiClient(configuration))
+    return cfbd.MetricsApi(get_api_client())
 
 def initialize_recruiting_api():
-    api_key = load_api_key()
-    configuration = configure_api(api_key)
-    return cfbd.RecruitingApi(cfbd.ApiClient(configuration))
+    return cfbd.RecruitingApi(get_api_client())
 
 def initialize_betting_api():
-    api_key = load_api_key()
-    configuration = configure_api(api_key)
-    return cfbd.BettingApi(cfbd.ApiClient(configuration))
-
-def fetch_games(start_year, end_year, games_api, use_last_season=True):
-    last_season = get_last_update('games') if use_last_season else None
-    
-    # If we have data, start from the last season
-    if last_season is not None:
-        start_year = last_season
-    
-    for year in range(start_year, end_year + 1):
-        year_games = []
-        for conference in POWER_5_CONFERENCES.values():
-            try:
-                # Fetch regular season games
-                regular_games = games_api.get_games(year=year, conference=conference, season_type='regular')
-                if regular_games:
-                    year_games.extend(regular_games)
-                    print(f"Successfully fetched regular season games for {year}, conference: {conference}")
-                else:
-                    print(f"No regular season games found for {year}, conference: {conference}")
-                
-                # Fetch postseason games
-                postseason_games = games_api.get_games(year=year, conference=conference, season_type='postseason')
-                if postseason_games:
-                    year_games.extend(postseason_games)
-                    print(f"Successfully fetched postseason games for {year}, conference: {conference}")
-                else:
-                    print(f"No postseason games found for {year}, conference: {conference}")
-                
-            except ApiException as e:
-                print(f"Exception when calling GamesApi->get_games for year {year}, conference {conference}: {e}\n")
+    return cfbd.BettingApi(get_api_client())
+
+@metrics_run()
+def fetch_games(start_year, end_year, games_api=None, use_last_season=True, week=None, season_type=None, units=None, division=BULK_DIVISION):
+    games_api = games_api or initialize_games_api()
+    if units is None:
+        # A week-scoped update fetches exactly the requested week, so skip the resume point
+        last_season = get_last_update('games') if use_last_season and week is None else None
+        
+        # If we have data, start from the last season
+        if last_season is not None:
+            start_year = last_season
         
-        if year_games:
-            games_data = [game.to_dict() for game in year_games]
-            # Update or append data for this specific year
-            store_raw_data(games_data, 'games', year=year)
-            print(f"Updated/Appended data for year {year}")
+        units = get_pending_units('games', get_conference_units(
+            range(start_year, end_year + 1), get_season_types(season_type), week, division
+        ))
+    partial_partitions = get_partial_partitions(units)
+    results = iter_work_units(
+        units,
+        lambda unit: fetch_conference_unit(
+            'games', games_api.get_games, unit, 'division', division, is_power_5_game, 'GamesApi->get_games'
+        ),
+        'GamesApi->get_games'
+    )
+    
+    # A game between two Power 5 conferences is returned by both conference requests
+    duplicates = 0
+    for stream in stream_partitions(results, key=itemgetter('id')):
+        with transaction():
+            partition = stream.partition
+            if partition in partial_partitions:
+                summary = store_raw_data(stream, 'games')
+            else:
+                # Update or append data for this specific year, season type and week
+                summary = store_raw_data(stream, 'games', year=partition.year, week=partition.week, season_type=partition.season_type)
+            if summary.row_count:
+                print(f"Updated/Appended data for year {partition.year} {partition.season_type} season")
+            record_partition('games', stream, summary)
+            duplicates += stream.duplicates
 
-    print("Finished fetching games data")
+    print(f"Finished fetching games data ({duplicates} duplicate games removed)")
 
-def fetch_team_game_stats(start_year, end_year, use_last_season=True):
+@metrics_run()
+def fetch_team_game_stats(start_year, end_year, use_last_season=True, week=None, season_type=None, units=None, division=BULK_DIVISION):
     api_instance = initialize_games_api()
-    last_season = get_last_update('games') if use_last_season else None
-    
-    # Set minimum year to 2004
-    MIN_YEAR = 2004
-    start_year = max(start_year, MIN_YEAR)
-    
-    # If we have data, start from the last season
-    if last_season is not None:
-        start_year = last_season
-    
-    for year in range(start_year, end_year + 1):
-        year_stats = []
-        for conference in POWER_5_CONFERENCES.values():
-            for season_type in ['regular', 'postseason']:
-                try:
-                    team_stats = api_instance.get_team_game_stats(
-                        year=year,
-                        conference=conference,
-                        season_type=season_type
-                    )
-                    year_stats.extend(team_stats)
-                    print(f"Successfully fetched team game stats for {year}, conference: {conference}, season type: {season_type}")
-                except ApiException as e:
-                    print(f"Exception when calling GamesApi->get_team_game_stats for year {year}, conference {conference}, season type {season_type}: {e}\n")
-                    print(f"Response body: {e.body}\n")
-                
-                time.sleep(1)  # Add a delay to avoid hitting rate limits
+    if units is None:
+        last_season = get_last_update('team_game_stats') if use_last_season and week is None else None
+        
+        # Set minimum year to 2004
+        MIN_YEAR = 2004
+        start_year = max(start_year, MIN_YEAR)
+        
+        # If we have data, start from the last season
+        if last_season is not None:
+            start_year = last_season
         
-        if year_stats:
-            stats_data = [stat.to_dict() for stat in year_stats]
-            store_team_game_stats(stats_data, 'team_game_stats')
-            print(f"Updated/Appended team game stats data for year {year}")
+        # /games/teams rejects a classification query without a week, team or conference, so
+        # only week-scoped updates make the division-wide request; full seasons go per conference
+        units = get_pending_units('team_game_stats', get_conference_units(
+            range(start_year, end_year + 1), get_season_types(season_type), week, division if week is not None else None
+        ))
+    results = iter_work_units(
+        units,
+        lambda unit: fetch_conference_unit(
+            'games/teams', api_instance.get_team_game_stats, unit, 'classification', division, is_power_5_box_score,
+            'GamesApi->get_team_game_stats'
+        ),
+        'GamesApi->get_team_game_stats'
+    )
     
-    print("Finished fetching team game stats data")
+    # Box scores are per game, so cross-conference games come back from both conference requests
+    duplicates = 0
+    for stream in stream_partitions(results, key=itemgetter('id')):
+        with transaction():
+            partition = stream.partition
+            summary = store_team_game_stats(stream, 'team_game_stats', year=partition.year)
+            if summary.row_count:
+                print(f"Updated/Appended team game stats data for year {partition.year} {partition.season_type} season")
+            record_partition('team_game_stats', stream, summary)
+            duplicates += stream.duplicates
+    
+    print(f"Finished fetching team game stats data ({duplicates} duplicate games removed)")
+
+def get_games_df(start_year=None, end_year=None, season_type=None, columns=None):
+    # Only the requested seasons and columns are read; see warehouse.iter_raw_data
+    return read_raw_data('games', start_year=start_year, end_year=end_year, season_type=season_type, columns=columns)
 
-def get_games_df():
-    raw_data = fetch_raw_data('games')
-    return pd.DataFrame(raw_data)
+def get_team_game_stats_df(start_year=None, end_year=None, season_type=None):
+    # The read chunks are joined before processing, so every stat column is converted once over
+    # all of its values and the dtypes and column order do not depend on the chunk size
+    df = read_raw_data('team_game_stats', start_year=start_year, end_year=end_year, season_type=season_type)
+    return process_team_game_stats(df) if not df.empty else pd.DataFrame()
 
-def get_team_game_stats_df():
-    raw_data = fetch_raw_data('team_game_stats')
-    df = pd.DataFrame(raw_data)
-    return process_team_game_stats(df)
+def to_numeric_or_keep(column):
+    # pd.to_numeric(errors='ignore'): convert the column if every value parses, else leave it
+    try:
+        return pd.to_numeric(column)
+    except (ValueError, TypeError):
+        return column
 
 def process_team_game_stats(df):
-    # Expand the 'teams' column
+    # Expand the 'teams' column: one row per team, keeping the game row's index
     df = df.explode('teams')
-    df = pd.concat([df.drop(['teams'], axis=1), 
-                    df['teams'].apply(pd.Series)], axis=1)
+    index = df.index
+    teams = df.pop('teams')
+
+    # Team fields and stats are built column-wise, the stats pivoted to one column per category
+    team_df = pd.DataFrame([team if isinstance(team, dict) else {} for team in teams])
+    stats_df = pivot_team_stats(team_df.pop('stats')) if 'stats' in team_df else pd.DataFrame(index=team_df.index)
+
+    df = pd.concat([df.reset_index(drop=True), team_df, stats_df], axis=1)
+    df.index = index
 
     # Rename columns for clarity
     df = df.rename(columns={
@@ -170,107 +285,107 @@ def process_team_game_stats(df):
         'conference': 'team_conference'
     })
 
-    # Function to safely process stats
-    def process_stats(stats):
-        if isinstance(stats, list):
-            return {item['category']: item['stat'] for item in stats if isinstance(item, dict) and 'category' in item and 'stat' in item}
-        return {}
-
-    # Explode the 'stats' column
-    stats_df = df['stats'].apply(process_stats).apply(pd.Series)
-
-    # Merge the exploded stats back into the main dataframe
-    df = pd.concat([df.drop('stats', axis=1), stats_df], axis=1)
-
     # Convert numeric columns to appropriate types
     numeric_columns = df.columns.drop(['id', 'team_id', 'team_name', 'team_conference', 'home_away'])
-    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='ignore')
+    df[numeric_columns] = df[numeric_columns].apply(to_numeric_or_keep)
 
     return df
 
-def fetch_advanced_team_game_stats(start_year, end_year, stats_api, use_last_season=True):
-    last_season = get_last_update('games') if use_last_season else None
-    
-    # Set minimum year to 2004
-    MIN_YEAR = 2004
-    start_year = max(start_year, MIN_YEAR)
-    
-    # If we have data, start from the last season
-    if last_season is not None:
-        start_year = last_season
-    
-    for year in range(start_year, end_year + 1):
-        year_stats = []
-        for season_type in ['regular', 'postseason']:
-            try:
-                advanced_stats = stats_api.get_advanced_team_game_stats(
-                    year=year,
-                    exclude_garbage_time=True,
-                    season_type=season_type
-                )
-                year_stats.extend([stat.to_dict() for stat in advanced_stats])
-                print(f"Successfully fetched advanced team game stats for {year} {season_type} season")
-            except ApiException as e:
-                print(f"Exception when calling StatsApi->get_advanced_team_game_stats for year {year} {season_type} season: {e}\n")
-                print(f"Response body: {e.body}\n")
-                
-            time.sleep(1)  # Add a delay to avoid hitting rate limits
+@metrics_run()
+def fetch_advanced_team_game_stats(start_year, end_year, stats_api=None, use_last_season=True, week=None, season_type=None, units=None):
+    stats_api = stats_api or initialize_stats_api()
+    if units is None:
+        last_season = get_last_update('advanced_team_game_stats') if use_last_season and week is None else None
         
-        if year_stats:
-            store_advanced_team_game_stats(year_stats, 'advanced_team_game_stats')
-            print(f"Updated/Appended advanced team game stats data for year {year}")
+        # Set minimum year to 2004
+        MIN_YEAR = 2004
+        start_year = max(start_year, MIN_YEAR)
+        
+        # If we have data, start from the last season
+        if last_season is not None:
+            start_year = last_season
+        
+        units = get_pending_units('advanced_team_game_stats', [
+            WorkUnit(year, season_type=unit_season_type, week=week)
+            for year in range(start_year, end_year + 1)
+            for unit_season_type in get_season_types(season_type)
+        ])
+    results = iter_work_units(
+        units,
+        lambda unit: cached_api_call(
+            'stats/game/advanced', stats_api.get_advanced_team_game_stats,
+            year=unit.year, week=unit.week, exclude_garbage_time=True, season_type=unit.season_type
+        ),
+        'StatsApi->get_advanced_team_game_stats'
+    )
+    
+    duplicates = 0
+    for stream in stream_partitions(results, key=itemgetter('game_id', 'team')):
+        with transaction():
+            partition = stream.partition
+            summary = store_advanced_team_game_stats(stream, 'advanced_team_game_stats')
+            if summary.row_count:
+                print(f"Updated/Appended advanced team game stats data for year {partition.year} {partition.season_type} season")
+            record_partition('advanced_team_game_stats', stream, summary)
+            duplicates += stream.duplicates
     
-    print("Finished fetching advanced team game stats data")
+    print(f"Finished fetching advanced team game stats data ({duplicates} duplicate team games removed)")
 
 
-def fetch_team_talent(start_year, end_year, api_instance, use_last_season=True):
-    last_season = get_last_update('games') if use_last_season else None
-    
-    # Ensure start_year is at least 2015
-    start_year = max(2015, start_year)
-    
-    # If we have data, start from the last season
-    if last_season is not None:
-        start_year = max(2015, last_season)
+@metrics_run()
+def fetch_team_talent(start_year, end_year, api_instance=None, use_last_season=True, units=None):
+    api_instance = api_instance or initialize_teams_api()
+    last_season = get_last_update('team_talent') if use_last_season else None
+    if units is None:
+        # Ensure start_year is at least 2015
+        start_year = max(2015, start_year)
+        
+        # If we have data, start from the last season
+        if last_season is not None:
+            start_year = max(2015, last_season)
+        
+        units = get_pending_units('team_talent', [WorkUnit(year) for year in range(start_year, end_year + 1)])
+    results = iter_work_units(
+        units,
+        lambda unit: cached_api_call('talent', api_instance.get_talent, year=unit.year),
+        'TeamsApi->get_talent'
+    )
     
-    for year in range(start_year, end_year + 1):
-        try:
-            talent = api_instance.get_talent(year=year)
-            talent_data = [item.to_dict() for item in talent]
-            
+    for stream in stream_partitions(results):
+        with transaction():
+            year = stream.partition.year
             # Include 'year' in each data item
-            for item in talent_data:
-                item['year'] = year
-            
+            talent_data = (dict(item, year=year) for item in stream)
+        
             if last_season is not None and year == last_season:
                 # Replace data for the last season
-                store_raw_data(talent_data, 'team_talent', if_exists='replace', year=year)
+                summary = store_raw_data(talent_data, 'team_talent', if_exists='replace', year=year)
                 print(f"Replaced team talent data for year {year}")
             else:
                 # Append data for new years
-                store_raw_data(talent_data, 'team_talent', if_exists='append', year=year)
+                summary = store_raw_data(talent_data, 'team_talent', if_exists='append', year=year)
                 print(f"Appended team talent data for year {year}")
-            
-            print(f"Successfully fetched team talent data for {year}")
-        except ApiException as e:
-            print(f"Exception when calling TeamsApi->get_talent for year {year}: {e}\n")
+            record_partition('team_talent', stream, summary)
     
     print("Finished fetching team talent data")
 
 
 
-def fetch_calendar(year, games_api):
-    try:
-        calendar = games_api.get_calendar(year)
-        calendar_data = [week.to_dict() for week in calendar]
-        store_calendar_data(calendar_data, year)
-        print(f"Successfully fetched and stored calendar data for {year}")
-        return calendar_data
-    except ApiException as e:
-        print(f"Exception when calling GamesApi->get_calendar for year {year}: {e}\n")
+def fetch_calendar(year, games_api=None):
+    games_api = games_api or initialize_games_api()
+    # A single work unit, so the call gets the executor's retries and metrics
+    [(_, calendar_data, error)] = run_work_units(
+        [WorkUnit(year)],
+        lambda unit: cached_api_call('calendar', games_api.get_calendar, year=unit.year),
+        'GamesApi->get_calendar'
+    )
+    if error is not None:
         return None
+    store_calendar_data(calendar_data, year)
+    print(f"Successfully fetched and stored calendar data for {year}")
+    return calendar_data
 
-def get_calendar(start_year, end_year, games_api):
+def get_calendar(start_year, end_year, games_api=None):
     all_calendar_data = []
     for year in range(start_year, end_year + 1):
         # First, try to fetch from the database
@@ -285,136 +400,257 @@ def get_calendar(start_year, end_year, games_api):
     
     return all_calendar_data
 
-def fetch_ratings(start_year, end_year, ratings_api, rating_type):
-    for year in range(start_year, end_year + 1):
-        all_data = []
-        try:
-            if rating_type == 'elo':
-                ratings = ratings_api.get_elo_ratings(year=year)
-            elif rating_type == 'fpi':
-                ratings = ratings_api.get_fpi_ratings(year=year)
-            elif rating_type == 'sp':
-                ratings = ratings_api.get_sp_ratings(year=year)
-            elif rating_type == 'srs':
-                ratings = ratings_api.get_srs_ratings(year=year)
-            else:
-                raise ValueError(f"Unknown rating type: {rating_type}")
-            
-            data = [rating.to_dict() for rating in ratings]
-            all_data.extend(data)
-            print(f"Successfully fetched {rating_type.upper()} ratings for {year}")
-        except ApiException as e:
-            print(f"Exception when calling RatingsApi->get_{rating_type}_ratings for year {year}: {e}\n")
+def get_rating_methods(ratings_api):
+    return {
+        'elo': ratings_api.get_elo_ratings,
+        'fpi': ratings_api.get_fpi_ratings,
+        'sp': ratings_api.get_sp_ratings,
+        'srs': ratings_api.get_srs_ratings
+    }
+
+def fetch_rating_types(units_by_type, ratings_api=None):
+    """
+    Fetch several rating types in one run of the fetch executor.
+
+    Every (rating type, year) request shares the executor's workers and rate limit, so
+    rating types and years are fetched in parallel. Each rating type is written to its
+    table in a single batched transaction.
+
+    Args:
+    units_by_type (dict): Rating type ('elo', 'fpi', 'sp' or 'srs') -> list of WorkUnits.
+    ratings_api (cfbd.RatingsApi, optional): Defaults to a client from initialize_ratings_api().
+    """
+    ratings_api = ratings_api or initialize_ratings_api()
+    rating_methods = get_rating_methods(ratings_api)
+    for rating_type in units_by_type:
+        if rating_type not in rating_methods:
+            raise ValueError(f"Unknown rating type: {rating_type}")
+    
+    units = [
+        RatingUnit(unit.year, rating_type)
+        for rating_type, type_units in units_by_type.items()
+        for unit in type_units
+    ]
+    results = iter_work_units(
+        units,
+        lambda unit: cached_api_call(f'ratings/{unit.rating_type}', rating_methods[unit.rating_type], year=unit.year),
+        lambda unit: f'RatingsApi->get_{unit.rating_type}_ratings'
+    )
+    
+    # Units are ordered by rating type, so each group is one table's worth of years
+    for rating_type, type_results in groupby(results, key=lambda result: result[0].rating_type):
+        table_name = f'{rating_type}_ratings'
+        streams = []
         
-        time.sleep(1)  # Add a delay to avoid hitting rate limits
+        def partitions(type_results=type_results):
+            for stream in stream_partitions(type_results):
+                streams.append(stream)
+                yield stream.partition.year, stream
         
-        if all_data:
-            # Delete existing data for the specific year and rating type
-            store_raw_data(all_data, f'{rating_type}_ratings', if_exists='replace', year=year)
-            print(f"Successfully stored {rating_type.upper()} ratings data for year {year}")
-
-
-def fetch_all_ratings(start_year, end_year, ratings_api, use_last_season=True):
-    last_season = get_last_update('games') if use_last_season else None
-    
+        with transaction():
+            summaries = store_raw_partitions(partitions(), table_name)
+            for stream in streams:
+                record_partition(table_name, stream, summaries[stream.partition.year])
+        stored = sum(summary.row_count for summary in summaries.values())
+        if stored:
+            print(f"Successfully stored {stored} {rating_type.upper()} ratings for {len(streams)} years")
+
+@metrics_run()
+def fetch_ratings(start_year, end_year, ratings_api, rating_type, units=None):
+    if units is None:
+        units = get_pending_units(f'{rating_type}_ratings', [WorkUnit(year) for year in range(start_year, end_year + 1)])
+    fetch_rating_types({rating_type: units}, ratings_api)
+
+
+@metrics_run()
+def fetch_all_ratings(start_year, end_year, ratings_api=None, use_last_season=True):
     # Set minimum year to 2004
     MIN_YEAR = 2004
     start_year = max(start_year, MIN_YEAR)
     
-    # If we have data, start from the last season
-    if last_season is not None:
-        start_year = last_season
-    
+    units_by_type = {}
     for rating_type in ['elo', 'fpi', 'sp', 'srs']:
-        fetch_ratings(start_year, end_year, ratings_api, rating_type)
+        # Each rating type resumes from its own last stored season
+        table_name = f'{rating_type}_ratings'
+        last_season = get_last_update(table_name) if use_last_season else None
+        units_by_type[rating_type] = get_pending_units(
+            table_name, [WorkUnit(year) for year in range(last_season or start_year, end_year + 1)]
+        )
+    fetch_rating_types(units_by_type, ratings_api)
     print("Finished fetching all ratings data")
 
 
-def fetch_pregame_win_probabilities(start_year, end_year, metrics_api, use_last_season=True):
-    last_season = get_last_update('pregame_win_probabilities') if use_last_season else None
-    
-    # If we have data, start from the last season
-    if last_season is not None:
-        start_year = last_season
-    
-    for year in range(start_year, end_year + 1):
-        year_probabilities = []
-        for season_type in ['regular', 'postseason']:
-            try:
-                probabilities = metrics_api.get_pregame_win_probabilities(
-                    year=year,
-                    season_type=season_type
-                )
-                year_probabilities.extend([prob.to_dict() for prob in probabilities])
-                print(f"Successfully fetched pregame win probabilities for {year} {season_type} season")
-            except ApiException as e:
-                print(f"Exception when calling MetricsApi->get_pregame_win_probabilities for year {year} {season_type} season: {e}\n")
-            
-            time.sleep(1)  # Add a delay to avoid hitting rate limits
+@metrics_run()
+def fetch_pregame_win_probabilities(start_year, end_year, metrics_api=None, use_last_season=True, units=None):
+    metrics_api = metrics_api or initialize_metrics_api()
+    if units is None:
+        last_season = get_last_update('pregame_win_probabilities') if use_last_season else None
         
-        if year_probabilities:
-            # Update or append data for this specific year
-            store_raw_data(year_probabilities, 'pregame_win_probabilities', year=year)
-            print(f"Updated/Appended pregame win probabilities data for year {year}")
+        # If we have data, start from the last season
+        if last_season is not None:
+            start_year = last_season
+        
+        units = get_pending_units('pregame_win_probabilities', [
+            WorkUnit(year, season_type=season_type)
+            for year in range(start_year, end_year + 1)
+            for season_type in SEASON_TYPES
+        ])
+    results = iter_work_units(
+        units,
+        lambda unit: cached_api_call(
+            'metrics/wp/pregame', metrics_api.get_pregame_win_probabilities,
+            year=unit.year, season_type=unit.season_type
+        ),
+        'MetricsApi->get_pregame_win_probabilities'
+    )
+    
+    for stream in stream_partitions(results):
+        with transaction():
+            partition = stream.partition
+            # Update or append data for this specific year and season type
+            summary = store_raw_data(stream, 'pregame_win_probabilities', year=partition.year, season_type=partition.season_type)
+            if summary.row_count:
+                print(f"Updated/Appended pregame win probabilities data for year {partition.year} {partition.season_type} season")
+            record_partition('pregame_win_probabilities', stream, summary)
 
     print("Finished fetching pregame win probabilities data")
 
-def fetch_team_recruiting(start_year, end_year, recruiting_api, use_last_season=True):
-    last_year = get_last_update('games') if use_last_season else None
-    
-    # If we have data, start from the last year
-    if last_year is not None:
-        start_year = last_year
+@metrics_run()
+def fetch_team_recruiting(start_year, end_year, recruiting_api=None, use_last_season=True, units=None):
+    recruiting_api = recruiting_api or initialize_recruiting_api()
+    last_year = get_last_update('team_recruiting') if use_last_season else None
+    if units is None:
+        # If we have data, start from the last year
+        if last_year is not None:
+            start_year = last_year
+        
+        units = get_pending_units('team_recruiting', [WorkUnit(year) for year in range(start_year, end_year + 1)])
+    results = iter_work_units(
+        units,
+        lambda unit: cached_api_call('recruiting/teams', recruiting_api.get_recruiting_teams, year=unit.year),
+        'RecruitingApi->get_recruiting_teams'
+    )
     
-    for year in range(start_year, end_year + 1):
-        try:
-            recruiting_data = recruiting_api.get_recruiting_teams(year=year)
-            team_recruiting = [data.to_dict() for data in recruiting_data]
-            
+    for stream in stream_partitions(results):
+        with transaction():
+            year = stream.partition.year
             if year == last_year:
                 # Replace data for the last year
-                store_raw_data(team_recruiting, 'team_recruiting', if_exists='replace')
+                summary = store_raw_data(stream, 'team_recruiting', if_exists='replace', year=year)
                 print(f"Replaced team recruiting data for year {year}")
             else:
                 # Append data for new years
-                store_raw_data(team_recruiting, 'team_recruiting', if_exists='append')
+                summary = store_raw_data(stream, 'team_recruiting', if_exists='append', year=year)
                 print(f"Appended team recruiting data for year {year}")
-            
-            print(f"Successfully fetched team recruiting data for {year}")
-        except ApiException as e:
-            print(f"Exception when calling RecruitingApi->get_recruiting_teams for year {year}: {e}\n")
-        
-        time.sleep(1)  # Add a delay to avoid hitting rate limits
+            record_partition('team_recruiting', stream, summary)
     
     print("Finished fetching team recruiting data")
 
-def fetch_betting_lines(start_year, end_year, betting_api, use_last_season=True):
-    last_season = get_last_update('betting_lines') if use_last_season else None
+@metrics_run()
+def fetch_betting_lines(start_year, end_year, betting_api=None, use_last_season=True, week=None, season_type=None, units=None):
+    betting_api = betting_api or initialize_betting_api()
+    if units is None:
+        last_season = get_last_update('betting_lines') if use_last_season and week is None else None
+        
+        # If we have data, start from the last season
+        if last_season is not None:
+            start_year = max(last_season, 2013)
+        else:
+            start_year = max(start_year, 2013)
+        
+        units = get_pending_units('betting_lines', [
+            WorkUnit(year, season_type=unit_season_type, week=week)
+            for year in range(start_year, end_year + 1)
+            for unit_season_type in get_season_types(season_type)
+        ])
+    results = iter_work_units(
+        units,
+        lambda unit: cached_api_call(
+            'lines', betting_api.get_lines,
+            year=unit.year, week=unit.week, season_type=unit.season_type
+        ),
+        'BettingApi->get_lines'
+    )
     
-    # If we have data, start from the last season
-    if last_season is not None:
-        start_year = max(last_season, 2013)
-    else:
-        start_year = max(start_year, 2013)
+    for stream in stream_partitions(results):
+        with transaction():
+            partition = stream.partition
+            # Update or append data for this specific year, season type and week
+            summary = store_raw_data(stream, 'betting_lines', year=partition.year, week=partition.week, season_type=partition.season_type)
+            if summary.row_count:
+                print(f"Updated/Appended betting lines data for year {partition.year} {partition.season_type} season")
+            record_partition('betting_lines', stream, summary)
+
+    print("Finished fetching betting lines data")
+
+
+def get_last_completed_week(year, games_api=None):
+    """
+    Find the most recent calendar week of a season whose games have all started.
+
+    Returns:
+    tuple: (week, season_type), or (None, None) if no week has been played yet.
+    """
+    now = datetime.now(timezone.utc)
+    last_week = (None, None)
+    for week in get_calendar(year, year, games_api):
+        last_game_start = pd.to_datetime(week['last_game_start'], utc=True)
+        if last_game_start <= now:
+            last_week = (week['week'], week['season_type'])
+    return last_week
+
+def update_week(year, week=None, season_type=None):
+    """
+    Refresh games, box scores, advanced stats and betting lines for a single week.
+
+    Only that week's rows are replaced in the warehouse. When week is omitted, the most
+    recently completed week in the season calendar is used.
+    """
+    if week is None:
+        week, season_type = get_last_completed_week(year)
+        if week is None:
+            print(f"No completed weeks found for {year}")
+            return
+    season_type = season_type or 'regular'
     
-    for year in range(start_year, end_year + 1):
-        year_lines = []
-        for season_type in ['regular', 'postseason']:
-            try:
-                lines = betting_api.get_lines(
-                    year=year,
-                    season_type=season_type
-                )
-                year_lines.extend([line.to_dict() for line in lines])
-                print(f"Successfully fetched betting lines for {year} {season_type} season")
-            except ApiException as e:
-                print(f"Exception when calling BettingApi->get_lines for year {year} {season_type} season: {e}\n")
-            
-            time.sleep(1)  # Add a delay to avoid hitting rate limits
-        
-        if year_lines:
-            # Update or append data for this specific year
-            store_raw_data(year_lines, 'betting_lines', year=year)
-            print(f"Updated/Appended betting lines data for year {year}")
-
-    print("Finished fetching betting lines data")
\ No newline at end of file
+    print(f"Updating {year} week {week} ({season_type})")
+    with metrics_run():
+        fetch_games(year, year, use_last_season=False, week=week, season_type=season_type)
+        fetch_team_game_stats(year, year, use_last_season=False, week=week, season_type=season_type)
+        fetch_advanced_team_game_stats(year, year, use_last_season=False, week=week, season_type=season_type)
+        fetch_betting_lines(year, year, use_last_season=False, week=week, season_type=season_type)
+    print(f"Finished updating {year} week {week}")
+
+def resume_failed_fetches(endpoint=None):
+    """
+    Refetch only the work units checkpointed as failed by earlier collection runs.
+
+    Units that succeed are written and removed from the checkpoint; units that fail again
+    stay in it with their attempt count increased.
+
+    Args:
+    endpoint (str, optional): Warehouse table to resume, e.g. 'games'; all endpoints when omitted.
+    """
+    resumers = {
+        'games': lambda units: fetch_games(None, None, units=units),
+        'team_game_stats': lambda units: fetch_team_game_stats(None, None, units=units),
+        'advanced_team_game_stats': lambda units: fetch_advanced_team_game_stats(None, None, units=units),
+        'team_talent': lambda units: fetch_team_talent(None, None, use_last_season=False, units=units),
+        'pregame_win_probabilities': lambda units: fetch_pregame_win_probabilities(None, None, units=units),
+        'team_recruiting': lambda units: fetch_team_recruiting(None, None, use_last_season=False, units=units),
+        'betting_lines': lambda units: fetch_betting_lines(None, None, units=units)
+    }
+    for rating_type in ['elo', 'fpi', 'sp', 'srs']:
+        resumers[f'{rating_type}_ratings'] = lambda units, rating_type=rating_type: fetch_ratings(None, None, None, rating_type, units=units)
+    
+    failed = get_failed_units(endpoint)
+    if not failed:
+        print("No failed fetches to resume")
+        return
+    with metrics_run():
+        for name, keys in failed.items():
+            if name not in resumers:
+                print(f"Don't know how to resume {name}; skipping {len(keys)} units")
+                continue
+            print(f"Resuming {len(keys)} failed {name} requests")
+            resumers[name]([WorkUnit(*key) for key in keys])
@@ -16,23 +16,14 @@ def create_transformed_teams_db(source_db_path, target_db_path):
     # SQL query
     query = """
 
-    WITH games_deduped AS (
-        SELECT DISTINCT *
-        FROM games
-    ),
-    team_game_stats_deduped AS (
-        SELECT DISTINCT *,
+    -- The raw tables reject repeated records when they are stored (natural key and content
+    -- hash) and older ones are deduped by migrate_content_hashes in transformations.main,
+    -- so the source tables are read as they are, without DISTINCT passes
+    WITH team_game_stats_teams AS (
+        SELECT *,
             school AS team  -- Rename 'school' to 'team'
         FROM team_game_stats
     ),
-    team_talent_deduped AS (
-        SELECT DISTINCT *
-        FROM team_talent
-    ),
-    advanced_team_game_stats_deduped AS (
-        SELECT DISTINCT *
-        FROM advanced_team_game_stats
-    ),
     home_team_data AS (
         SELECT
             id,
@@ -66,7 +57,7 @@ def create_transformed_teams_db(source_db_path, target_db_path):
             home_postgame_elo AS team_postgame_elo,
             away_postgame_elo AS opponent_postgame_elo,
             'home' AS home_away
-        FROM games_deduped
+        FROM games
     ),
     away_team_data AS (
         SELECT 
@@ -101,7 +92,7 @@ def create_transformed_teams_db(source_db_path, target_db_path):
             away_postgame_elo AS team_postgame_elo,
             home_postgame_elo AS opponent_postgame_elo,
             'away' AS home_away
-        FROM games_deduped
+        FROM games
     ),
     combined_game_data AS (
         SELECT * FROM home_team_data
@@ -288,9 +279,9 @@ def create_transformed_teams_db(source_db_path, target_db_path):
         END AS win
 
     FROM combined_game_data cgd
-    LEFT JOIN team_game_stats_deduped tgs
+    LEFT JOIN team_game_stats_teams tgs
         ON cgd.id = tgs.id AND cgd.team_id = tgs.school_id
-    LEFT JOIN advanced_team_game_stats_deduped adv
+    LEFT JOIN advanced_team_game_stats adv
         ON cgd.id = adv.game_id AND cgd.team = adv.team
     LEFT JOIN home_betting_lines hbl
         ON cgd.id = hbl.id AND cgd.team = hbl.team
@@ -306,9 +297,9 @@ def create_transformed_teams_db(source_db_path, target_db_path):
         ON cgd.year = tr.year AND cgd.team = tr.team
     LEFT JOIN team_recruiting tr_opponent
         ON cgd.year = tr_opponent.year AND cgd.opponent = tr_opponent.team
-    LEFT JOIN team_talent_deduped tt
+    LEFT JOIN team_talent tt
         ON cgd.year = tt.year AND cgd.team = tt.school
-    LEFT JOIN team_talent_deduped tt_opponent
+    LEFT JOIN team_talent tt_opponent
         ON cgd.year = tt_opponent.year AND cgd.opponent = tt_opponent.school
     
     -- WHERE cgd.year >= 2004
@@ -0,0 +1,296 @@
+# Fetch Executor
+
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from itertools import groupby, islice
+from cfbd.rest import ApiException
+from urllib3.exceptions import HTTPError
+from .fetch_metrics import get_metrics, take_fallback, take_response_bytes
+
+# Bounded concurrency and the request budget shared by every CFBD call
+MAX_WORKERS = 4
+REQUESTS_PER_SECOND = 2.0
+BURST_SIZE = 4
+
+# Retries per work unit: exponential backoff with full jitter, or the server's Retry-After
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# A single API call: one season, optionally narrowed to a conference, season type and week
+WorkUnit = namedtuple('WorkUnit', ['year', 'conference', 'season_type', 'week'], defaults=(None, None, None))
+
+# The slice of the warehouse a group of work units writes: conferences are combined
+Partition = namedtuple('Partition', ['year', 'season_type', 'week'])
+
+_executor = None
+_rate_limiter = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by all fetch worker threads."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Hold back every worker, e.g. after the API answers 429 with Retry-After."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def acquire(self):
+        """Block until a token is available and return the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - max(self.updated_at, self.paused_until)) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+def configure_fetch_executor(max_workers=None, requests_per_second=None, burst_size=None):
+    global MAX_WORKERS, REQUESTS_PER_SECOND, BURST_SIZE, _executor, _rate_limiter
+    with _lock:
+        if max_workers is not None:
+            MAX_WORKERS = max_workers
+        if requests_per_second is not None:
+            REQUESTS_PER_SECOND = requests_per_second
+        if burst_size is not None:
+            BURST_SIZE = burst_size
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = None
+        _rate_limiter = None
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='cfbd-fetch')
+        return _executor
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    with _lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(REQUESTS_PER_SECOND, BURST_SIZE)
+        return _rate_limiter
+
+
+def format_unit(unit):
+    return ", ".join(f"{field} {value}" for field, value in unit._asdict().items() if value is not None)
+
+
+def is_retryable(error):
+    # Connection errors and throttling/server errors are transient; CacheMiss (status None) and 4xx are not
+    if isinstance(error, HTTPError):
+        return True
+    return getattr(error, 'status', None) in RETRYABLE_STATUSES
+
+def get_retry_after(error):
+    headers = getattr(error, 'headers', None)
+    value = headers.get('Retry-After') if headers else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # Retry-After may also be an HTTP date; one that does not parse falls back to the backoff
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        # parsedate_to_datetime returns a naive datetime for a '-0000' zone, which means UTC
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def get_retry_delay(error, attempt):
+    retry_after = get_retry_after(error)
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def acquire_request_token():
+    """
+    Wait for a token of the rate limiter of the call_with_retries running on this thread.
+
+    Called right before a request actually goes to the API (cached_api_call does so on a
+    cache miss), so work units answered from the response cache are not throttled. Outside
+    call_with_retries this does nothing.
+    """
+    throttle = getattr(_local, 'throttle', None)
+    if throttle is not None:
+        throttle()
+
+def call_with_retries(fetch_fn, unit, rate_limiter, description):
+    metrics = get_metrics()
+    tags = (description, unit.year, unit.season_type)
+
+    def throttle():
+        metrics.record_rate_limit_wait(*tags, rate_limiter.acquire())
+
+    # acquire_request_token() in fetch_fn takes its token from this call's limiter
+    previous_throttle = getattr(_local, 'throttle', None)
+    _local.throttle = throttle
+    attempt = 0
+    try:
+        while True:
+            take_response_bytes()
+            take_fallback()
+            started = time.perf_counter()
+            try:
+                records = fetch_fn(unit)
+            except (ApiException, HTTPError) as e:
+                # A unit answered by the per-conference fallback has had each request recorded
+                if not take_fallback():
+                    metrics.record_call(
+                        *tags, time.perf_counter() - started, response_bytes=take_response_bytes(), error=True,
+                        rate_limited=getattr(e, 'status', None) == 429
+                    )
+                if not is_retryable(e) or attempt >= MAX_RETRIES:
+                    raise
+                delay = get_retry_delay(e, attempt)
+                if getattr(e, 'status', None) == 429:
+                    rate_limiter.pause(delay)
+                attempt += 1
+                metrics.record_retry(*tags, delay)
+                print(f"Retrying {description} for {format_unit(unit)} in {delay:.1f}s (attempt {attempt} of {MAX_RETRIES}): {getattr(e, 'status', None) or e}")
+                time.sleep(delay)
+            else:
+                if not take_fallback():
+                    metrics.record_call(*tags, time.perf_counter() - started, rows=len(records), response_bytes=take_response_bytes())
+                return records
+    finally:
+        _local.throttle = previous_throttle
+
+
+def iter_work_units(units, fetch_fn, description, window=None):
+    """
+    Run fetch_fn for every work unit on the shared executor under the shared rate limit,
+    yielding results as a stream.
+
+    Transient failures (429, 5xx, connection errors) are retried up to MAX_RETRIES times.
+    fetch_fn takes a rate limit token through acquire_request_token() before each request
+    that reaches the API; cached_api_call does this for every collection fetch.
+    At most `window` units are in flight or waiting to be consumed, so memory stays bounded
+    no matter how many seasons are requested.
+
+    Args:
+    units (iterable): WorkUnit tuples to fetch.
+    fetch_fn (callable): Takes a WorkUnit and returns a list of records.
+    description (str or callable): API method name used in log messages and metrics, e.g.
+    'GamesApi->get_games', or a function of the unit returning one.
+    window (int, optional): Units kept in flight; defaults to twice MAX_WORKERS.
+
+    Yields:
+    tuple: (unit, records, error) in the order the units were given. On success error is
+    None; once retries are exhausted records is None and error holds the last exception.
+    """
+    executor = get_executor()
+    rate_limiter = get_rate_limiter()
+    window = window or MAX_WORKERS * 2
+
+    describe = description if callable(description) else lambda unit: description
+
+    def run(unit):
+        return call_with_retries(fetch_fn, unit, rate_limiter, describe(unit))
+
+    units = iter(units)
+    pending = deque((unit, executor.submit(run, unit)) for unit in islice(units, window))
+    while pending:
+        unit, future = pending.popleft()
+        try:
+            records, error = future.result(), None
+            print(f"Successfully fetched {len(records)} records from {describe(unit)} for {format_unit(unit)}")
+        except (ApiException, HTTPError) as e:
+            print(f"Exception when calling {describe(unit)} for {format_unit(unit)}: {e}\n")
+            records, error = None, e
+        # Keep the pool busy while the caller writes this result
+        next_unit = next(units, None)
+        if next_unit is not None:
+            pending.append((next_unit, executor.submit(run, next_unit)))
+        yield unit, records, error
+
+
+def run_work_units(units, fetch_fn, description):
+    """Run every work unit and return the (unit, records, error) results as a list."""
+    return list(iter_work_units(units, fetch_fn, description))
+
+
+class PartitionStream:
+    """
+    Lazily yields the records of one partition's work units.
+
+    When a key function is given, records whose key was already yielded are dropped, e.g.
+    a game between two conferences that is returned by both conference requests.
+
+    succeeded_units, failures, duplicates and complete are filled in as the stream is consumed,
+    so check them only after it has been fully iterated (e.g. by a store_* call).
+    """
+
+    def __init__(self, partition, unit_results, key=None):
+        self.partition = partition
+        self.unit_results = unit_results
+        self.key = key
+        self.succeeded_units = []
+        self.failures = []
+        self.duplicates = 0
+
+    @property
+    def complete(self):
+        return not self.failures
+
+    def __iter__(self):
+        seen = set()
+        for unit, records, error in self.unit_results:
+            if error is not None:
+                self.failures.append((unit, error))
+                continue
+            self.succeeded_units.append(unit)
+            if self.key is None:
+                yield from records
+                continue
+            for record in records:
+                record_key = self.key(record)
+                if record_key in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(record_key)
+                yield record
+
+
+def stream_partitions(results, key=None):
+    """
+    Group an ordered (unit, records, error) stream into one PartitionStream per
+    (year, season_type, week) partition. Conference units of the same partition are combined,
+    dropping records with a repeated key if a key function is given.
+    """
+    for partition, unit_results in groupby(results, key=lambda result: Partition(result[0].year, result[0].season_type, result[0].week)):
+        yield PartitionStream(partition, unit_results, key)
@@ -0,0 +1,285 @@
+# Collection Metrics
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+METRICS_FILE = '../data/00_cache/collection_metrics.json'
+PROMETHEUS_FILE = '../data/00_cache/collection_metrics.prom'
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+
+
+class CallStats:
+    """Counters for one (endpoint, year, season_type) tag set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        # 429 responses, and units fetched per conference after a rejected division-wide request
+        self.rate_limited = 0
+        self.fallbacks = 0
+        self.rows = 0
+        self.response_bytes = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        # One count per LATENCY_BUCKETS bound plus a final +Inf bucket (not cumulative)
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.rate_limit_wait = 0.0
+        self.backoff_wait = 0.0
+
+    def merge(self, other):
+        for name in ['calls', 'errors', 'retries', 'rate_limited', 'fallbacks', 'rows', 'response_bytes', 'latency_sum', 'rate_limit_wait', 'backoff_wait']:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.latency_max = max(self.latency_max, other.latency_max)
+        self.latency_buckets = [a + b for a, b in zip(self.latency_buckets, other.latency_buckets)]
+
+    def latency_quantile(self, q):
+        # Upper bound of the bucket holding the q-th quantile
+        target = q * sum(self.latency_buckets)
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (self.latency_max,), self.latency_buckets):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.latency_max)
+        return 0.0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'fallbacks': self.fallbacks,
+            'rows': self.rows,
+            'response_bytes': self.response_bytes,
+            'latency_seconds': {
+                'sum': round(self.latency_sum, 6),
+                'mean': round(self.latency_sum / self.calls, 6) if self.calls else 0.0,
+                'p50': self.latency_quantile(0.5),
+                'p95': self.latency_quantile(0.95),
+                'max': round(self.latency_max, 6),
+                'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], self.latency_buckets))
+            },
+            'rate_limit_wait_seconds': round(self.rate_limit_wait, 6),
+            'backoff_wait_seconds': round(self.backoff_wait, 6)
+        }
+
+
+class CollectionMetrics:
+    """
+    Thread-safe metrics for the CFBD calls of one collection run, tagged by endpoint, year
+    and season_type. The fetch executor records into the process-wide instance from
+    get_metrics(); write_metrics() turns it into a JSON summary and a Prometheus textfile.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.started_at = datetime.now(timezone.utc)
+
+    def get_stats(self, endpoint, year=None, season_type=None):
+        # Callers hold self.lock
+        key = (endpoint, year, season_type)
+        if key not in self.stats:
+            self.stats[key] = CallStats()
+        return self.stats[key]
+
+    def record_call(self, endpoint, year, season_type, latency, rows=0, response_bytes=0, error=False, rate_limited=False):
+        with self.lock:
+            stats = self.get_stats(endpoint, year, season_type)
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.rate_limited += int(rate_limited)
+            stats.rows += rows
+            stats.response_bytes += response_bytes
+            stats.latency_sum += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            stats.latency_buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def record_retry(self, endpoint, year, season_type, backoff):
+        with self.lock:
+            stats = self.get_stats(endpoint, year, season_type)
+            stats.retries += 1
+            stats.backoff_wait += backoff
+
+    def record_fallback(self, endpoint, year, season_type):
+        # Called on the worker thread once the unit's fallback requests, each recorded under
+        # fallback_endpoint(endpoint), are done; the unit's own call is then not recorded
+        with self.lock:
+            self.get_stats(endpoint, year, season_type).fallbacks += 1
+        _local.fallback = True
+
+    def record_rate_limit_wait(self, endpoint, year, season_type, waited):
+        with self.lock:
+            self.get_stats(endpoint, year, season_type).rate_limit_wait += waited
+
+    def by_endpoint(self):
+        with self.lock:
+            totals = {}
+            for (endpoint, _, _), stats in self.stats.items():
+                totals.setdefault(endpoint, CallStats()).merge(stats)
+        return totals
+
+    def summary(self):
+        """Return the run as a JSON-serializable dict, endpoints sorted by total latency."""
+        totals = self.by_endpoint()
+        with self.lock:
+            series = [
+                dict(endpoint=endpoint, year=year, season_type=season_type, **stats.to_dict())
+                for (endpoint, year, season_type), stats in sorted(self.stats.items(), key=lambda item: tuple(str(part) for part in item[0]))
+            ]
+        return {
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'endpoints': {
+                endpoint: stats.to_dict()
+                for endpoint, stats in sorted(totals.items(), key=lambda item: -item[1].latency_sum)
+            },
+            'series': series
+        }
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        with self.lock:
+            items = sorted(self.stats.items(), key=lambda item: tuple(str(part) for part in item[0]))
+        lines = []
+
+        def add_metric(name, metric_type, help_text, value_fn):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for tags, stats in items:
+                lines.append(f"{name}{{{format_labels(tags)}}} {value_fn(stats)}")
+
+        lines.append("# HELP cfbd_request_duration_seconds Latency of CFBD API calls, including cache hits.")
+        lines.append("# TYPE cfbd_request_duration_seconds histogram")
+        for tags, stats in items:
+            cumulative = 0
+            for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], stats.latency_buckets):
+                cumulative += count
+                lines.append(f"cfbd_request_duration_seconds_bucket{{{format_labels(tags, le=bound)}}} {cumulative}")
+            lines.append(f"cfbd_request_duration_seconds_sum{{{format_labels(tags)}}} {stats.latency_sum}")
+            lines.append(f"cfbd_request_duration_seconds_count{{{format_labels(tags)}}} {stats.calls}")
+        add_metric('cfbd_request_errors_total', 'counter', "CFBD API calls that raised.", lambda stats: stats.errors)
+        add_metric('cfbd_request_retries_total', 'counter', "CFBD API calls retried after a transient failure.", lambda stats: stats.retries)
+        add_metric('cfbd_rate_limited_responses_total', 'counter', "CFBD API calls answered with 429 Too Many Requests.", lambda stats: stats.rate_limited)
+        add_metric('cfbd_conference_fallbacks_total', 'counter', "Units fetched per conference because the division-wide request is rejected.", lambda stats: stats.fallbacks)
+        add_metric('cfbd_response_rows_total', 'counter', "Records returned by CFBD API calls.", lambda stats: stats.rows)
+        add_metric('cfbd_response_bytes_total', 'counter', "Response body bytes received from the CFBD API.", lambda stats: stats.response_bytes)
+        add_metric('cfbd_rate_limit_wait_seconds_total', 'counter', "Time spent waiting on the client-side rate limiter.", lambda stats: stats.rate_limit_wait)
+        add_metric('cfbd_backoff_wait_seconds_total', 'counter', "Time spent sleeping before retries.", lambda stats: stats.backoff_wait)
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(tags, **extra):
+    endpoint, year, season_type = tags
+    labels = {'endpoint': endpoint, 'year': '' if year is None else year, 'season_type': season_type or ''}
+    labels.update(extra)
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+_metrics = CollectionMetrics()
+_metrics_lock = threading.Lock()
+# metrics_run blocks currently open; only the outermost one resets and writes
+_run_depth = 0
+
+def get_metrics():
+    return _metrics
+
+def fallback_endpoint(endpoint):
+    # Tag of the per-conference requests that replace a rejected division-wide request, kept
+    # apart so the endpoint's own calls and rows are not counted twice
+    return f"{endpoint} (conference fallback)"
+
+def reset_metrics():
+    """Start a new run: drop everything recorded so far."""
+    global _metrics
+    with _metrics_lock:
+        _metrics = CollectionMetrics()
+    return _metrics
+
+def record_response_bytes(size):
+    # Set by the API client on the worker thread that made the request
+    _local.response_bytes = getattr(_local, 'response_bytes', 0) + size
+
+def take_response_bytes():
+    size = getattr(_local, 'response_bytes', 0)
+    _local.response_bytes = 0
+    return size
+
+def take_fallback():
+    # Whether the call just made on this thread was answered by a per-conference fallback
+    fallback = getattr(_local, 'fallback', False)
+    _local.fallback = False
+    return fallback
+
+def write_atomically(path, content):
+    # Write next to the target and rename, so a textfile collector never reads a partial file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def write_metrics(json_path=None, prometheus_path=None):
+    """
+    Write the current run's metrics as a JSON summary and a Prometheus textfile.
+
+    Args:
+    json_path (str, optional): Defaults to METRICS_FILE.
+    prometheus_path (str, optional): Defaults to PROMETHEUS_FILE.
+
+    Returns:
+    dict: The JSON summary.
+    """
+    metrics = get_metrics()
+    summary = metrics.summary()
+    write_atomically(json_path or METRICS_FILE, json.dumps(summary, indent=2))
+    write_atomically(prometheus_path or PROMETHEUS_FILE, metrics.to_prometheus())
+    return summary
+
+def print_summary(summary):
+    print(f"{'endpoint':<48}{'calls':>7}{'errors':>8}{'retries':>9}{'rows':>9}{'MB':>8}{'p50 s':>8}{'p95 s':>8}{'wait s':>8}")
+    for endpoint, stats in summary['endpoints'].items():
+        latency = stats['latency_seconds']
+        print(f"{endpoint:<48}{stats['calls']:>7}{stats['errors']:>8}{stats['retries']:>9}{stats['rows']:>9}"
+              f"{stats['response_bytes'] / 1e6:>8.2f}{latency['p50']:>8.2f}{latency['p95']:>8.2f}{stats['rate_limit_wait_seconds']:>8.2f}")
+
+@contextmanager
+def metrics_run(json_path=None, prometheus_path=None):
+    """
+    Reset the metrics, run the block, then write the summary and textfile even if it fails.
+
+    Also usable as a decorator; every public collection entry point is wrapped in it. A run
+    started inside another one (e.g. fetch_games within update_week) records into the outer
+    run, which writes a single summary when it ends.
+    """
+    global _run_depth
+    with _metrics_lock:
+        _run_depth += 1
+        outermost = _run_depth == 1
+    if not outermost:
+        try:
+            yield get_metrics()
+        finally:
+            with _metrics_lock:
+                _run_depth -= 1
+        return
+    reset_metrics()
+    started = time.perf_counter()
+    try:
+        yield get_metrics()
+    finally:
+        with _metrics_lock:
+            _run_depth -= 1
+        summary = write_metrics(json_path, prometheus_path)
+        print(f"Collection metrics for {time.perf_counter() - started:.1f}s run written to {json_path or METRICS_FILE}")
+        print_summary(summary)
@@ -0,0 +1,216 @@
+# Database Maintenance
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from . import warehouse
+
+# Pipeline databases, relative to the notebooks and scripts like warehouse.DB_FILE;
+# None means warehouse.DB_FILE at the time maintenance runs
+PIPELINE_DATABASES = {
+    'college_football': None,
+    'interim_college_football': '../data/02_interim/college_football.db',
+    'transformed_teams': '../data/02_interim/transformed_teams.db',
+    'processed_teams': '../data/03_processed/processed_teams.db',
+    'features_teams': '../data/04_features/features_teams.db'
+}
+
+# One JSON report per line and run, so storage growth can be compared over time
+MAINTENANCE_FILE = '../data/00_cache/maintenance_history.jsonl'
+
+# 'incremental': return free pages to the OS with PRAGMA incremental_vacuum; a database without
+#                auto_vacuum=INCREMENTAL is converted by one full VACUUM first
+# 'full': rebuild the whole file with VACUUM
+# 'none': leave the file as it is
+VACUUM_MODES = ('incremental', 'full', 'none')
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def get_database_path(name):
+    path = PIPELINE_DATABASES[name]
+    return warehouse.DB_FILE if path is None else path
+
+def get_file_size(path):
+    # The WAL file holds committed pages not yet checkpointed into the database
+    return sum(os.path.getsize(file) for file in (path, f"{path}-wal") if os.path.exists(file))
+
+def get_page_stats(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'free_bytes': page_size * freelist_count,
+        'auto_vacuum': AUTO_VACUUM_MODES[conn.execute("PRAGMA auto_vacuum").fetchone()[0]]
+    }
+
+def get_object_pages(conn):
+    """Return {table or index: (pages, bytes used by content)}, or {} without the dbstat table."""
+    try:
+        rows = conn.execute("SELECT name, COUNT(*), SUM(pgsize - unused) FROM dbstat GROUP BY name").fetchall()
+    except sqlite3.OperationalError:
+        # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        return {}
+    return {name: (pages, used) for name, pages, used in rows}
+
+def get_index_stats(conn):
+    # sqlite_stat1 rows written by ANALYZE: 'rows avg-rows-per-key-prefix ...' for each index
+    try:
+        rows = conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {(table, index): stat for table, index, stat in rows}
+
+def get_table_stats(conn):
+    """
+    Return per-table row counts, page usage and indexes.
+
+    Each index lists its pages and its sqlite_stat1 statistics: the planner only picks an index
+    by selectivity once ANALYZE has recorded them, so an index without a stat is one the
+    planner has to guess about.
+    """
+    pages = get_object_pages(conn)
+    index_stats = get_index_stats(conn)
+    tables = {}
+    for (table_name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall():
+        indexes = {}
+        for _, index_name, unique, origin, _ in conn.execute(f"PRAGMA index_list('{table_name}')").fetchall():
+            index_pages, index_bytes = pages.get(index_name, (None, None))
+            indexes[index_name] = {
+                'unique': bool(unique),
+                'origin': origin,
+                'pages': index_pages,
+                'bytes': index_bytes,
+                'stat': index_stats.get((table_name, index_name))
+            }
+        table_pages, table_bytes = pages.get(table_name, (None, None))
+        tables[table_name] = {
+            'rows': conn.execute(f"SELECT COUNT(*) FROM \"{table_name}\"").fetchone()[0],
+            'pages': table_pages,
+            'bytes': table_bytes,
+            'indexes': indexes
+        }
+    return tables
+
+def vacuum_database(conn, mode):
+    if mode == 'full':
+        conn.execute("VACUUM")
+    elif mode == 'incremental':
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # auto_vacuum can only be changed by rebuilding the file once
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+    # Fold the WAL back into the database and truncate it, so the file sizes are final
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+def maintain_database(path, vacuum='incremental', analyze=True, check_integrity=True):
+    """
+    Check, analyze and compact one SQLite database.
+
+    Args:
+    path (str): Database file.
+    vacuum (str): One of VACUUM_MODES.
+    analyze (bool): Run ANALYZE so the query planner has table and index statistics.
+    check_integrity (bool): Run PRAGMA integrity_check first; a damaged database is reported
+        and left untouched.
+
+    Returns:
+    dict: File sizes, page usage before and after, integrity messages, per-table statistics
+    and the seconds each step took.
+    """
+    if vacuum not in VACUUM_MODES:
+        raise ValueError(f"Unknown vacuum mode: {vacuum}")
+    report = {'path': path, 'size_before': get_file_size(path), 'timings': {}}
+    # Autocommit, since VACUUM cannot run inside a transaction
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        report['pages_before'] = get_page_stats(conn)
+        if check_integrity:
+            started = time.perf_counter()
+            messages = [message for (message,) in conn.execute("PRAGMA integrity_check").fetchall()]
+            report['timings']['integrity_check'] = round(time.perf_counter() - started, 3)
+            report['integrity'] = messages
+            if messages != ['ok']:
+                print(f"Integrity check failed for {path}: {'; '.join(messages[:5])}")
+                report['tables'] = get_table_stats(conn)
+                return report
+        if analyze:
+            started = time.perf_counter()
+            conn.execute("ANALYZE")
+            report['timings']['analyze'] = round(time.perf_counter() - started, 3)
+        if vacuum != 'none':
+            started = time.perf_counter()
+            vacuum_database(conn, vacuum)
+            report['timings']['vacuum'] = round(time.perf_counter() - started, 3)
+        report['pages_after'] = get_page_stats(conn)
+        report['tables'] = get_table_stats(conn)
+    finally:
+        conn.close()
+    report['size_after'] = get_file_size(path)
+    return report
+
+def run_maintenance(databases=None, vacuum='incremental', analyze=True, check_integrity=True, history_path=None):
+    """
+    Maintain the pipeline databases and append the run to the maintenance history.
+
+    Args:
+    databases (list, optional): Names from PIPELINE_DATABASES or database paths; defaults to all of them.
+    vacuum (str): One of VACUUM_MODES.
+    analyze (bool): Run ANALYZE on each database.
+    check_integrity (bool): Run PRAGMA integrity_check on each database.
+    history_path (str, optional): Defaults to MAINTENANCE_FILE.
+
+    Returns:
+    dict: The run, with one maintain_database report per database that exists.
+    """
+    run = {'started_at': datetime.now(timezone.utc).isoformat(), 'vacuum': vacuum, 'databases': {}}
+    # The warehouse's cached connection and read cache must not outlive a rebuilt file
+    warehouse.close_connection()
+    for name in databases or PIPELINE_DATABASES:
+        path = get_database_path(name) if name in PIPELINE_DATABASES else name
+        if not os.path.exists(path):
+            print(f"Skipping {name}: {path} does not exist")
+            continue
+        report = maintain_database(path, vacuum, analyze, check_integrity)
+        run['databases'][name] = report
+        print_report(name, report)
+    run['finished_at'] = datetime.now(timezone.utc).isoformat()
+    history_path = history_path or MAINTENANCE_FILE
+    os.makedirs(os.path.dirname(history_path) or '.', exist_ok=True)
+    with open(history_path, 'a') as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+def print_report(name, report):
+    size_after = report.get('size_after', report['size_before'])
+    integrity = ', '.join(report.get('integrity', ['not checked']))
+    print(f"{name}: {report['size_before'] / 1e6:.2f} MB -> {size_after / 1e6:.2f} MB "
+          f"({(size_after - report['size_before']) / 1e6:+.2f} MB), integrity: {integrity}")
+    print(f"  {'table / index':<48}{'rows':>10}{'pages':>8}{'MB':>8}  stat")
+    for table_name, stats in report.get('tables', {}).items():
+        print(f"  {table_name:<48}{stats['rows']:>10}{stats['pages'] or '':>8}{(stats['bytes'] or 0) / 1e6:>8.2f}")
+        for index_name, index in stats['indexes'].items():
+            print(f"    {index_name:<46}{'':>10}{index['pages'] or '':>8}{(index['bytes'] or 0) / 1e6:>8.2f}  {index['stat'] or 'no statistics'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="ANALYZE, VACUUM and integrity-check the pipeline databases.")
+    parser.add_argument('databases', nargs='*', help=f"Names ({', '.join(PIPELINE_DATABASES)}) or paths; defaults to all")
+    parser.add_argument('--vacuum', choices=VACUUM_MODES, default='incremental')
+    parser.add_argument('--skip-analyze', action='store_true')
+    parser.add_argument('--skip-integrity-check', action='store_true')
+    args = parser.parse_args()
+    run_maintenance(args.databases or None, args.vacuum, not args.skip_analyze, not args.skip_integrity_check)
+
+if __name__ == "__main__":
+    main()
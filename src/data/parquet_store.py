@@ -0,0 +1,370 @@
+# Parquet Warehouse Backend
+
+import hashlib
+import os
+import pandas as pd
+from .schemas import NATURAL_KEYS, SCALAR_TYPES, get_table_schema, to_row, from_row, decode_value
+from .payload_codecs import dumps
+from .warehouse import (
+    READ_CHUNK_SIZE,
+    WriteSummary,
+    GAME_ID_COLUMNS,
+    iter_chunks,
+    encode_chunk,
+    get_year_field,
+    get_table_layout,
+    column_sql,
+    create_connection
+)
+
+PARQUET_DIR = '../data/01_raw/parquet'
+
+# File stem of records whose year is unknown: team_game_stats records carry no season, so they
+# are filed under the caller's year or their game's season, and only land here without either
+ALL_YEARS = 'all'
+
+# swagger type -> conversion of a stored value to its Arrow column type; others become text
+ARROW_CONVERTERS = {'int': int, 'float': float, 'bool': bool}
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("The parquet storage backend needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+def get_schema(table_name):
+    schema = get_table_schema(table_name)
+    if schema is None:
+        raise ValueError(f"No typed schema for table {table_name}")
+    return schema
+
+def get_arrow_schema(table_name):
+    """Arrow schema of a table's files: one native column per scalar field, JSON text for lists."""
+    pa = require_pyarrow()
+    arrow_types = {'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_()}
+    return pa.schema([(column.name, arrow_types.get(column.swagger_type, pa.string())) for column in get_schema(table_name)])
+
+def get_partition_field(table_name):
+    # The field a table's files are split on, or None if its records have no year
+    year_field = get_year_field(table_name)
+    return year_field if any(column.name == year_field for column in get_schema(table_name)) else None
+
+def partition_path(table_name, year):
+    return os.path.join(PARQUET_DIR, table_name, f"{ALL_YEARS if year is None else year}.parquet")
+
+def list_partitions(table_name):
+    """Return {year: path} of a table's files; year is None for a table kept in one file."""
+    table_dir = os.path.join(PARQUET_DIR, table_name)
+    if not os.path.isdir(table_dir):
+        return {}
+    partitions = {}
+    for name in sorted(os.listdir(table_dir)):
+        stem, extension = os.path.splitext(name)
+        if extension == '.parquet':
+            partitions[None if stem == ALL_YEARS else int(stem)] = os.path.join(table_dir, name)
+    return partitions
+
+def rows_to_arrow(rows, table_name):
+    """Build an Arrow table from rows in schema order, as to_row or a typed SQLite table returns them."""
+    pa = require_pyarrow()
+    schema = get_schema(table_name)
+    arrow_schema = get_arrow_schema(table_name)
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for column, values, field in zip(schema, columns, arrow_schema):
+        # SQLite stores whatever the API sent; Arrow columns need each value in the declared type
+        convert = ARROW_CONVERTERS.get(column.swagger_type, str)
+        arrays.append(pa.array([None if value is None else convert(value) for value in values], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=arrow_schema)
+
+def read_partition(path, columns=None):
+    import pyarrow.parquet as pq
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+def write_partition(table_name, year, table):
+    import pyarrow.parquet as pq
+    path = partition_path(table_name, year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the target and rename, so readers never see a partial file
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+def scope_mask(table, table_name, week=None, season_type=None):
+    """Boolean mask of the rows of one year's table that a week/season_type-scoped replace covers."""
+    pa = require_pyarrow()
+    import pyarrow.compute as pc
+    mask = pa.array([True] * table.num_rows, type=pa.bool_())
+    for field, value in [('week', week), ('season_type', season_type)]:
+        if value is not None and field in table.column_names:
+            mask = pc.and_(mask, pc.fill_null(pc.equal(table[field], value), False))
+    return mask
+
+def get_game_years(table_name):
+    """Return {game id: season} from the games files, to file records that have no year field."""
+    if table_name not in GAME_ID_COLUMNS or not list_partitions('games'):
+        return {}
+    games = read_arrow('games', columns=['id', 'season'])
+    return dict(zip(games['id'].to_pylist(), games['season'].to_pylist()))
+
+def group_by_year(table, years):
+    # {year: rows of table} for a list holding each row's year
+    pa = require_pyarrow()
+    return {year: table.filter(pa.array([row_year == year for row_year in years])) for year in dict.fromkeys(years)}
+
+def split_unpartitioned(table_name, game_years=None):
+    """
+    Move the rows of a table's ALL_YEARS file into the year files of their games' seasons.
+
+    Files written before records without a year field were partitioned hold every row in one
+    file; rows whose game is not in the games files stay there.
+
+    Returns:
+    int: Number of rows moved.
+    """
+    pa = require_pyarrow()
+    path = list_partitions(table_name).get(None)
+    if path is None or table_name not in GAME_ID_COLUMNS:
+        return 0
+    game_years = get_game_years(table_name) if game_years is None else game_years
+    table = read_partition(path)
+    years = [game_years.get(game_id) for game_id in table[GAME_ID_COLUMNS[table_name]].to_pylist()]
+    partitions = list_partitions(table_name)
+    key = NATURAL_KEYS.get(table_name)
+    groups = group_by_year(table, years)
+    moved = 0
+    for year, rows in groups.items():
+        if year is None:
+            continue
+        # Rows already in the year file were written later, so they win over the moved ones
+        tables = [rows] + ([read_partition(partitions[year])] if year in partitions else [])
+        write_partition(table_name, year, drop_duplicate_keys(pa.concat_tables(tables).combine_chunks(), key))
+        moved += rows.num_rows
+    if moved:
+        remaining = groups.get(None)
+        if remaining is None:
+            os.remove(path)
+        else:
+            write_partition(table_name, None, remaining)
+        print(f"Moved {moved} rows of {table_name} from {os.path.basename(path)} into year files")
+    return moved
+
+def drop_duplicate_keys(table, key):
+    # Keep the last row of each natural key, as an upsert would
+    pa = require_pyarrow()
+    import pyarrow.compute as pc
+    if not key or table.num_rows == 0:
+        return table
+    indexed = table.append_column('__row', pa.array(range(table.num_rows), type=pa.int64()))
+    keep = indexed.group_by(key, use_threads=False).aggregate([('__row', 'max')])['__row_max']
+    return table.take(pc.sort_indices(keep))
+
+def store_records(data, table_name, year=None, week=None, season_type=None, file_year=None):
+    """
+    Parquet counterpart of store_raw_data: upsert records into their year's file.
+
+    With year, the rows of that year (narrowed to week/season_type if given) are replaced once
+    the first record arrives, like delete_partition. Records are collected per year as Arrow
+    tables one chunk at a time and each touched file is rewritten once.
+
+    Records without a year field (team_game_stats) are upserted into the file of file_year,
+    or of their game's season when it is not given.
+
+    Returns:
+    WriteSummary: Number of rows written and a hash of their JSON payloads.
+    """
+    pa = require_pyarrow()
+    import pyarrow.compute as pc
+    schema = get_schema(table_name)
+    partition_field = get_partition_field(table_name)
+    game_years = {}
+    if partition_field is None and (file_year is None or None in list_partitions(table_name)):
+        game_years = get_game_years(table_name)
+        split_unpartitioned(table_name, game_years)
+    row_count = 0
+    content_hash = hashlib.sha256()
+    chunks_by_year = {}
+    for chunk in iter_chunks(data):
+        encode_chunk(chunk, content_hash)
+        rows_by_year = {}
+        for item in chunk:
+            if partition_field:
+                item_year = item.get(partition_field, year)
+            else:
+                item_year = file_year if file_year is not None else game_years.get(item.get(GAME_ID_COLUMNS.get(table_name)))
+            rows_by_year.setdefault(item_year, []).append(to_row(item, schema))
+        for item_year, rows in rows_by_year.items():
+            chunks_by_year.setdefault(item_year, []).append(rows_to_arrow(rows, table_name))
+        row_count += len(chunk)
+
+    partitions = list_partitions(table_name)
+    if None in partitions and set(chunks_by_year) - {None}:
+        # Rows left in the ALL_YEARS file (their game was unknown) are replaced by the filed ones
+        id_column = GAME_ID_COLUMNS[table_name]
+        filed = pa.concat_tables([chunk for item_year, chunks in chunks_by_year.items() if item_year is not None for chunk in chunks])
+        unfiled = read_partition(partitions[None])
+        stale = pc.is_in(unfiled[id_column], value_set=filed[id_column].combine_chunks())
+        if pc.all(stale).as_py():
+            os.remove(partitions[None])
+        elif pc.any(stale).as_py():
+            write_partition(table_name, None, unfiled.filter(pc.invert(stale)))
+        partitions = list_partitions(table_name)
+    for item_year, chunks in chunks_by_year.items():
+        tables = []
+        if item_year in partitions:
+            existing = read_partition(partitions[item_year])
+            if year is not None and item_year == year:
+                existing = existing.filter(pc.invert(scope_mask(existing, table_name, week, season_type)))
+            tables.append(existing)
+        merged = pa.concat_tables(tables + chunks).combine_chunks()
+        write_partition(table_name, item_year, drop_duplicate_keys(merged, NATURAL_KEYS.get(table_name)))
+
+    if row_count:
+        print(f"Wrote {row_count} rows to {table_name} parquet files {', '.join(str(item_year) for item_year in sorted(chunks_by_year, key=str))}")
+    return WriteSummary(row_count, content_hash.hexdigest())
+
+def store_partitions(partitions, table_name):
+    """Parquet counterpart of store_raw_partitions."""
+    return {year: store_records(records, table_name, year=year) for year, records in partitions}
+
+def select_files(table_name, start_year=None, end_year=None):
+    # Each file holds one year, so a year range only opens the files inside it; the ALL_YEARS
+    # file of records without a known year is always read
+    files = []
+    for year, path in list_partitions(table_name).items():
+        if year is None:
+            files.append(path)
+            continue
+        if start_year is not None and year < start_year:
+            continue
+        if end_year is not None and year > end_year:
+            continue
+        files.append(path)
+    return files
+
+def get_dataset(table_name, start_year=None, end_year=None):
+    require_pyarrow()
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+    if not list_partitions(table_name):
+        raise FileNotFoundError(f"No parquet files for table {table_name} in {PARQUET_DIR}")
+    return ds.dataset(
+        select_files(table_name, start_year, end_year), schema=get_arrow_schema(table_name),
+        format='parquet', filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+def get_filter(table_name, start_year=None, end_year=None, season_type=None):
+    """Arrow filter expression for the filters the file selection does not already apply."""
+    import pyarrow.dataset as ds
+    if table_name in GAME_ID_COLUMNS and (start_year is not None or end_year is not None or season_type is not None):
+        # Records without a season are matched on the ids of the selected games
+        game_ids = read_arrow('games', start_year, end_year, season_type, columns=['id'])['id']
+        return ds.field(GAME_ID_COLUMNS[table_name]).isin(game_ids.combine_chunks())
+    schema_fields = {column.name for column in get_schema(table_name)}
+    if season_type is None:
+        return None
+    if 'season_type' not in schema_fields:
+        raise ValueError(f"{table_name} records have no season_type field to filter on")
+    return ds.field('season_type') == season_type
+
+def check_filters(table_name, start_year=None, end_year=None, columns=None):
+    if (start_year is not None or end_year is not None) and table_name not in GAME_ID_COLUMNS and get_partition_field(table_name) is None:
+        raise ValueError(f"{table_name} records have no {get_year_field(table_name)} field to filter on")
+    if columns is not None:
+        known = {column.name for column in get_schema(table_name)}
+        unknown = [name for name in columns if name not in known]
+        if unknown:
+            raise ValueError(f"Unknown columns for {table_name}: {', '.join(unknown)}")
+
+def read_arrow(table_name, start_year=None, end_year=None, season_type=None, columns=None):
+    """
+    Read the selected part of a table as an Arrow table.
+
+    Files are memory-mapped, only the years in range are opened, and the column projection and
+    season_type filter are pushed down to the Parquet reader. Scalar columns need no decoding;
+    list columns hold JSON text.
+    """
+    check_filters(table_name, start_year, end_year, columns)
+    dataset = get_dataset(table_name, start_year, end_year)
+    return dataset.to_table(columns=columns, filter=get_filter(table_name, start_year, end_year, season_type))
+
+def iter_frames(table_name, start_year=None, end_year=None, season_type=None, columns=None, chunk_size=READ_CHUNK_SIZE):
+    """Parquet counterpart of iter_raw_data: stream record batches as decoded DataFrames."""
+    check_filters(table_name, start_year, end_year, columns)
+    schema = get_schema(table_name)
+    by_name = {column.name: column for column in schema}
+    selected = list(schema) if columns is None else [by_name[name] for name in columns]
+    names = [column.name for column in selected]
+    scanner = get_dataset(table_name, start_year, end_year).scanner(
+        columns=names, filter=get_filter(table_name, start_year, end_year, season_type), batch_size=chunk_size
+    )
+    for batch in scanner.to_batches():
+        if batch.num_rows == 0:
+            continue
+        values = batch.to_pydict()
+        for column in selected:
+            # Arrow already returns native ints, floats and bools; only list columns are JSON text
+            if column.swagger_type not in SCALAR_TYPES:
+                values[column.name] = [decode_value(value, column) for value in values[column.name]]
+        yield pd.DataFrame(values, columns=names)
+
+def fetch_records(table_name):
+    """Parquet counterpart of fetch_raw_data: every record of a table as a nested dict."""
+    schema = get_schema(table_name)
+    records = []
+    for path in list_partitions(table_name).values():
+        table = read_partition(path)
+        columns = [table[column.name].to_pylist() for column in schema]
+        records.extend(from_row(row, schema) for row in zip(*columns))
+    if not records and not list_partitions(table_name):
+        raise FileNotFoundError(f"No parquet files for table {table_name} in {PARQUET_DIR}")
+    return records
+
+def get_last_year(table_name):
+    years = [year for year in list_partitions(table_name) if year is not None]
+    return max(years) if years else None
+
+def export_table(table_name):
+    """
+    Copy a raw table from the SQLite warehouse into year files, e.g. before switching backends.
+
+    Returns:
+    int: Number of rows exported.
+    """
+    pa = require_pyarrow()
+    schema = get_schema(table_name)
+    conn = create_connection()
+    cursor = conn.cursor()
+    layout = get_table_layout(cursor, table_name)
+    if layout is None:
+        return 0
+    partition_field = get_partition_field(table_name)
+    rows = cursor.execute(f"SELECT {', '.join(column_sql(layout, column) for column in schema)} FROM {table_name}")
+    tables_by_year = {}
+    exported = 0
+    while True:
+        batch = rows.fetchmany(READ_CHUNK_SIZE)
+        if not batch:
+            break
+        # Parquet files keep list fields as JSON text, which legacy and json-codec tables already return
+        if layout.codec.name != 'json':
+            batch = [
+                tuple(dumps(decode_value(value, column, layout.codec)) if value is not None and column.swagger_type not in SCALAR_TYPES else value
+                      for column, value in zip(schema, row))
+                for row in batch
+            ]
+        table = rows_to_arrow(batch, table_name)
+        years = table[partition_field].to_pylist() if partition_field else [None] * table.num_rows
+        for year in dict.fromkeys(years):
+            mask = pa.array([item_year == year for item_year in years])
+            tables_by_year.setdefault(year, []).append(table.filter(mask))
+        exported += len(batch)
+    for year, tables in tables_by_year.items():
+        merged = pa.concat_tables(tables).combine_chunks()
+        write_partition(table_name, year, drop_duplicate_keys(merged, NATURAL_KEYS.get(table_name)))
+    # Records without a year field are filed by their games' seasons (export games first)
+    split_unpartitioned(table_name)
+    print(f"Exported {exported} rows of {table_name} to {os.path.join(PARQUET_DIR, table_name)}")
+    return exported
@@ -0,0 +1,187 @@
+# Raw Payload Codecs
+
+import json
+import threading
+import zlib
+from collections import namedtuple
+
+# JSON libraries in order of preference; the first one installed encodes and decodes every
+# payload the warehouse, response cache and transformations handle. Output is compact JSON.
+JSON_BACKENDS = ('orjson', 'msgspec', 'json')
+JSON_BACKEND = None
+
+# Opt in (set_typed_decoding) to decode into the record types from schemas.get_record_type when
+# msgspec is installed, which validates fields and converts types (e.g. "7" to 7) while parsing.
+# Typed decodes drop fields the cfbd model does not declare; a record that fails validation
+# is parsed untyped instead, so one off-type value never fails a whole table.
+TYPED_DECODING = False
+
+# How the warehouse serializes list fields and archived records. 'json' stores text that
+# SQLite's json_extract can read; the others store smaller BLOBs that only decode can read
+# (the compressing codecs leave short values as JSON text).
+# zstd-json and msgpack need the zstandard and msgpack packages.
+CODECS = ('json', 'zlib-json', 'zstd-json', 'msgpack')
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Compressing codecs keep shorter JSON as text: the compression header would outweigh the
+# saving on values like a game's line scores
+COMPRESS_MIN_BYTES = 128
+
+PayloadCodec = namedtuple('PayloadCodec', ['name', 'encode', 'decode'])
+
+_local = threading.local()
+_codecs = {}
+
+
+def stdlib_json():
+    # Compact separators: the text is only ever parsed, never read by people
+    def dumps(value, default=None):
+        return json.dumps(value, separators=(',', ':'), default=default)
+    return dumps, json.loads
+
+def orjson_json():
+    import orjson
+
+    def dumps(value, default=None):
+        # orjson returns UTF-8 bytes; SQLite's json_extract needs TEXT
+        return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return dumps, orjson.loads
+
+def msgspec_json():
+    import msgspec
+    encoder = msgspec.json.Encoder()
+
+    def dumps(value, default=None):
+        if default is not None:
+            return msgspec.json.encode(value, enc_hook=default).decode('utf-8')
+        return encoder.encode(value).decode('utf-8')
+    return dumps, msgspec.json.decode
+
+JSON_FACTORIES = {'orjson': orjson_json, 'msgspec': msgspec_json, 'json': stdlib_json}
+
+def set_json_backend(name=None):
+    """Use the named JSON library, or the first installed one from JSON_BACKENDS."""
+    global JSON_BACKEND, _dumps, _loads
+    for candidate in [name] if name else JSON_BACKENDS:
+        try:
+            _dumps, _loads = JSON_FACTORIES[candidate]()
+        except ImportError:
+            if name:
+                raise
+            continue
+        JSON_BACKEND = candidate
+        return candidate
+
+def get_msgspec():
+    try:
+        import msgspec
+    except ImportError:
+        return None
+    return msgspec
+
+set_json_backend()
+_msgspec = get_msgspec()
+
+def set_typed_decoding(enabled=True):
+    global TYPED_DECODING
+    TYPED_DECODING = enabled
+
+def dumps(value, default=None):
+    """Serialize value to compact JSON text; default converts objects JSON cannot hold."""
+    return _dumps(value, default)
+
+def loads(data, record_type=None):
+    """
+    Parse JSON text or bytes.
+
+    With a record_type (see schemas.get_record_type), TYPED_DECODING on and msgspec installed,
+    the parse also validates the payload and converts its field types in the same pass; a
+    payload that does not validate is parsed untyped.
+    """
+    if record_type is not None and TYPED_DECODING and _msgspec is not None:
+        try:
+            return _msgspec.json.decode(data, type=record_type, strict=False)
+        except _msgspec.ValidationError:
+            pass
+    return _loads(data)
+
+def loads_many(texts, record_type=None):
+    """Parse a list of JSON texts with one call, as a JSON array of them."""
+    if not texts:
+        return []
+    if record_type is None or not TYPED_DECODING or _msgspec is None:
+        return _loads('[' + ','.join(texts) + ']')
+    try:
+        return _msgspec.json.decode('[' + ','.join(texts) + ']', type=list[record_type], strict=False)
+    except _msgspec.ValidationError:
+        # Only the records that do not validate are parsed untyped
+        return [loads(text, record_type) for text in texts]
+
+def compressed_json_codec(name, compress, decompress):
+    def encode(value):
+        text = dumps(value)
+        return text if len(text) < COMPRESS_MIN_BYTES else compress(text.encode('utf-8'))
+
+    def decode(data):
+        return loads(data if isinstance(data, str) else decompress(data))
+
+    return PayloadCodec(name, encode, decode)
+
+def json_codec():
+    return PayloadCodec('json', dumps, loads)
+
+def zlib_json_codec():
+    return compressed_json_codec('zlib-json', lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress)
+
+def zstd_json_codec():
+    import zstandard
+
+    # zstandard compressors must not be shared between threads
+    def get_compressors():
+        if getattr(_local, 'zstd', None) is None:
+            _local.zstd = (zstandard.ZstdCompressor(level=ZSTD_LEVEL), zstandard.ZstdDecompressor())
+        return _local.zstd
+
+    return compressed_json_codec(
+        'zstd-json',
+        lambda data: get_compressors()[0].compress(data),
+        lambda data: get_compressors()[1].decompress(data)
+    )
+
+def msgpack_codec():
+    import msgpack
+    return PayloadCodec(
+        'msgpack',
+        lambda value: msgpack.packb(value, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False)
+    )
+
+CODEC_FACTORIES = {
+    'json': json_codec,
+    'zlib-json': zlib_json_codec,
+    'zstd-json': zstd_json_codec,
+    'msgpack': msgpack_codec
+}
+
+def get_codec(name):
+    """Return the PayloadCodec registered under name, importing its optional package on first use."""
+    if name not in CODEC_FACTORIES:
+        raise ValueError(f"Unknown payload codec: {name}")
+    if name not in _codecs:
+        try:
+            _codecs[name] = CODEC_FACTORIES[name]()
+        except ImportError as e:
+            raise ImportError(f"The {name} payload codec needs the {e.name} package: pip install {e.name}") from e
+    return _codecs[name]
+
+def available_codecs():
+    available = []
+    for name in CODECS:
+        try:
+            get_codec(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
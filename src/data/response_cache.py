@@ -0,0 +1,127 @@
+# CFBD Response Cache
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from cfbd.rest import ApiException
+from .fetch_executor import acquire_request_token
+from .payload_codecs import dumps, loads
+
+CACHE_FILE = '../data/00_cache/cfbd_responses.db'
+
+# Closed seasons never change; the in-progress season is refetched after this many seconds
+CURRENT_SEASON_TTL = 6 * 60 * 60
+
+# 'read_through': serve fresh cache hits, call the API on a miss
+# 'offline': only serve from the cache, never call the API
+# 'disabled': always call the API and do not touch the cache
+CACHE_MODES = ('read_through', 'offline', 'disabled')
+CACHE_MODE = 'read_through'
+
+_local = threading.local()
+
+
+class CacheMiss(ApiException):
+    """Raised in offline mode when a request has no cached response."""
+
+    def __init__(self, endpoint, params):
+        super().__init__(status=None, reason=f"No cached response for {endpoint} {params} (offline mode)")
+
+
+def set_cache_mode(mode):
+    global CACHE_MODE
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode: {mode}")
+    CACHE_MODE = mode
+
+def current_season(today=None):
+    # A season runs from August through the January bowl games
+    today = today or date.today()
+    return today.year if today.month >= 2 else today.year - 1
+
+def is_fresh(season, fetched_at, now=None):
+    if season is not None and season < current_season():
+        return True
+    now = now or time.time()
+    return now - fetched_at < CURRENT_SEASON_TTL
+
+def get_cache_connection():
+    # One connection per fetch worker thread
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'cache_file', None) != CACHE_FILE:
+        os.makedirs(os.path.dirname(CACHE_FILE) or '.', exist_ok=True)
+        conn = sqlite3.connect(CACHE_FILE, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                cache_key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                season INTEGER,
+                fetched_at REAL,
+                payload TEXT
+            )
+        """)
+        _local.conn = conn
+        _local.cache_file = CACHE_FILE
+    return conn
+
+def make_cache_key(endpoint, params):
+    return f"{endpoint}?{json.dumps(params, sort_keys=True)}"
+
+def cached_api_call(endpoint, api_method, **params):
+    """
+    Call a CFBD API method through the on-disk response cache.
+
+    Args:
+    endpoint (str): Cache namespace for the call, e.g. 'games' or 'ratings/elo'.
+    api_method (callable): cfbd API method, e.g. games_api.get_games.
+    **params: Keyword arguments passed to api_method. 'year' decides the cache TTL.
+    Parameters set to None are left out of the request.
+
+    Returns:
+    list: The response records as dicts (the result of to_dict() on each model).
+    Inside a fetch work unit, a rate limit token is taken only when the API is called.
+    """
+    params = {key: value for key, value in params.items() if value is not None}
+    if CACHE_MODE == 'disabled':
+        acquire_request_token()
+        return [item.to_dict() for item in api_method(**params)]
+
+    conn = get_cache_connection()
+    cache_key = make_cache_key(endpoint, params)
+    season = params.get('year')
+
+    row = conn.execute(
+        "SELECT fetched_at, payload FROM responses WHERE cache_key = ?", (cache_key,)
+    ).fetchone()
+    if row is not None and (CACHE_MODE == 'offline' or is_fresh(season, row[0])):
+        return loads(row[1])
+    if CACHE_MODE == 'offline':
+        raise CacheMiss(endpoint, params)
+
+    # Only requests that reach the API count against the rate limit
+    acquire_request_token()
+    records = [item.to_dict() for item in api_method(**params)]
+    conn.execute(
+        "INSERT OR REPLACE INTO responses (cache_key, endpoint, season, fetched_at, payload) VALUES (?, ?, ?, ?, ?)",
+        (cache_key, endpoint, season, time.time(), dumps(records, default=str))
+    )
+    conn.commit()
+    return records
+
+def clear_cache(endpoint=None, season=None):
+    conn = get_cache_connection()
+    query = "DELETE FROM responses WHERE 1 = 1"
+    params = []
+    if endpoint is not None:
+        query += " AND endpoint = ?"
+        params.append(endpoint)
+    if season is not None:
+        query += " AND season = ?"
+        params.append(season)
+    deleted = conn.execute(query, params).rowcount
+    conn.commit()
+    print(f"Removed {deleted} cached responses")
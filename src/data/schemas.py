@@ -0,0 +1,150 @@
+# Raw Table Schemas
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, TypedDict
+import cfbd
+from .payload_codecs import dumps, loads
+
+# Warehouse table -> cfbd model its records are built from. Tables listed here are stored
+# as typed columns; anything else (e.g. calendar) keeps the (year, data JSON) layout.
+RAW_TABLE_MODELS = {
+    'games': 'Game',
+    'team_game_stats': 'TeamGame',
+    'advanced_team_game_stats': 'AdvancedGameStat',
+    'elo_ratings': 'TeamEloRating',
+    'fpi_ratings': 'TeamFPIRating',
+    'sp_ratings': 'TeamSPRating',
+    'srs_ratings': 'TeamSRSRating',
+    'team_talent': 'TeamTalent',
+    'team_recruiting': 'TeamRecruitingRank',
+    'betting_lines': 'GameLines',
+    'pregame_win_probabilities': 'PregameWP'
+}
+
+# Fields that identify one record of each raw table
+NATURAL_KEYS = {
+    'games': ['id'],
+    'team_game_stats': ['id'],
+    'advanced_team_game_stats': ['game_id', 'team'],
+    'elo_ratings': ['year', 'team'],
+    'fpi_ratings': ['year', 'team'],
+    'sp_ratings': ['year', 'team'],
+    'srs_ratings': ['year', 'team'],
+    'team_talent': ['year', 'school'],
+    'team_recruiting': ['year', 'team'],
+    'betting_lines': ['id'],
+    'pregame_win_probabilities': ['game_id']
+}
+
+# swagger type -> SQLite column type; lists and other containers are stored as JSON text
+SQLITE_TYPES = {
+    'int': 'INTEGER',
+    'float': 'REAL',
+    'bool': 'INTEGER',
+    'str': 'TEXT',
+    'date': 'TEXT',
+    'datetime': 'TEXT'
+}
+SCALAR_TYPES = set(SQLITE_TYPES)
+
+# Raw tables whose records get a typed definition for validating decodes (see get_record_type)
+RECORD_TYPE_TABLES = ['games', 'team_game_stats', 'advanced_team_game_stats', 'betting_lines']
+
+# swagger scalar type -> Python type of a record field
+PYTHON_TYPES = {'int': int, 'float': float, 'bool': bool, 'str': str, 'date': str, 'datetime': str, 'object': Any}
+
+# One typed column. Nested model attributes are flattened into their own columns, named like
+# pd.json_normalize names them after transformations replaces '.' with '_' (offense_ppa).
+Column = namedtuple('Column', ['name', 'path', 'swagger_type', 'sql_type'])
+
+
+def model_columns(model_name, path=()):
+    model = getattr(cfbd, model_name)
+    for attribute, swagger_type in model.swagger_types.items():
+        nested = getattr(cfbd, swagger_type, None)
+        if hasattr(nested, 'swagger_types'):
+            yield from model_columns(swagger_type, path + (attribute,))
+        else:
+            yield Column('_'.join(path + (attribute,)), path + (attribute,), swagger_type, SQLITE_TYPES.get(swagger_type, 'TEXT'))
+
+@lru_cache(maxsize=None)
+def get_table_schema(table_name):
+    """Return the typed columns of a raw table as a tuple of Column, or None if it has no schema."""
+    model_name = RAW_TABLE_MODELS.get(table_name)
+    if model_name is None:
+        return None
+    return tuple(model_columns(model_name))
+
+def python_type(swagger_type):
+    # Field type of a record: every field may be null, nested models become TypedDicts
+    match = re.fullmatch(r'list\[(.+)\]', swagger_type)
+    if match:
+        return Optional[List[python_type(match.group(1))]]
+    match = re.fullmatch(r'dict\(str, (.+)\)', swagger_type)
+    if match:
+        return Optional[Dict[str, python_type(match.group(1))]]
+    if hasattr(getattr(cfbd, swagger_type, None), 'swagger_types'):
+        return Optional[model_record_type(swagger_type)]
+    return Optional[PYTHON_TYPES.get(swagger_type, Any)]
+
+@lru_cache(maxsize=None)
+def model_record_type(model_name):
+    model = getattr(cfbd, model_name)
+    fields = {attribute: python_type(swagger_type) for attribute, swagger_type in model.swagger_types.items()}
+    return TypedDict(model_name, fields, total=False)
+
+def get_record_type(table_name):
+    """
+    Return the TypedDict describing one record of a raw table, or None for tables without one.
+
+    Passed to payload_codecs.loads, it makes msgspec check and convert every field while parsing,
+    and the result is still a plain dict. Fields the cfbd model does not declare are dropped.
+    """
+    if table_name not in RECORD_TYPE_TABLES:
+        return None
+    return model_record_type(RAW_TABLE_MODELS[table_name])
+
+def get_column_type(column):
+    # Record type of a list column's decoded value, e.g. the teams of a team_game_stats record
+    return python_type(column.swagger_type) if column.swagger_type not in SCALAR_TYPES else None
+
+def to_row(record, schema, codec=None):
+    """Flatten a record dict into a tuple of column values in schema order; codec encodes lists."""
+    encode = codec.encode if codec is not None else dumps
+    row = []
+    for column in schema:
+        value = record
+        for key in column.path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if isinstance(value, (list, dict)):
+            value = encode(value)
+        row.append(value)
+    return tuple(row)
+
+def decode_value(value, column, codec=None):
+    """Convert a stored column value back to its record type (bool, or a decoded list)."""
+    if value is None:
+        return None
+    if column.swagger_type == 'bool':
+        return bool(value)
+    if column.swagger_type not in SCALAR_TYPES:
+        if codec is None or codec.name == 'json':
+            return loads(value, get_column_type(column))
+        return codec.decode(value)
+    return value
+
+def needs_decoding(column):
+    return column.swagger_type == 'bool' or column.swagger_type not in SCALAR_TYPES
+
+def from_row(row, schema, codec=None):
+    """Rebuild the nested record dict a row was flattened from."""
+    record = {}
+    for column, value in zip(schema, row):
+        value = decode_value(value, column, codec)
+        target = record
+        for key in column.path[:-1]:
+            target = target.setdefault(key, {})
+        target[column.path[-1]] = value
+    return record
@@ -1,9 +1,13 @@
 # Data Transformations
 
 import sqlite3
-import json
+from itertools import chain
+from operator import itemgetter
 import pandas as pd
 import numpy as np
+from .schemas import SCALAR_TYPES, from_row, get_record_type
+from .payload_codecs import dumps, loads_many
+from .warehouse import METADATA_TABLES, get_table_layout, migrate_content_hashes
 
 def connect_to_db(db_path):
     return sqlite3.connect(db_path)
@@ -15,12 +19,16 @@ def get_table_names(conn):
 
 def json_to_dataframe(json_data):
     df = pd.json_normalize(json_data)
-    return df.map(lambda x: json.dumps(x) if isinstance(x, (dict, list)) else x)
+    return df.map(lambda x: dumps(x) if isinstance(x, (dict, list)) else x)
 
 def transform_table(conn, table_name):
     cursor = conn.cursor()
+    layout = get_table_layout(cursor, table_name)
+    if layout is not None and layout.schema is not None:
+        return transform_typed_table(conn, table_name, layout.schema, layout.codec)
+    
     cursor.execute(f"SELECT data FROM {table_name}")
-    json_data = [json.loads(row[0]) for row in cursor.fetchall()]
+    json_data = loads_many([row[0] for row in cursor.fetchall()], get_record_type(table_name))
     
     if not json_data:
         print(f"Warning: No data found for table {table_name}")
@@ -34,7 +42,71 @@ def transform_table(conn, table_name):
     df = json_to_dataframe(json_data)
     return df
 
+def transform_typed_table(conn, table_name, schema, codec=None):
+    # Typed raw tables already hold one column per (flattened) field, so most tables are a plain
+    # SELECT; list columns stay JSON text as json_to_dataframe would leave them
+    columns = ', '.join(column.name for column in schema)
+    if table_name in ('team_game_stats', 'betting_lines'):
+        # These expand a nested list into one row per team / line, which needs the records
+        json_data = [from_row(row, schema, codec) for row in conn.execute(f"SELECT {columns} FROM {table_name}")]
+        if not json_data:
+            print(f"Warning: No data found for table {table_name}")
+            return pd.DataFrame()
+        if table_name == 'team_game_stats':
+            return transform_team_game_stats(json_data)
+        return transform_betting_lines(json_data)
+    
+    df = pd.read_sql_query(f"SELECT {columns} FROM {table_name}", conn)
+    if codec is not None and codec.name != 'json':
+        # Binary-encoded list columns are turned back into the JSON text the plain codec stores
+        for column in schema:
+            if column.swagger_type not in SCALAR_TYPES:
+                df[column.name] = [None if value is None else dumps(codec.decode(value)) for value in df[column.name]]
+    if df.empty:
+        print(f"Warning: No data found for table {table_name}")
+    return df
+
+def get_field(items, field):
+    # One field of every item, None where it is missing or the item is no dict; itemgetter runs the loop in C
+    try:
+        return list(map(itemgetter(field), items))
+    except (KeyError, TypeError, IndexError):
+        return [item.get(field) if isinstance(item, dict) else None for item in items]
+
+def pivot_team_stats(stats):
+    """
+    Turn a Series of per-team stat lists ([{'category': ..., 'stat': ...}]) into one column per category.
+
+    The lists are flattened once and every (category, stat) pair is placed into a team x category
+    array in a single assignment. Items missing their category or stat are skipped, a category
+    repeated within one team keeps its last stat, columns follow the order the categories first
+    appear in, and teams without a stat for a category get NaN. The result shares the index of stats.
+    """
+    lists = [value if isinstance(value, list) else [] for value in stats]
+    rows = np.repeat(np.arange(len(lists)), [len(value) for value in lists])
+    items = list(chain.from_iterable(lists))
+    names = np.empty(len(items), dtype=object)
+    names[:] = get_field(items, 'category')
+    values = np.empty(len(items), dtype=object)
+    values[:] = get_field(items, 'stat')
+
+    # Stats without a category or a stat are dropped before the categories are numbered
+    kept = pd.notna(names) & pd.notna(values)
+    if not kept.all():
+        rows, names, values = rows[kept], names[kept], values[kept]
+    codes, categories = pd.factorize(pd.Series(names, dtype=object))
+
+    # Of a team's repeated categories only the last is kept, since numpy does not define which
+    # of several assignments to one cell wins
+    keys = rows * len(categories) + codes
+    last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+
+    wide = np.full((len(lists), len(categories)), np.nan, dtype=object)
+    wide[rows[last], codes[last]] = values[last]
+    return pd.DataFrame(wide, index=stats.index, columns=pd.Index(categories, dtype=object))
+
 def transform_team_game_stats(json_data):
+    # A single pass of dict lookups; built on pivot_team_stats it is slower (see benchmarks/bench_team_game_stats.py)
     rows = []
     for game in json_data:
         try:
@@ -115,10 +187,15 @@ def main():
     old_db_path = '../data/01_raw/college_football.db'
     new_db_path = '../data/02_interim/college_football.db'
     
+    # Raw tables stored before content hashes existed are deduped first, so the interim tables
+    # (and create_transformed_teams' joins over them) hold each record once
+    migrate_content_hashes()
+    
     old_conn = connect_to_db(old_db_path)
     new_conn = connect_to_db(new_db_path)
     
-    table_names = get_table_names(old_conn)
+    # Bookkeeping tables such as the fetch manifest are not carried into the interim database
+    table_names = [name for name in get_table_names(old_conn) if name not in METADATA_TABLES]
     
     for table_name in table_names:
         print(f"Transforming table: {table_name}")
@@ -1,119 +1,1289 @@
 # Data Warehouse
 
+import copy
+import functools
+import os
+import queue
 import sqlite3
+import threading
 import pandas as pd
-import json
+import hashlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from .schemas import NATURAL_KEYS, RAW_TABLE_MODELS, get_table_schema, get_record_type, to_row, from_row, decode_value, needs_decoding
+from .payload_codecs import get_codec, dumps, loads, loads_many
+from datetime import datetime, timezone
 
 DB_FILE = '../data/01_raw/college_football.db'
 
+# Bookkeeping tables that live next to the raw data but are not CFBD payloads
+METADATA_TABLES = ['fetch_manifest', 'failed_fetch_units', 'payload_codecs']
+
+# Manifest placeholders for partitions that span every week or have no season type
+ALL_WEEKS = -1
+ALL_SEASON_TYPES = 'all'
+ALL_CONFERENCES = 'all'
+
+# Also keep each record's JSON in a 'data' column of newly created typed tables
+ARCHIVE_RAW_JSON = False
+
+# Codec (payload_codecs.CODECS) of the list columns and data column of newly created typed
+# tables. Each table's codec is recorded in payload_codecs; recode_raw_tables converts them.
+PAYLOAD_CODEC = 'json'
+
+# Where raw tables are stored and read from:
+# 'sqlite': tables in DB_FILE
+# 'parquet': one Parquet file per table and year under parquet_store.PARQUET_DIR (needs pyarrow)
+# The fetch manifest and failed unit checkpoint stay in DB_FILE either way.
+STORAGE_BACKENDS = ('sqlite', 'parquet')
+STORAGE_BACKEND = 'sqlite'
+
+# Records serialized and inserted per executemany call when streaming writes
+STREAM_CHUNK_SIZE = 500
+
+# Rows per DataFrame yielded by iter_raw_data
+READ_CHUNK_SIZE = 10000
+
+# Raw tables whose records carry no season of their own: filtered by their game id in games
+GAME_ID_COLUMNS = {'team_game_stats': 'id'}
+
+# Memory budget in bytes of the in-process cache of iter_raw_data / read_raw_data and calendar
+# reads; the least recently used results are evicted beyond it. 0 disables the cache.
+READ_CACHE_BYTES = 256 * 1024 * 1024
+
+# Single-writer queue (see queued_writes): writes waiting before producers block, and the most
+# writes the writer thread commits in one transaction
+WRITE_QUEUE_SIZE = 32
+WRITE_BATCH_SIZE = 64
+
+# What a store_* call wrote: used for the fetch manifest
+WriteSummary = namedtuple('WriteSummary', ['row_count', 'content_hash'])
+
+# How a raw table stores its records: typed columns from schemas.py (schema), optionally with
+# the record archived in a data column, or the legacy JSON blob layout (schema is None).
+# columns holds the record fields that can be queried as a column rather than via json_extract;
+# codec is the PayloadCodec of list columns and the data column (always json for legacy tables);
+# hashed tells whether the table's content_hash column has its unique index (see record_hash).
+TableLayout = namedtuple('TableLayout', ['schema', 'archive', 'columns', 'codec', 'hashed'])
+
+# Bytes of the per-record BLAKE2b digest stored in each raw table's unique content_hash column
+RECORD_HASH_SIZE = 16
+
+# Record fields that scope year/week replaces, indexed together after the table's year field
+PARTITION_FIELDS = ['week', 'season_type']
+
+# Applied to every warehouse connection: WAL lets readers run during writes, and NORMAL
+# sync is durable in WAL mode except for the last commits on power loss
+CONNECTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative: KiB, i.e. 64 MiB
+    'temp_store': 'MEMORY'
+}
+
+_local = threading.local()
+
+
+class ReadCache:
+    """
+    LRU cache of decoded warehouse reads, bounded by READ_CACHE_BYTES.
+
+    Each entry lists the tables it was read from; invalidate() drops every entry that read a
+    table. generation increases with each invalidation, so a read that started before a write
+    can tell its result is stale and skip caching it.
+    """
+
+    Entry = namedtuple('Entry', ['tables', 'value', 'size'])
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry.value
+
+    def put(self, key, tables, value, size, generation):
+        if size > READ_CACHE_BYTES:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.discard(key)
+            self.entries[key] = self.Entry(frozenset(tables), value, size)
+            self.size += size
+            while self.size > READ_CACHE_BYTES:
+                self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def invalidate(self, table_name=None):
+        with self.lock:
+            self.generation += 1
+            for key in [key for key, entry in self.entries.items() if table_name is None or table_name in entry.tables]:
+                self.discard(key)
+
+
+_read_cache = ReadCache()
+_writer = None
+
+
+class WarehouseWriter:
+    """
+    Thread that performs every queued write on its own connection.
+
+    Producers submit() callables and get a Future back; submit() blocks while WRITE_QUEUE_SIZE
+    writes are waiting. The thread takes whatever has queued up (at most WRITE_BATCH_SIZE
+    writes) and runs it as one transaction, each write inside its own savepoint so a failing
+    write is rolled back and reported to its producer without losing the rest of the batch.
+    Futures resolve once the batch has committed.
+    """
+
+    Write = namedtuple('Write', ['fn', 'args', 'kwargs', 'future'])
+
+    def __init__(self, queue_size=WRITE_QUEUE_SIZE, batch_size=WRITE_BATCH_SIZE):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.batches = 0
+        self.pid = os.getpid()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='warehouse-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        if self.closed:
+            raise RuntimeError("The warehouse writer has been stopped")
+        future = Future()
+        self.queue.put(self.Write(fn, args, kwargs, future))
+        return future
+
+    def flush(self):
+        """Block until every write submitted so far has been committed."""
+        self.queue.join()
+
+    def close(self):
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [write for write in batch if write is not None]
+            if writes:
+                self.commit(writes)
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
+                close_connection()
+                return
+
+    def commit(self, writes):
+        outcomes = []
+        try:
+            with transaction() as conn:
+                # Opened explicitly: releasing a savepoint that began the transaction would commit it
+                if not conn.conn.in_transaction:
+                    conn.execute("BEGIN")
+                for write in writes:
+                    if not write.future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT queued_write")
+                    try:
+                        result = write.fn(*write.args, **write.kwargs)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO queued_write")
+                        conn.execute("RELEASE queued_write")
+                        outcomes.append((write.future, None, e))
+                    else:
+                        conn.execute("RELEASE queued_write")
+                        outcomes.append((write.future, result, None))
+        except Exception as e:
+            # The commit itself failed: nothing in the batch was written
+            for write in writes:
+                if not write.future.done():
+                    write.future.set_exception(e)
+            return
+        self.batches += 1
+        # Readers on other connections may have cached rows between a write and this commit
+        _read_cache.invalidate()
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class ManagedConnection:
+    """
+    The warehouse's persistent sqlite3 connection.
+
+    Behaves like the sqlite3.Connection the store_* and fetch_* functions used to open per call,
+    except that close() leaves it open for the next call, and commit() is deferred while a
+    transaction() block is active so the whole block commits once.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.depth = 0
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def executemany(self, *args):
+        return self.conn.executemany(*args)
+
+    def commit(self):
+        if self.depth == 0:
+            self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        # Kept open for reuse; close_connection() closes it for real
+        pass
+
+
 def create_connection():
-    conn = None
+    """Return this process's connection to DB_FILE, opening and tuning it on first use."""
+    key = (DB_FILE, os.getpid())
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and getattr(_local, 'key', None) == key:
+        if conn.depth == 0 and conn.conn.in_transaction:
+            # A store_* call that raised left its writes uncommitted; never let a later commit keep them
+            conn.rollback()
+        return conn
+    close_connection()
     try:
-        conn = sqlite3.connect(DB_FILE)
+        raw_conn = sqlite3.connect(DB_FILE, timeout=30)
+        for pragma, value in CONNECTION_PRAGMAS.items():
+            raw_conn.execute(f"PRAGMA {pragma}={value}")
     except sqlite3.Error as e:
         print(f"Error connecting to database: {e}")
-    return conn
+        return None
+    _local.conn = ManagedConnection(raw_conn)
+    _local.key = key
+    return _local.conn
+
+def close_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        # A connection inherited across fork() must not be used or committed by the child
+        if _local.key[1] == os.getpid():
+            conn.conn.close()
+        _local.conn = None
+        # Writes made while no connection is open cannot be detected by check_read_cache
+        _local.data_version = None
+        _read_cache.invalidate()
+
+@contextmanager
+def transaction():
+    """
+    Run several store_* calls as one transaction on the shared connection.
 
-def store_raw_data(data, table_name, if_exists='append', year=None):
+    Commits when the outermost block exits and rolls everything back if it raises.
+
+        with transaction():
+            store_raw_data(games, 'games', year=2023)
+            record_fetch('games', 2023, summary)
+    """
     conn = create_connection()
+    if conn is None:
+        raise sqlite3.OperationalError(f"Cannot open {DB_FILE}")
+    conn.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        conn.depth -= 1
+        if conn.depth == 0:
+            conn.rollback()
+            # Reads inside the block may have cached rows that were just rolled back
+            _read_cache.invalidate()
+        raise
+    conn.depth -= 1
+    conn.commit()
+
+def get_writer():
+    # The running writer of this process; a writer thread does not survive fork()
+    writer = _writer
+    if writer is None or writer.closed or writer.pid != os.getpid():
+        return None
+    return writer
+
+def start_writer(queue_size=None, batch_size=None):
+    """Start the single-writer thread; store_* calls from other threads are queued to it."""
+    global _writer
+    writer = get_writer()
+    if writer is None:
+        writer = _writer = WarehouseWriter(queue_size or WRITE_QUEUE_SIZE, batch_size or WRITE_BATCH_SIZE)
+    return writer
+
+def stop_writer():
+    """Commit everything still queued and stop the writer thread."""
+    global _writer
+    writer = get_writer()
+    if writer is not None:
+        writer.close()
+    _writer = None
+
+def submit_write(fn, *args, **kwargs):
+    """
+    Queue fn(*args, **kwargs) to run on the writer thread and return its Future.
+
+    Use it for several writes that must commit together, like a partition and its manifest
+    entry: one submitted function runs in one savepoint of the writer's transaction. Pass
+    records as lists; a generator would be consumed on the writer thread and hold up every
+    other producer.
+    """
+    writer = get_writer()
+    if writer is None:
+        raise RuntimeError("The warehouse writer is not running; use queued_writes() or start_writer()")
+    return writer.submit(fn, *args, **kwargs)
+
+def flush_writes():
+    writer = get_writer()
+    if writer is not None:
+        writer.flush()
+
+@contextmanager
+def queued_writes(queue_size=None, batch_size=None):
+    """
+    Route warehouse writes through one writer thread while the block runs.
+
+    For parallel collection: worker threads keep calling store_raw_data, record_fetch and the
+    other write functions, which hand the write to the writer thread and wait for it to commit,
+    instead of contending for SQLite's write lock. Writes made while the calling thread is in a
+    transaction() block, and writes from the writer thread itself, still run directly.
+
+        with queued_writes():
+            list(executor.map(fetch_and_store_season, years))
+    """
+    writer = start_writer(queue_size, batch_size)
+    try:
+        yield writer
+    finally:
+        stop_writer()
+
+def materialize_records(data):
+    # Records are pulled on the producer's thread, so slow generators never block the writer
+    return data if isinstance(data, (list, tuple)) else list(data)
+
+def materialize_partitions(partitions):
+    return [(year, materialize_records(records)) for year, records in partitions]
+
+def queued_write(materialize=None):
+    """
+    Hand calls of a write function to the writer thread while one is running.
+
+    materialize converts the first argument (the records) on the calling thread first.
+    The call still returns the function's result, once it has been committed.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            writer = get_writer()
+            conn = getattr(_local, 'conn', None)
+            in_transaction = conn is not None and conn.depth > 0
+            if writer is None or threading.current_thread() is writer.thread or in_transaction:
+                return fn(*args, **kwargs)
+            if materialize is not None and args:
+                args = (materialize(args[0]),) + args[1:]
+            return writer.submit(fn, *args, **kwargs).result()
+        return wrapper
+    return decorator
+
+def clear_read_cache(table_name=None):
+    """Drop cached reads of a table, or of every table; store_* calls do this on their own."""
+    _read_cache.invalidate(table_name)
+
+def check_read_cache(conn):
+    # PRAGMA data_version changes when another connection (another thread or process) commits
+    # to the database; their writes never called clear_read_cache here
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if getattr(_local, 'data_version', None) not in (None, version):
+        _read_cache.invalidate()
+    _local.data_version = version
+
+def get_cached_read(key):
+    if READ_CACHE_BYTES <= 0:
+        return None
+    if STORAGE_BACKEND == 'sqlite' or key[0] == 'calendar':
+        conn = create_connection()
+        if conn is not None:
+            check_read_cache(conn)
+    return _read_cache.get(key)
+
+def frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def set_storage_backend(backend):
+    global STORAGE_BACKEND
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if backend == 'parquet':
+        from .parquet_store import require_pyarrow
+        require_pyarrow()
+    STORAGE_BACKEND = backend
+
+def get_parquet_store():
+    # Imported on use: parquet_store builds on this module and pyarrow is optional
+    from . import parquet_store
+    return parquet_store
+
+def iter_chunks(records, chunk_size=STREAM_CHUNK_SIZE):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def encode_chunk(chunk, content_hash):
+    # Serialize one chunk of records and fold the JSON into the running content hash
+    json_data = [dumps(item) for item in chunk]
+    for item in json_data:
+        content_hash.update(item.encode('utf-8'))
+    return json_data
+
+def record_hash(item_json):
+    # Digest of a record's compact JSON: byte-identical records get the same content_hash
+    return hashlib.blake2b(item_json.encode('utf-8'), digest_size=RECORD_HASH_SIZE).digest()
+
+def content_row(record, schema):
+    """
+    Return the column values a typed table stores for a record, as SQLite's column affinity
+    keeps them (bools as integers, integers in REAL columns as floats).
+
+    Typed rows are hashed on these rather than the record's JSON, so a record fetched again
+    from the API and the same record read back from its row (where a missing nested model
+    becomes a dict of None fields) get the same content_hash.
+    """
+    row = []
+    for column, value in zip(schema, to_row(record, schema)):
+        if isinstance(value, bool):
+            value = int(value)
+        elif column.sql_type == 'REAL' and isinstance(value, int):
+            value = float(value)
+        elif column.sql_type == 'INTEGER' and isinstance(value, float) and value.is_integer():
+            value = int(value)
+        row.append(value)
+    return row
+
+def content_json(layout, item, item_json):
+    # What a record's content_hash is computed from: the typed row, or the legacy layout's JSON
+    return item_json if layout.schema is None else dumps(content_row(item, layout.schema))
+
+def get_year_field(table_name):
+    return 'season' if table_name in ['betting_lines', 'games', 'pregame_win_probabilities', 'advanced_team_game_stats'] else 'year'
+
+def get_table_columns(cursor, table_name):
+    # table_xinfo also lists generated columns, which table_info hides
+    return [row[1] for row in cursor.execute(f"PRAGMA table_xinfo({table_name})").fetchall()]
+
+def get_primary_key(cursor, table_name):
+    rows = cursor.execute(f"PRAGMA table_info({table_name})").fetchall()
+    return [row[1] for row in sorted(rows, key=lambda row: row[5]) if row[5]]
+
+def typed_layout(schema, archive, codec='json', hashed=True):
+    return TableLayout(schema, archive, frozenset(column.name for column in schema), get_codec(codec), hashed)
+
+def ensure_codec_table(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS payload_codecs (table_name TEXT PRIMARY KEY, codec TEXT NOT NULL)")
+
+def get_table_codec(cursor, table_name):
+    # Tables without a recorded codec predate codecs and hold plain JSON
+    ensure_codec_table(cursor)
+    row = cursor.execute("SELECT codec FROM payload_codecs WHERE table_name = ?", (table_name,)).fetchone()
+    return row[0] if row else 'json'
+
+def set_table_codec(cursor, table_name, codec):
+    ensure_codec_table(cursor)
+    cursor.execute("INSERT OR REPLACE INTO payload_codecs (table_name, codec) VALUES (?, ?)", (table_name, codec))
+
+def get_table_layout(cursor, table_name):
+    """Return the TableLayout of an existing raw table, or None if the table does not exist."""
+    columns = get_table_columns(cursor, table_name)
+    if not columns:
+        return None
+    schema = get_table_schema(table_name)
+    # Tables created before typed storage hold every record in a single JSON data column
+    hashed = 'content_hash' in columns and has_content_hash_index(cursor, table_name)
+    if schema is None or not all(column.name in columns for column in schema):
+        return TableLayout(None, True, frozenset(columns) - {'data', 'content_hash'}, get_codec('json'), hashed)
+    return typed_layout(schema, 'data' in columns, get_table_codec(cursor, table_name), hashed)
+
+def has_content_hash_index(cursor, table_name):
+    # The UNIQUE column constraint or the index ensure_content_hash builds; without it (e.g. a
+    # backfill that never committed) the column rejects nothing and has to be filled in again
+    for _, index_name, unique, _, _ in cursor.execute(f"PRAGMA index_list({table_name})").fetchall():
+        if unique and [row[2] for row in cursor.execute(f"PRAGMA index_info('{index_name}')").fetchall()] == ['content_hash']:
+            return True
+    return False
+
+def get_index_fields(table_name):
+    """Return the (partition, key) record fields of a raw table that get an index."""
+    schema = get_table_schema(table_name)
+    if schema is None:
+        return [], []
+    fields = {column.name for column in schema}
+    year_field = get_year_field(table_name)
+    partition = [year_field] + [field for field in PARTITION_FIELDS if field in fields] if year_field in fields else []
+    return partition, NATURAL_KEYS.get(table_name, [])
+
+def delete_duplicates(cursor, table_name, layout, key_fields):
+    # Keep the most recently stored copy of each key, which is what an upsert would have left
+    key_columns = ", ".join(field_sql(layout, field) for field in key_fields)
+    cursor.execute(f"""
+        DELETE FROM {table_name}
+        WHERE rowid NOT IN (SELECT MAX(rowid) FROM {table_name} GROUP BY {key_columns})
+    """)
+    return cursor.rowcount
+
+def ensure_key_index(cursor, table_name, layout, key):
+    # Upserts need a unique index on the natural key; duplicates appended before it existed are dropped first
+    index_name = f"idx_{table_name}_key"
+    indexes = {row[1]: row[2] for row in cursor.execute(f"PRAGMA index_list({table_name})").fetchall()}
+    if indexes.get(index_name):
+        return
+    if index_name in indexes:
+        cursor.execute(f"DROP INDEX {index_name}")
+    create_index = (
+        f"CREATE UNIQUE INDEX {index_name} ON {table_name} "
+        f"({', '.join(field_sql(layout, field) for field in key)})"
+    )
+    try:
+        cursor.execute(create_index)
+    except sqlite3.IntegrityError:
+        removed = delete_duplicates(cursor, table_name, layout, key)
+        print(f"Removed {removed} duplicate rows from {table_name}")
+        cursor.execute(create_index)
+
+def ensure_content_hash(cursor, table_name, layout):
+    """
+    Give a raw table the unique content_hash column that rejects byte-identical records.
+
+    Tables created before it existed get the column added and filled in from their stored
+    records, and repeated copies removed (keeping the latest), before the unique index is built.
+    Callers (store_* and migrate_content_hashes) run this inside transaction(), so the backfill and the index commit together; a
+    table left with the column but no index is filled in again the next time.
+    """
+    if layout.hashed:
+        return layout
+    if 'content_hash' not in get_table_columns(cursor, table_name):
+        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN content_hash BLOB")
+    if layout.schema is None:
+        select, to_record = "data", lambda row: loads(row[0])
+    else:
+        select = ', '.join(column.name for column in layout.schema)
+        to_record = lambda row: from_row(row, layout.schema, layout.codec)
+    last_rowid = -1
+    while True:
+        batch = cursor.execute(
+            f"SELECT rowid, {select} FROM {table_name} WHERE rowid > ? AND content_hash IS NULL ORDER BY rowid LIMIT ?",
+            (last_rowid, STREAM_CHUNK_SIZE)
+        ).fetchall()
+        if not batch:
+            break
+        last_rowid = batch[-1][0]
+        records = [to_record(row[1:]) for row in batch]
+        cursor.executemany(
+            f"UPDATE {table_name} SET content_hash = ? WHERE rowid = ?",
+            [(record_hash(content_json(layout, record, dumps(record))), row[0]) for record, row in zip(records, batch)]
+        )
+    cursor.execute(
+        f"DELETE FROM {table_name} WHERE rowid NOT IN (SELECT MAX(rowid) FROM {table_name} GROUP BY content_hash)"
+    )
+    if cursor.rowcount:
+        print(f"Removed {cursor.rowcount} duplicate rows from {table_name}")
+    # Tables created with the column declare it UNIQUE instead
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table_name}_content_hash ON {table_name} (content_hash)")
+    return layout._replace(hashed=True)
+
+def ensure_raw_indexes(cursor, table_name, layout):
+    """
+    Index a raw table's partition fields (year/season, week, season_type) and natural key.
+
+    Legacy JSON tables first get VIRTUAL generated columns extracting those fields, so
+    delete_partition and get_last_update hit the index through field_sql. On a SQLite
+    without generated column support the index is built on the json_extract expression.
+    The natural key index is unique, so write_chunk can upsert against it, and so is the
+    content_hash index added by ensure_content_hash.
+
+    Returns:
+    TableLayout: layout, with any generated columns added to its columns.
+    """
+    partition, key = get_index_fields(table_name)
+    if layout.schema is None:
+        added = set()
+        for field in dict.fromkeys(partition + key):
+            if field in layout.columns:
+                continue
+            try:
+                cursor.execute(
+                    f"ALTER TABLE {table_name} ADD COLUMN {field} "
+                    f"GENERATED ALWAYS AS (json_extract(data, '$.{field}')) VIRTUAL"
+                )
+                added.add(field)
+            except sqlite3.OperationalError:
+                break
+        layout = layout._replace(columns=layout.columns | added)
+    if partition:
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table_name}_partition ON {table_name} "
+            f"({', '.join(field_sql(layout, field) for field in partition)})"
+        )
+    # A primary key on the same fields already is the key index
+    if key and key != get_primary_key(cursor, table_name):
+        ensure_key_index(cursor, table_name, layout, key)
+    if get_table_schema(table_name) is not None:
+        layout = ensure_content_hash(cursor, table_name, layout)
+    return layout
+
+def create_typed_table(cursor, table_name, schema, archive=False, primary_key=None):
+    definitions = [f"{column.name} {column.sql_type}" for column in schema]
+    if archive:
+        definitions.append("data JSON")
+    definitions.append("content_hash BLOB UNIQUE")
+    if primary_key:
+        definitions.append(f"PRIMARY KEY ({', '.join(primary_key)})")
+    cursor.execute(f"CREATE TABLE {table_name} ({', '.join(definitions)})")
+
+def ensure_raw_table(cursor, table_name, legacy_columns="year INTEGER, data JSON"):
+    """
+    Create a raw table if it does not exist and return its TableLayout.
+
+    Tables with a schema in schemas.py are created with typed columns (plus a data column when
+    ARCHIVE_RAW_JSON is set) and their NATURAL_KEYS as primary key; others are created with
+    legacy_columns. Either way the table's partition fields and natural key are indexed by
+    ensure_raw_indexes.
+    """
+    layout = get_table_layout(cursor, table_name)
+    if layout is None:
+        schema = get_table_schema(table_name)
+        if schema is not None:
+            create_typed_table(cursor, table_name, schema, ARCHIVE_RAW_JSON, NATURAL_KEYS.get(table_name))
+            set_table_codec(cursor, table_name, PAYLOAD_CODEC)
+            layout = typed_layout(schema, ARCHIVE_RAW_JSON, PAYLOAD_CODEC)
+        else:
+            cursor.execute(f"CREATE TABLE {table_name} ({legacy_columns})")
+            layout = get_table_layout(cursor, table_name)
+        print(f"Created table {table_name}")
+    return ensure_raw_indexes(cursor, table_name, layout)
+
+def field_sql(layout, field):
+    # SQL expression for a top-level record field: its column (typed or generated) if it has one
+    return field if field in layout.columns else f"json_extract(data, '$.{field}')"
+
+def write_chunk(cursor, table_name, layout, chunk, json_data, legacy_columns, legacy_row, key=None):
+    """
+    Insert one chunk of records; legacy_row(item, item_json) builds a legacy-layout row.
+
+    With key (the table's natural key fields), a record whose key is already stored updates
+    that row instead (INSERT ... ON CONFLICT DO UPDATE), so rewriting records is idempotent.
+    On tables with a content_hash, a record identical to a stored one is skipped without a write.
+    """
+    hashes = [record_hash(content_json(layout, item, item_json)) for item, item_json in zip(chunk, json_data)] if layout.hashed else None
+    if layout.schema is None:
+        columns = legacy_columns
+        rows = [legacy_row(item, item_json) for item, item_json in zip(chunk, json_data)]
+    else:
+        columns = [column.name for column in layout.schema]
+        rows = [to_row(item, layout.schema, layout.codec) for item in chunk]
+        if layout.archive:
+            columns = columns + ['data']
+            if layout.codec.name != 'json':
+                json_data = [layout.codec.encode(item) for item in chunk]
+            rows = [row + (item_json,) for row, item_json in zip(rows, json_data)]
+    if hashes is not None:
+        columns = list(columns) + ['content_hash']
+        rows = [tuple(row) + (item_hash,) for row, item_hash in zip(rows, hashes)]
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    if hashes is not None:
+        query += " ON CONFLICT (content_hash) DO NOTHING"
+    if key:
+        updates = [f"{column} = excluded.{column}" for column in columns if column not in key]
+        query += f" ON CONFLICT ({', '.join(field_sql(layout, field) for field in key)}) "
+        query += f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+    cursor.executemany(query, rows)
+
+def delete_partition(cursor, table_name, layout, year, week=None, season_type=None):
+    # Delete existing data for the specific year, narrowed to one week/season type if given
+    delete_query = f"DELETE FROM {table_name} WHERE {field_sql(layout, get_year_field(table_name))} = ?"
+    delete_params = [year]
+    if week is not None:
+        delete_query += f" AND {field_sql(layout, 'week')} = ?"
+        delete_params.append(week)
+    if season_type is not None:
+        delete_query += f" AND {field_sql(layout, 'season_type')} = ?"
+        delete_params.append(season_type)
+    cursor.execute(delete_query, delete_params)
+
+@queued_write(materialize_records)
+def store_raw_data(data, table_name, if_exists='append', year=None, week=None, season_type=None):
+    """
+    Write records to a raw table, as typed columns or into the legacy (year, data) layout.
+
+    data may be any iterable, including a generator that yields records as API responses
+    arrive; it is consumed and written STREAM_CHUNK_SIZE records at a time inside one
+    transaction, so only one chunk is held as JSON at any point.
+
+    Returns:
+    WriteSummary: Number of rows written and a hash of their JSON payloads.
+    """
+    if STORAGE_BACKEND == 'parquet':
+        summary = get_parquet_store().store_records(data, table_name, year, week, season_type)
+        clear_read_cache(table_name)
+        return summary
+    conn = create_connection()
+    row_count = 0
+    content_hash = hashlib.sha256()
     if conn is not None:
         cursor = conn.cursor()
+        layout = ensure_raw_table(cursor, table_name)
+        year_field = get_year_field(table_name)
         
-        # Check if the table exists
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-        table_exists = cursor.fetchone() is not None
-        
-        # Convert data to JSON strings
-        json_data = [json.dumps(item) for item in data]
+        for chunk in iter_chunks(data):
+            json_data = encode_chunk(chunk, content_hash)
+            if year is not None and row_count == 0:
+                # This waits for the first chunk so a failed fetch never clears stored data
+                delete_partition(cursor, table_name, layout, year, week, season_type)
+            # Without a specific year, each record's own season/year is used (upsert by natural key)
+            write_chunk(
+                cursor, table_name, layout, chunk, json_data, ['year', 'data'],
+                lambda item, item_json: (year if year is not None else item[year_field], item_json),
+                key=NATURAL_KEYS.get(table_name)
+            )
+            row_count += len(chunk)
         
-        if not table_exists:
-            cursor.execute(f"CREATE TABLE {table_name} (year INTEGER, data JSON)")
-            print(f"Created table {table_name}")
-        
-        # Determine the year field based on the table_name
-        year_field = 'season' if table_name in ['betting_lines', 'games', 'pregame_win_probabilities'] else 'year'
-        
-        if year is not None:
-            # Delete existing data for the specific year
-            cursor.execute(f"DELETE FROM {table_name} WHERE json_extract(data, '$.{year_field}') = ?", (year,))
-            # Insert new data for the year
-            cursor.executemany(f"INSERT INTO {table_name} (year, data) VALUES (?, ?)", [(year, item) for item in json_data])
-            print(f"Updated data for year {year} in {table_name}")
-        else:
-            # Append all data if no specific year is provided
-            cursor.executemany(f"INSERT INTO {table_name} (year, data) VALUES (?, ?)", 
-                               [(json.loads(item)[year_field], item) for item in json_data])
+        if row_count and year is not None:
+            if week is not None:
+                print(f"Updated data for year {year}, week {week} in {table_name}")
+            else:
+                print(f"Updated data for year {year} in {table_name}")
+        elif row_count:
             print(f"Appended data in {table_name}")
         
         conn.commit()
         conn.close()
+        clear_read_cache(table_name)
     else:
         print("Error! Cannot create the database connection.")
+    return WriteSummary(row_count, content_hash.hexdigest())
+
 
+@queued_write(materialize_partitions)
+def store_raw_partitions(partitions, table_name):
+    """
+    Replace several years of a raw table in one transaction.
 
-def store_team_game_stats(data, table_name):
+    partitions yields (year, records) pairs; each year's stored rows are deleted when its
+    first record arrives, so a year whose fetch failed or came back empty keeps its data.
+    Records are streamed in chunks like store_raw_data.
+
+    Returns:
+    dict: year -> WriteSummary for every year in partitions.
+    """
+    if STORAGE_BACKEND == 'parquet':
+        summaries = get_parquet_store().store_partitions(partitions, table_name)
+        clear_read_cache(table_name)
+        return summaries
     conn = create_connection()
+    summaries = {}
     if conn is not None:
         cursor = conn.cursor()
+        layout = ensure_raw_table(cursor, table_name)
+        for year, records in partitions:
+            row_count = 0
+            content_hash = hashlib.sha256()
+            for chunk in iter_chunks(records):
+                if row_count == 0:
+                    delete_partition(cursor, table_name, layout, year)
+                json_data = encode_chunk(chunk, content_hash)
+                write_chunk(
+                    cursor, table_name, layout, chunk, json_data, ['year', 'data'],
+                    lambda item, item_json, year=year: (year, item_json), key=NATURAL_KEYS.get(table_name)
+                )
+                row_count += len(chunk)
+            summaries[year] = WriteSummary(row_count, content_hash.hexdigest())
         
-        # Check if the table exists
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-        table_exists = cursor.fetchone() is not None
+        conn.commit()
+        conn.close()
+        clear_read_cache(table_name)
+        written = sorted(year for year, summary in summaries.items() if summary.row_count)
+        if written:
+            print(f"Updated data for years {', '.join(map(str, written))} in {table_name}")
+    else:
+        print("Error! Cannot create the database connection.")
+    return summaries
+
+
+@queued_write(materialize_records)
+def store_team_game_stats(data, table_name, year=None):
+    # Box scores carry no season; year (the fetched season) only picks their Parquet file
+    if STORAGE_BACKEND == 'parquet':
+        summary = get_parquet_store().store_records(data, table_name, file_year=year)
+        clear_read_cache(table_name)
+        return summary
+    conn = create_connection()
+    row_count = 0
+    content_hash = hashlib.sha256()
+    if conn is not None:
+        cursor = conn.cursor()
         
         # If the table does not exist, create it with 'id' as primary key
-        if not table_exists:
-            cursor.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, data JSON)")
-            print(f"Created table {table_name}")
-        
-        # Prepare data for insertion
-        insert_data = []
-        for item in data:
-            id = item['id']
-            data_json = json.dumps(item)
-            insert_data.append((id, data_json))
+        layout = ensure_raw_table(cursor, table_name, "id INTEGER PRIMARY KEY, data JSON")
         
-        # Use 'INSERT OR REPLACE INTO' to update existing records and insert new ones
-        cursor.executemany(f"INSERT OR REPLACE INTO {table_name} (id, data) VALUES (?, ?)", insert_data)
-        print(f"Inserted/Updated data in {table_name}")
+        for chunk in iter_chunks(data):
+            json_data = encode_chunk(chunk, content_hash)
+            # Upsert on 'id' to update existing records and insert new ones
+            write_chunk(
+                cursor, table_name, layout, chunk, json_data, ['id', 'data'],
+                lambda item, item_json: (item['id'], item_json), key=['id']
+            )
+            row_count += len(chunk)
+        if row_count:
+            print(f"Inserted/Updated data in {table_name}")
         
         conn.commit()
         conn.close()
+        clear_read_cache(table_name)
+    else:
+        print("Error! Cannot create the database connection.")
+    return WriteSummary(row_count, content_hash.hexdigest())
+
+def remove_duplicate_rows(table_name, key_fields=None):
+    """
+    Delete repeated records from a raw table, keeping the most recently stored copy.
+
+    Tables written before ingest-time de-duplication hold cross-conference games twice;
+    this shrinks them without refetching.
+
+    Args:
+    table_name (str): Raw table to clean up.
+    key_fields (list, optional): Fields identifying a record; defaults to the table's NATURAL_KEYS.
+
+    Returns:
+    int: Number of rows deleted.
+    """
+    key_fields = key_fields or NATURAL_KEYS[table_name]
+    if STORAGE_BACKEND == 'parquet':
+        # Parquet files are de-duplicated on their natural key whenever they are written
+        return 0
+    conn = create_connection()
+    removed = 0
+    if conn is not None:
+        cursor = conn.cursor()
+        layout = get_table_layout(cursor, table_name)
+        if layout is not None:
+            removed = delete_duplicates(cursor, table_name, layout, key_fields)
+            conn.commit()
+            clear_read_cache(table_name)
+            print(f"Removed {removed} duplicate rows from {table_name}")
+        conn.close()
     else:
         print("Error! Cannot create the database connection.")
+    return removed
 
 def fetch_raw_data(table_name):
+    if STORAGE_BACKEND == 'parquet':
+        return get_parquet_store().fetch_records(table_name)
     conn = create_connection()
     if conn is not None:
         cursor = conn.cursor()
-        cursor.execute(f"SELECT data FROM {table_name}")
-        raw_data = cursor.fetchall()
+        layout = get_table_layout(cursor, table_name)
+        if layout is None:
+            raise sqlite3.OperationalError(f"no such table: {table_name}")
+        if layout.archive:
+            cursor.execute(f"SELECT data FROM {table_name}")
+            raw_data = cursor.fetchall()
+            conn.close()
+            if layout.codec.name == 'json':
+                # One parse for the whole table, typed when the table has a record type
+                return loads_many([item[0] for item in raw_data], get_record_type(table_name))
+            return [layout.codec.decode(item[0]) for item in raw_data]
+        # Typed tables without an archive column are rebuilt into nested records from their columns
+        cursor.execute(f"SELECT {', '.join(column.name for column in layout.schema)} FROM {table_name}")
+        rows = cursor.fetchall()
         conn.close()
-        return [json.loads(item[0]) for item in raw_data]
+        return [from_row(row, layout.schema, layout.codec) for row in rows]
     else:
         print("Error! Cannot create the database connection.")
         return None
 
+def column_sql(layout, column):
+    # SQL expression for a schema column: the column itself, or its path in the legacy JSON
+    if column.name in layout.columns:
+        return column.name
+    return f"json_extract(data, '$.{'.'.join(column.path)}')"
+
+def partition_filter(cursor, table_name, layout, start_year=None, end_year=None, season_type=None):
+    """Return the WHERE conditions and parameters selecting a year range and season type."""
+    conditions, params = [], []
+    if start_year is None and end_year is None and season_type is None:
+        return conditions, params
+    if table_name in GAME_ID_COLUMNS:
+        # Select through the games partition index, then match on the game id
+        games_layout = get_table_layout(cursor, 'games')
+        if games_layout is None:
+            raise sqlite3.OperationalError("no such table: games")
+        game_conditions, params = partition_filter(cursor, 'games', games_layout, start_year, end_year, season_type)
+        conditions.append(
+            f"{field_sql(layout, GAME_ID_COLUMNS[table_name])} IN "
+            f"(SELECT {field_sql(games_layout, 'id')} FROM games WHERE {' AND '.join(game_conditions)})"
+        )
+        return conditions, params
+    fields = {column.name for column in get_table_schema(table_name)}
+    year_field = get_year_field(table_name)
+    for field, operator, value in [(year_field, '>=', start_year), (year_field, '<=', end_year), ('season_type', '=', season_type)]:
+        if value is None:
+            continue
+        if field not in fields:
+            raise ValueError(f"{table_name} records have no {field} field to filter on")
+        conditions.append(f"{field_sql(layout, field)} {operator} ?")
+        params.append(value)
+    return conditions, params
+
+def iter_raw_data(table_name, start_year=None, end_year=None, season_type=None, columns=None, chunk_size=READ_CHUNK_SIZE):
+    """
+    Stream a raw table as DataFrames of at most chunk_size rows.
+
+    Only the selected years, season type and columns are read, through the partition index,
+    so a consumer that needs one season or a few columns never loads the whole history.
+    Columns are the flattened schema columns (offense_ppa); list columns are decoded.
+
+    A read that fits in READ_CACHE_BYTES is kept in memory, and repeating it yields copies of
+    the cached chunks until a store_* call writes to the table (or to games, for tables
+    filtered through GAME_ID_COLUMNS).
+
+    Args:
+    table_name (str): Raw table with a schema in schemas.py.
+    start_year (int, optional): First season to read.
+    end_year (int, optional): Last season to read.
+    season_type (str, optional): 'regular' or 'postseason'.
+    columns (list, optional): Columns to read; defaults to all of them.
+    chunk_size (int): Rows per yielded DataFrame.
+
+    Yields:
+    pd.DataFrame: The next chunk of rows, in whatever order the index scan returns them.
+    """
+    filtered = not (start_year is None and end_year is None and season_type is None)
+    tables = [table_name] + (['games'] if table_name in GAME_ID_COLUMNS and filtered else [])
+    location = get_parquet_store().PARQUET_DIR if STORAGE_BACKEND == 'parquet' else DB_FILE
+    key = (
+        'raw', STORAGE_BACKEND, location, table_name, start_year, end_year, season_type,
+        None if columns is None else tuple(columns), chunk_size
+    )
+    cached = get_cached_read(key)
+    if cached is not None:
+        for df in cached:
+            yield df.copy()
+        return
+    generation = _read_cache.generation
+    chunks, size = ([], 0) if READ_CACHE_BYTES > 0 else (None, 0)
+    for df in scan_raw_data(table_name, start_year, end_year, season_type, columns, chunk_size):
+        if chunks is not None:
+            size += frame_size(df)
+            if size > READ_CACHE_BYTES:
+                # Stop collecting once the read outgrows the budget, so streaming stays streaming
+                chunks = None
+            else:
+                chunks.append(df)
+                df = df.copy()
+        yield df
+    if chunks is not None:
+        _read_cache.put(key, tables, chunks, size, generation)
+
+def scan_raw_data(table_name, start_year, end_year, season_type, columns, chunk_size):
+    # iter_raw_data without the cache
+    if STORAGE_BACKEND == 'parquet':
+        yield from get_parquet_store().iter_frames(table_name, start_year, end_year, season_type, columns, chunk_size)
+        return
+    conn = create_connection()
+    if conn is None:
+        raise sqlite3.OperationalError(f"Cannot open {DB_FILE}")
+    cursor = conn.cursor()
+    layout = get_table_layout(cursor, table_name)
+    if layout is None:
+        raise sqlite3.OperationalError(f"no such table: {table_name}")
+    schema = get_table_schema(table_name)
+    if schema is None:
+        raise ValueError(f"No typed schema for table {table_name}")
+    if columns is None:
+        selected = list(schema)
+    else:
+        by_name = {column.name: column for column in schema}
+        unknown = [name for name in columns if name not in by_name]
+        if unknown:
+            raise ValueError(f"Unknown columns for {table_name}: {', '.join(unknown)}")
+        selected = [by_name[name] for name in columns]
+    # Legacy tables answer the same query by extracting each field from the JSON (field_sql)
+    conditions, params = partition_filter(cursor, table_name, layout, start_year, end_year, season_type)
+    query = f"SELECT {', '.join(column_sql(layout, column) for column in selected)} FROM {table_name}"
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+
+    names = [column.name for column in selected]
+    decoded = [index for index, column in enumerate(selected) if needs_decoding(column)]
+    rows = cursor.execute(query, params)
+    while True:
+        batch = rows.fetchmany(chunk_size)
+        if not batch:
+            break
+        values = [list(column_values) for column_values in zip(*batch)]
+        for index in decoded:
+            values[index] = [decode_value(value, selected[index], layout.codec) for value in values[index]]
+        yield pd.DataFrame(dict(zip(names, values)), columns=names)
+
+def read_raw_data(table_name, **filters):
+    """Read the selected part of a raw table into one DataFrame; takes iter_raw_data's filters."""
+    chunks = list(iter_raw_data(table_name, **filters))
+    if not chunks:
+        columns = filters.get('columns') or [column.name for column in get_table_schema(table_name)]
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)
+
 def get_last_update(table_name):
     conn = create_connection()
     if conn is not None:
         cursor = conn.cursor()
+        ensure_manifest_table(cursor)
         
-        # Check if the table exists
+        # Indexed lookup on the manifest primary key (endpoint, year, ...)
+        cursor.execute("SELECT MAX(year) FROM fetch_manifest WHERE endpoint = ?", (table_name,))
+        result = cursor.fetchone()
+        if result and result[0] is not None:
+            conn.close()
+            return result[0]
+        
+        if STORAGE_BACKEND == 'parquet':
+            conn.close()
+            return get_parquet_store().get_last_year(table_name)
+
+        # Fall back to scanning tables stored before the manifest existed
         cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
         if cursor.fetchone() is None:
             print(f"Table '{table_name}' does not exist yet.")
             conn.close()
             return None
         
-        cursor.execute(f"SELECT MAX(json_extract(data, '$.season')) as last_season FROM {table_name}")
+        # MAX over the indexed year/season column reads one index entry instead of the table
+        layout = get_table_layout(cursor, table_name)
+        if table_name in GAME_ID_COLUMNS:
+            # Box scores carry no season: theirs is the season of the latest stored game
+            games_layout = get_table_layout(cursor, 'games')
+            if games_layout is None:
+                conn.close()
+                return None
+            cursor.execute(
+                f"SELECT MAX({field_sql(games_layout, 'season')}) as last_season FROM games "
+                f"WHERE {field_sql(games_layout, 'id')} IN (SELECT {field_sql(layout, GAME_ID_COLUMNS[table_name])} FROM {table_name})"
+            )
+            result = cursor.fetchone()
+            conn.close()
+            return result[0] if result and result[0] is not None else None
+        year_field = get_year_field(table_name)
+        if year_field not in layout.columns:
+            year_field = 'year' if 'year' in layout.columns else 'season'
+        if year_field not in layout.columns and not layout.archive:
+            # A typed table without a year/season column or a data column to extract it from
+            conn.close()
+            return None
+        cursor.execute(f"SELECT MAX({field_sql(layout, year_field)}) as last_season FROM {table_name}")
         result = cursor.fetchone()
+        conn.commit()
         conn.close()
-        
+
         return result[0] if result and result[0] is not None else None
     else:
         print("Error! Cannot create the database connection.")
         return None
 
+def ensure_manifest_table(cursor):
+    # week and season_type use sentinels instead of NULL so they can be part of the primary key
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fetch_manifest (
+            endpoint TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            week INTEGER NOT NULL,
+            season_type TEXT NOT NULL,
+            fetched_at TEXT,
+            row_count INTEGER,
+            content_hash TEXT,
+            complete INTEGER,
+            PRIMARY KEY (endpoint, year, week, season_type)
+        )
+    """)
+
+def manifest_key(week=None, season_type=None):
+    return (ALL_WEEKS if week is None else week, ALL_SEASON_TYPES if season_type is None else season_type)
+
+@queued_write()
+def record_fetch(endpoint, year, summary, week=None, season_type=None, complete=True):
+    """
+    Record a fetched (endpoint, year, week, season_type) partition in the manifest.
+
+    Args:
+    endpoint (str): Warehouse table the partition was written to.
+    year (int): Season of the partition.
+    summary (WriteSummary): Row count and content hash returned by the store_* call.
+    week (int, optional): Week of a week-scoped fetch; None for the whole season.
+    season_type (str, optional): 'regular' or 'postseason'; None for endpoints without season types.
+    complete (bool): Whether the partition is final and can be skipped by later runs.
+    """
+    conn = create_connection()
+    if conn is not None:
+        cursor = conn.cursor()
+        ensure_manifest_table(cursor)
+        week_key, season_type_key = manifest_key(week, season_type)
+        cursor.execute("""
+            INSERT OR REPLACE INTO fetch_manifest
+                (endpoint, year, week, season_type, fetched_at, row_count, content_hash, complete)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (endpoint, year, week_key, season_type_key, datetime.now(timezone.utc).isoformat(),
+              summary.row_count, summary.content_hash, int(complete)))
+        conn.commit()
+        conn.close()
+    else:
+        print("Error! Cannot create the database connection.")
+
+def get_complete_partitions(endpoint):
+    """Return the set of (year, week, season_type) partitions of an endpoint marked complete."""
+    conn = create_connection()
+    if conn is not None:
+        cursor = conn.cursor()
+        ensure_manifest_table(cursor)
+        cursor.execute(
+            "SELECT year, week, season_type FROM fetch_manifest WHERE endpoint = ? AND complete = 1",
+            (endpoint,)
+        )
+        partitions = {
+            (year, None if week == ALL_WEEKS else week, None if season_type == ALL_SEASON_TYPES else season_type)
+            for year, week, season_type in cursor.fetchall()
+        }
+        conn.close()
+        return partitions
+    else:
+        print("Error! Cannot create the database connection.")
+        return set()
+
+def ensure_failed_units_table(cursor):
+    # Same sentinel convention as fetch_manifest so every key column can be part of the primary key
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS failed_fetch_units (
+            endpoint TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            conference TEXT NOT NULL,
+            season_type TEXT NOT NULL,
+            week INTEGER NOT NULL,
+            error TEXT,
+            attempts INTEGER,
+            failed_at TEXT,
+            PRIMARY KEY (endpoint, year, conference, season_type, week)
+        )
+    """)
+
+def failed_unit_key(unit):
+    week_key, season_type_key = manifest_key(unit.week, unit.season_type)
+    return (unit.year, ALL_CONFERENCES if unit.conference is None else unit.conference, season_type_key, week_key)
+
+@queued_write()
+def record_failed_units(endpoint, failures):
+    """
+    Checkpoint work units whose fetch failed after all retries so they can be resumed later.
+
+    Args:
+    endpoint (str): Warehouse table the units were meant for.
+    failures (list): (unit, error) pairs, where unit has year, conference, season_type and week.
+    """
+    if not failures:
+        return
+    conn = create_connection()
+    if conn is not None:
+        cursor = conn.cursor()
+        ensure_failed_units_table(cursor)
+        failed_at = datetime.now(timezone.utc).isoformat()
+        cursor.executemany("""
+            INSERT INTO failed_fetch_units
+                (endpoint, year, conference, season_type, week, error, attempts, failed_at)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT (endpoint, year, conference, season_type, week) DO UPDATE SET
+                error = excluded.error, attempts = attempts + 1, failed_at = excluded.failed_at
+        """, [(endpoint, *failed_unit_key(unit), str(error).strip(), failed_at) for unit, error in failures])
+        conn.commit()
+        conn.close()
+    else:
+        print("Error! Cannot create the database connection.")
+
+@queued_write()
+def clear_failed_units(endpoint, units):
+    """Remove units that have since been fetched successfully from the failure checkpoint."""
+    if not units:
+        return
+    conn = create_connection()
+    if conn is not None:
+        cursor = conn.cursor()
+        ensure_failed_units_table(cursor)
+        cursor.executemany("""
+            DELETE FROM failed_fetch_units
+            WHERE endpoint = ? AND year = ? AND conference = ? AND season_type = ? AND week = ?
+        """, [(endpoint, *failed_unit_key(unit)) for unit in units])
+        conn.commit()
+        conn.close()
+    else:
+        print("Error! Cannot create the database connection.")
+
+def get_failed_units(endpoint=None):
+    """
+    Return the checkpointed failed units as a dict of endpoint -> list of
+    (year, conference, season_type, week) tuples, with sentinels mapped back to None.
+    """
+    conn = create_connection()
+    if conn is not None:
+        cursor = conn.cursor()
+        ensure_failed_units_table(cursor)
+        query = "SELECT endpoint, year, conference, season_type, week FROM failed_fetch_units"
+        params = ()
+        if endpoint is not None:
+            query += " WHERE endpoint = ?"
+            params = (endpoint,)
+        cursor.execute(query + " ORDER BY endpoint, year, season_type, week, conference", params)
+        failed = {}
+        for name, year, conference, season_type, week in cursor.fetchall():
+            failed.setdefault(name, []).append((
+                year,
+                None if conference == ALL_CONFERENCES else conference,
+                None if season_type == ALL_SEASON_TYPES else season_type,
+                None if week == ALL_WEEKS else week
+            ))
+        conn.close()
+        return failed
+    else:
+        print("Error! Cannot create the database connection.")
+        return {}
+
+@queued_write()
 def store_calendar_data(data, year):
     conn = create_connection()
     if conn is not None:
@@ -128,18 +1298,25 @@ def store_calendar_data(data, year):
             print("Created table calendar")
         
         # Convert data to JSON string
-        json_data = json.dumps(data)
+        json_data = dumps(data)
         
         # Insert or replace data for the given year
         cursor.execute("INSERT OR REPLACE INTO calendar (year, data) VALUES (?, ?)", (year, json_data))
         
         conn.commit()
         conn.close()
+        clear_read_cache('calendar')
         print(f"Calendar data for year {year} stored/updated")
     else:
         print("Error! Cannot create the database connection.")
 
 def fetch_calendar_data(year):
+    key = ('calendar', DB_FILE, year)
+    cached = get_cached_read(key)
+    if cached is not None:
+        # Copied so a caller editing the weeks cannot change the cached ones
+        return copy.deepcopy(cached)
+    generation = _read_cache.generation
     conn = create_connection()
     if conn is not None:
         cursor = conn.cursor()
@@ -158,7 +1335,10 @@ def fetch_calendar_data(year):
         conn.close()
         
         if result:
-            return json.loads(result[0])
+            calendar_data = loads(result[0])
+            # Sized by its JSON text: the weeks of a season are a few KB either way
+            _read_cache.put(key, ['calendar'], copy.deepcopy(calendar_data), len(result[0]), generation)
+            return calendar_data
         else:
             print(f"No calendar data found for year {year}")
             return None
@@ -166,46 +1346,175 @@ def fetch_calendar_data(year):
         print("Error! Cannot create the database connection.")
         return None
     
+@queued_write(materialize_records)
 def store_advanced_team_game_stats(data, table_name):
+    if STORAGE_BACKEND == 'parquet':
+        summary = get_parquet_store().store_records(data, table_name)
+        clear_read_cache(table_name)
+        return summary
     conn = create_connection()
+    row_count = 0
+    content_hash = hashlib.sha256()
     if conn is not None:
         cursor = conn.cursor()
         
-        # Check if the table exists
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-        table_exists = cursor.fetchone() is not None
-        
         # If the table does not exist, create it with a composite primary key
-        if not table_exists:
-            cursor.execute(f"""
-                CREATE TABLE {table_name} (
-                    game_id INTEGER,
-                    team TEXT,
-                    data JSON,
-                    PRIMARY KEY (game_id, team)
-                )
-            """)
-            print(f"Created table {table_name}")
-        
-        # Prepare data for insertion
-        insert_data = []
-        for item in data:
-            game_id = item['game_id']
-            team = item['team']
-            data_json = json.dumps(item)
-            insert_data.append((game_id, team, data_json))
-        
-        # Use 'INSERT OR REPLACE INTO' to update existing records and insert new ones
-        cursor.executemany(
-            f"INSERT OR REPLACE INTO {table_name} (game_id, team, data) VALUES (?, ?, ?)",
-            insert_data
+        layout = ensure_raw_table(
+            cursor, table_name, "game_id INTEGER, team TEXT, data JSON, PRIMARY KEY (game_id, team)"
         )
-        print(f"Inserted/Updated data in {table_name}")
+        
+        for chunk in iter_chunks(data):
+            json_data = encode_chunk(chunk, content_hash)
+            # Upsert on (game_id, team) to update existing records and insert new ones
+            write_chunk(
+                cursor, table_name, layout, chunk, json_data, ['game_id', 'team', 'data'],
+                lambda item, item_json: (item['game_id'], item['team'], item_json), key=['game_id', 'team']
+            )
+            row_count += len(chunk)
+        if row_count:
+            print(f"Inserted/Updated data in {table_name}")
         
         conn.commit()
         conn.close()
+        clear_read_cache(table_name)
     else:
         print("Error! Cannot create the database connection.")
+    return WriteSummary(row_count, content_hash.hexdigest())
+
+
+def migrate_raw_table(table_name, archive=None, codec=None):
+    """
+    Convert a legacy (year, data) JSON blob table to typed columns in place.
+
+    Args:
+    table_name (str): Raw table with a schema in schemas.py.
+    archive (bool, optional): Keep the record in a data column; defaults to ARCHIVE_RAW_JSON.
+    codec (str, optional): Payload codec of the typed table; defaults to PAYLOAD_CODEC.
+
+    Returns:
+    int: Number of rows migrated, or 0 if the table is missing or already typed.
+    """
+    archive = ARCHIVE_RAW_JSON if archive is None else archive
+    codec = codec or PAYLOAD_CODEC
+    schema = get_table_schema(table_name)
+    if schema is None:
+        raise ValueError(f"No typed schema for table {table_name}")
+    primary_key = NATURAL_KEYS.get(table_name)
+    migrated = 0
+    with transaction() as conn:
+        cursor = conn.cursor()
+        layout = get_table_layout(cursor, table_name)
+        if layout is None or layout.schema is not None:
+            return 0
+        typed_table = f"{table_name}__typed"
+        cursor.execute(f"DROP TABLE IF EXISTS {typed_table}")
+        create_typed_table(cursor, typed_table, schema, archive, primary_key)
+        new_layout = typed_layout(schema, archive, codec)
+        rows = cursor.execute(f"SELECT data FROM {table_name} ORDER BY rowid")
+        while True:
+            batch = rows.fetchmany(STREAM_CHUNK_SIZE)
+            if not batch:
+                break
+            records = loads_many([item[0] for item in batch], get_record_type(table_name))
+            # Re-serialized so archived JSON and content hashes match what store_* writes
+            json_data = [dumps(record) for record in records]
+            write_chunk(conn.cursor(), typed_table, new_layout, records, json_data, None, None, key=primary_key)
+            migrated += len(batch)
+        cursor.execute(f"DROP TABLE {table_name}")
+        cursor.execute(f"ALTER TABLE {typed_table} RENAME TO {table_name}")
+        set_table_codec(cursor, table_name, codec)
+        ensure_raw_indexes(cursor, table_name, new_layout)
+    print(f"Migrated {migrated} rows of {table_name} to typed columns")
+    return migrated
+
+def recode_raw_table(table_name, codec):
+    """
+    Re-encode the list columns and data column of one raw table with another payload codec.
+
+    Legacy JSON blob tables are migrated to typed columns with the codec instead.
+
+    Returns:
+    int: Number of rows rewritten.
+    """
+    new_codec = get_codec(codec)
+    with transaction() as conn:
+        cursor = conn.cursor()
+        layout = get_table_layout(cursor, table_name)
+        if layout is None:
+            return 0
+        if layout.schema is None:
+            return migrate_raw_table(table_name, codec=codec)
+        if layout.codec.name == codec:
+            return 0
+        columns = [column for column in layout.schema if needs_decoding(column) and column.swagger_type != 'bool']
+        names = [column.name for column in columns] + (['data'] if layout.archive else [])
+        rewritten = 0
+        last_rowid = -1
+        while names:
+            # Page by rowid rather than holding a cursor open over the rows being updated
+            batch = cursor.execute(
+                f"SELECT rowid, {', '.join(names)} FROM {table_name} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, STREAM_CHUNK_SIZE)
+            ).fetchall()
+            if not batch:
+                break
+            last_rowid = batch[-1][0]
+            updates = []
+            for rowid, *values in batch:
+                recoded = [None if value is None else new_codec.encode(layout.codec.decode(value)) for value in values]
+                updates.append((*recoded, rowid))
+            conn.executemany(
+                f"UPDATE {table_name} SET {', '.join(f'{name} = ?' for name in names)} WHERE rowid = ?", updates
+            )
+            rewritten += len(batch)
+        set_table_codec(cursor, table_name, codec)
+    print(f"Re-encoded {rewritten} rows of {table_name} with {codec}")
+    return rewritten
+
+def recode_raw_tables(codec, tables=None, vacuum=True):
+    """
+    One-shot migration of the warehouse's raw tables to a payload codec.
+
+    Args:
+    codec (str): Target codec from payload_codecs.CODECS.
+    tables (list, optional): Raw tables to convert; defaults to every table in schemas.py.
+    vacuum (bool): Run VACUUM afterwards so the freed pages shrink the database file.
+
+    Returns:
+    dict: table -> number of rows rewritten.
+    """
+    rewritten = {table_name: recode_raw_table(table_name, codec) for table_name in tables or RAW_TABLE_MODELS}
+    if vacuum and any(rewritten.values()):
+        conn = create_connection()
+        conn.execute("VACUUM")
+    return rewritten
+
+def migrate_content_hashes(tables=None):
+    """
+    One-shot migration giving the warehouse's raw tables their unique content_hash.
+
+    Tables stored before content hashes existed get the column filled in, their repeated records
+    removed (keeping the latest) and, for legacy JSON blob tables, the generated partition columns
+    and indexes. store_* calls do the same for a table they write to; reads never alter a table.
+
+    Args:
+    tables (list, optional): Raw tables to migrate; defaults to every table in schemas.py.
+
+    Returns:
+    dict: table -> number of duplicate rows removed.
+    """
+    removed = {}
+    for table_name in tables or RAW_TABLE_MODELS:
+        with transaction() as conn:
+            cursor = conn.cursor()
+            layout = get_table_layout(cursor, table_name)
+            if layout is None or layout.hashed:
+                removed[table_name] = 0
+                continue
+            row_count = cursor.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            ensure_raw_indexes(cursor, table_name, layout)
+            removed[table_name] = row_count - cursor.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    return removed
 
 
 def drop_table(db_file, table_name):
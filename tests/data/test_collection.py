@@ -0,0 +1,177 @@
+# test_collection
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from cfbd.rest import ApiException
+from src.data import collection, fetch_metrics, response_cache, warehouse
+from src.data.fetch_executor import WorkUnit, configure_fetch_executor, run_work_units
+from src.data.collection import fetch_conference_unit, is_power_5_game, process_team_game_stats, update_week
+
+class FakeModel(dict):
+    def to_dict(self):
+        return dict(self)
+
+class TestConferenceUnits(unittest.TestCase):
+    def setUp(self):
+        configure_fetch_executor(max_workers=2, requests_per_second=1000, burst_size=10)
+        self.original_cache_mode = response_cache.CACHE_MODE
+        response_cache.set_cache_mode('disabled')
+        collection._bulk_unsupported.clear()
+        self.calls = []
+
+    def tearDown(self):
+        response_cache.set_cache_mode(self.original_cache_mode)
+        collection._bulk_unsupported.clear()
+
+    def get_games(self, **params):
+        self.calls.append(params)
+        return [
+            FakeModel(id=1, home_conference='SEC', away_conference='Sun Belt'),
+            FakeModel(id=2, home_conference='Mountain West', away_conference='Sun Belt')
+        ]
+
+    def test_division_request_filters_locally(self):
+        records = fetch_conference_unit('games', self.get_games, WorkUnit(2023, None, 'regular'), 'division', 'fbs', is_power_5_game)
+        self.assertEqual([record['id'] for record in records], [1])
+        self.assertEqual(self.calls, [{'year': 2023, 'season_type': 'regular', 'division': 'fbs'}])
+
+    def test_rejected_division_request_falls_back_to_conferences(self):
+        def get_team_game_stats(**params):
+            if 'classification' in params:
+                raise ApiException(status=400, reason='Bad Request')
+            return self.get_games(**params)
+
+        unit = WorkUnit(2023, None, 'regular')
+        fetch_conference_unit('games/teams', get_team_game_stats, unit, 'classification', 'fbs', is_power_5_game)
+        self.assertEqual([call['conference'] for call in self.calls], list(collection.POWER_5_CONFERENCES.values()))
+        self.assertIn('games/teams', collection._bulk_unsupported)
+
+    def test_fallback_conference_requests_are_retried(self):
+        failed = []
+
+        def get_team_game_stats(**params):
+            if 'classification' in params:
+                raise ApiException(status=400, reason='Bad Request')
+            if params['conference'] == 'ACC' and not failed:
+                failed.append(params)
+                error = ApiException(status=503, reason='Service Unavailable')
+                error.headers = {'Retry-After': '0'}
+                raise error
+            return self.get_games(**params)
+
+        unit = WorkUnit(2023, None, 'regular')
+        fetch_metrics.reset_metrics()
+        results = run_work_units(
+            [unit],
+            lambda unit: fetch_conference_unit('games/teams', get_team_game_stats, unit, 'classification', 'fbs', is_power_5_game,
+                                               'GamesApi->get_team_game_stats'),
+            'GamesApi->get_team_game_stats'
+        )
+        records = results[0][1]
+        self.assertEqual(len(failed), 1)
+        self.assertEqual([call['conference'] for call in self.calls], list(collection.POWER_5_CONFERENCES.values()))
+        self.assertEqual(len(records), 2 * len(collection.POWER_5_CONFERENCES))
+
+        # The rejected request and each conference request are counted once
+        endpoints = fetch_metrics.get_metrics().summary()['endpoints']
+        stats = endpoints['GamesApi->get_team_game_stats']
+        self.assertEqual((stats['calls'], stats['errors'], stats['fallbacks'], stats['rows']), (1, 1, 1, 0))
+        stats = endpoints[fetch_metrics.fallback_endpoint('GamesApi->get_team_game_stats')]
+        self.assertEqual((stats['calls'], stats['errors'], stats['retries']), (len(collection.POWER_5_CONFERENCES) + 1, 1, 1))
+        self.assertEqual(stats['rows'], len(records))
+
+class TestUpdateWeek(unittest.TestCase):
+    FETCHERS = ['fetch_games', 'fetch_team_game_stats', 'fetch_advanced_team_game_stats', 'fetch_betting_lines']
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_files = (fetch_metrics.METRICS_FILE, fetch_metrics.PROMETHEUS_FILE)
+        fetch_metrics.METRICS_FILE = os.path.join(self.tmp_dir.name, 'collection_metrics.json')
+        fetch_metrics.PROMETHEUS_FILE = os.path.join(self.tmp_dir.name, 'collection_metrics.prom')
+        self.original_functions = {name: getattr(collection, name) for name in self.FETCHERS + ['get_last_completed_week']}
+        self.calls = []
+        for name in self.FETCHERS:
+            setattr(collection, name, lambda *args, name=name, **kwargs: self.calls.append((name, args, kwargs)))
+
+    def tearDown(self):
+        for name, function in self.original_functions.items():
+            setattr(collection, name, function)
+        fetch_metrics.METRICS_FILE, fetch_metrics.PROMETHEUS_FILE = self.original_files
+        self.tmp_dir.cleanup()
+
+    def test_update_week_passes_week_and_season_type(self):
+        update_week(2023, week=5, season_type='postseason')
+        self.assertEqual([name for name, _, _ in self.calls], self.FETCHERS)
+        for _, args, kwargs in self.calls:
+            self.assertEqual(args, (2023, 2023))
+            self.assertEqual(kwargs, {'use_last_season': False, 'week': 5, 'season_type': 'postseason'})
+
+    def test_update_week_defaults_to_last_completed_week(self):
+        collection.get_last_completed_week = lambda year: (12, 'regular')
+        update_week(2023)
+        self.assertEqual({(kwargs['week'], kwargs['season_type']) for _, _, kwargs in self.calls}, {(12, 'regular')})
+
+        self.calls.clear()
+        collection.get_last_completed_week = lambda year: (None, None)
+        update_week(2023)
+        self.assertEqual(self.calls, [])
+
+class TestTeamGameStats(unittest.TestCase):
+    def setUp(self):
+        self.records = [
+            {'id': 1, 'teams': [
+                {'school_id': 10, 'school': 'Alpha', 'conference': 'SEC', 'home_away': 'home', 'points': 21,
+                 'stats': [{'category': 'totalYards', 'stat': '350'}, {'category': 'turnovers', 'stat': '1'},
+                           {'category': 'totalYards', 'stat': '360'}]},
+                {'school_id': 11, 'school': 'Beta', 'conference': 'ACC', 'home_away': 'away', 'points': 14,
+                 'stats': [{'category': 'thirdDownEff', 'stat': '4-12'}, {'stat': '9'}, {'category': 'penalties'}, 'bad']}
+            ]},
+            {'id': 2, 'teams': [{'school_id': 12, 'school': 'Gamma', 'home_away': 'home', 'points': 7}]}
+        ]
+
+    def test_process_team_game_stats(self):
+        frame = pd.DataFrame({'id': [record['id'] for record in self.records],
+                              'teams': [record['teams'] for record in self.records]})
+        df = process_team_game_stats(frame)
+        self.assertEqual(list(df.index), [0, 0, 1])
+        self.assertEqual(list(df.columns), ['id', 'team_id', 'team_name', 'team_conference', 'home_away', 'points',
+                                            'totalYards', 'turnovers', 'thirdDownEff'])
+        # The last of a repeated category wins, missing categories are NaN
+        self.assertEqual(df['totalYards'].iloc[0], 360)
+        self.assertTrue(np.isnan(df['totalYards'].iloc[1]))
+        self.assertEqual(list(df['points']), [21, 14, 7])
+        # Not every value parses, so the column keeps its strings
+        self.assertEqual(list(df['thirdDownEff'].iloc[1:2]), ['4-12'])
+
+    def test_team_game_stats_df_does_not_depend_on_chunk_size(self):
+        stats = ['1', '2', '3', '4-5']
+        records = [
+            {'id': index, 'teams': [{'school_id': index, 'school': f'Team {index}', 'conference': 'SEC', 'home_away': 'home',
+                                     'points': index, 'stats': [{'category': 'thirdDownEff', 'stat': stat},
+                                                                {'category': 'totalYards', 'stat': str(300 + index)}]}]}
+            for index, stat in enumerate(stats)
+        ]
+        tmp_dir = tempfile.TemporaryDirectory()
+        original_db_file, original_iter = warehouse.DB_FILE, warehouse.iter_raw_data
+        warehouse.DB_FILE = os.path.join(tmp_dir.name, 'college_football.db')
+        try:
+            warehouse.store_team_game_stats(records, 'team_game_stats')
+            frames = []
+            for chunk_size in [2, 1000]:
+                warehouse.iter_raw_data = lambda table_name, **filters: original_iter(table_name, chunk_size=chunk_size, **filters)
+                frames.append(collection.get_team_game_stats_df())
+        finally:
+            warehouse.iter_raw_data = original_iter
+            warehouse.close_connection()
+            warehouse.DB_FILE = original_db_file
+            tmp_dir.cleanup()
+        pd.testing.assert_frame_equal(frames[0], frames[1])
+        # Not every thirdDownEff parses, so the whole column keeps its strings
+        self.assertEqual(list(frames[0]['thirdDownEff']), stats)
+        self.assertEqual(list(frames[0]['totalYards']), [300, 301, 302, 303])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+# test_fetch_executor
+
+import threading
+import time
+import unittest
+import cfbd
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from cfbd.rest import ApiException
+from src.data import api_client, fetch_executor
+from src.data.response_cache import CacheMiss
+from src.data.fetch_executor import (
+    TokenBucket,
+    WorkUnit,
+    configure_fetch_executor,
+    get_retry_after,
+    is_retryable,
+    run_work_units,
+    stream_partitions
+)
+
+class TestFetchExecutor(unittest.TestCase):
+    def setUp(self):
+        configure_fetch_executor(max_workers=4, requests_per_second=1000, burst_size=10)
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        # The first token is free, the remaining four wait 1/20s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_run_work_units_keeps_unit_order(self):
+        units = [WorkUnit(year, 'SEC', 'regular') for year in range(2020, 2024)]
+
+        def fetch(unit):
+            time.sleep(0.01 * (2024 - unit.year))
+            return [{'season': unit.year}]
+
+        results = run_work_units(units, fetch, 'GamesApi->get_games')
+        self.assertEqual([unit for unit, _, _ in results], units)
+        self.assertEqual([records[0]['season'] for _, records, _ in results], [2020, 2021, 2022, 2023])
+
+    def test_failed_units_are_reported_as_none(self):
+        units = [WorkUnit(2022), WorkUnit(2023)]
+
+        def fetch(unit):
+            if unit.year == 2023:
+                raise ApiException(status=400, reason='Bad Request')
+            return [{'year': unit.year}]
+
+        results = run_work_units(units, fetch, 'TeamsApi->get_talent')
+        self.assertEqual(results[1][:2], (WorkUnit(2023), None))
+        self.assertEqual(results[1][2].status, 400)
+        # Each partition has to be consumed before moving on to the next one
+        streams = [(list(stream), stream.complete) for stream in stream_partitions(results)]
+        self.assertEqual(streams, [([{'year': 2022}], True), ([], False)])
+
+    def test_retries_honor_retry_after(self):
+        attempts = []
+
+        def fetch(unit):
+            attempts.append(unit)
+            if len(attempts) == 1:
+                error = ApiException(status=429, reason='Too Many Requests')
+                error.headers = {'Retry-After': '0'}
+                raise error
+            return [{'year': unit.year}]
+
+        results = run_work_units([WorkUnit(2023)], fetch, 'TeamsApi->get_talent')
+        self.assertEqual(results, [(WorkUnit(2023), [{'year': 2023}], None)])
+        self.assertEqual(len(attempts), 2)
+
+    def test_malformed_retry_after_falls_back_to_backoff(self):
+        def error_with(value):
+            error = ApiException(status=503, reason='Service Unavailable')
+            error.headers = {'Retry-After': value}
+            return error
+
+        self.assertIsNone(get_retry_after(error_with('soon')))
+        # A '-0000' zone parses to a naive datetime, which is UTC
+        self.assertEqual(get_retry_after(error_with('Sun, 06 Nov 1994 08:49:37 -0000')), 0.0)
+        later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=120), usegmt=True)
+        self.assertGreater(get_retry_after(error_with(later)), 100)
+
+        attempts = []
+
+        def fetch(unit):
+            attempts.append(unit)
+            if len(attempts) == 1:
+                raise error_with('soon')
+            return [{'year': unit.year}]
+
+        original_backoff_base = fetch_executor.BACKOFF_BASE
+        fetch_executor.BACKOFF_BASE = 0.01
+        try:
+            results = run_work_units([WorkUnit(2023)], fetch, 'TeamsApi->get_talent')
+        finally:
+            fetch_executor.BACKOFF_BASE = original_backoff_base
+        self.assertEqual(results, [(WorkUnit(2023), [{'year': 2023}], None)])
+
+    def test_rate_limited_responses_reach_the_executor(self):
+        statuses = [429, 200]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = b'[]'
+                self.send_response(statuses.pop(0))
+                self.send_header('Retry-After', '0')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        original_host = api_client.API_HOST
+        api_client.API_HOST = f"http://127.0.0.1:{server.server_port}"
+        api_client.close_api_client()
+        attempts = []
+
+        def fetch(unit):
+            attempts.append(unit)
+            return cfbd.TeamsApi(api_client.get_api_client()).get_talent(year=unit.year)
+
+        try:
+            results = run_work_units([WorkUnit(2023)], fetch, 'TeamsApi->get_talent')
+        finally:
+            api_client.API_HOST = original_host
+            api_client.close_api_client()
+            server.shutdown()
+            server.server_close()
+        # urllib3 hands the 429 back instead of retrying it, so the executor retries the unit
+        self.assertEqual(results, [(WorkUnit(2023), [], None)])
+        self.assertEqual(len(attempts), 2)
+
+    def test_client_errors_are_not_retried(self):
+        attempts = []
+
+        def fetch(unit):
+            attempts.append(unit)
+            raise ApiException(status=404, reason='Not Found')
+
+        run_work_units([WorkUnit(2023)], fetch, 'TeamsApi->get_talent')
+        self.assertEqual(len(attempts), 1)
+        self.assertFalse(is_retryable(CacheMiss('talent', {'year': 2023})))
+
+    def test_stream_partitions_combines_conferences(self):
+        error = ApiException(status=503)
+        results = [
+            (WorkUnit(2023, 'SEC', 'regular'), [{'id': 1}], None),
+            (WorkUnit(2023, 'ACC', 'regular'), [{'id': 2}], None),
+            (WorkUnit(2023, 'SEC', 'postseason'), [{'id': 3}], None),
+            (WorkUnit(2023, 'ACC', 'postseason'), None, error)
+        ]
+        streams = []
+        for stream in stream_partitions(iter(results)):
+            streams.append((stream.partition, list(stream), stream.complete, stream.failures))
+        self.assertEqual(streams, [
+            ((2023, 'regular', None), [{'id': 1}, {'id': 2}], True, []),
+            ((2023, 'postseason', None), [{'id': 3}], False, [(WorkUnit(2023, 'ACC', 'postseason'), error)])
+        ])
+
+    def test_stream_partitions_drops_duplicate_keys(self):
+        results = [
+            (WorkUnit(2023, 'SEC', 'regular'), [{'id': 1}, {'id': 2}], None),
+            (WorkUnit(2023, 'ACC', 'regular'), [{'id': 2}, {'id': 3}], None)
+        ]
+        stream = next(stream_partitions(iter(results), key=lambda record: record['id']))
+        self.assertEqual([record['id'] for record in stream], [1, 2, 3])
+        self.assertEqual(stream.duplicates, 1)
+
+if __name__ == '__main__':
+    unittest.main()
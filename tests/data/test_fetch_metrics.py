@@ -0,0 +1,72 @@
+# test_fetch_metrics
+
+import json
+import os
+import tempfile
+import unittest
+from cfbd.rest import ApiException
+from src.data.fetch_executor import WorkUnit, configure_fetch_executor, run_work_units
+from src.data.fetch_metrics import metrics_run, reset_metrics, write_metrics
+
+class TestFetchMetrics(unittest.TestCase):
+    def setUp(self):
+        configure_fetch_executor(max_workers=2, requests_per_second=1000, burst_size=10)
+        reset_metrics()
+
+    def test_records_calls_retries_and_rows(self):
+        attempts = []
+
+        def fetch(unit):
+            if unit.season_type == 'postseason':
+                attempts.append(unit)
+            if unit.season_type == 'postseason' and len(attempts) == 1:
+                error = ApiException(status=429, reason='Too Many Requests')
+                error.headers = {'Retry-After': '0'}
+                raise error
+            return [{'id': 1}, {'id': 2}]
+
+        units = [WorkUnit(2023, season_type='regular'), WorkUnit(2023, season_type='postseason')]
+        run_work_units(units, fetch, 'GamesApi->get_games')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = os.path.join(tmp_dir, 'metrics.json')
+            prometheus_path = os.path.join(tmp_dir, 'metrics.prom')
+            summary = write_metrics(json_path, prometheus_path)
+            with open(json_path) as f:
+                self.assertEqual(json.load(f)['endpoints'], summary['endpoints'])
+            with open(prometheus_path) as f:
+                prometheus = f.read()
+
+        stats = summary['endpoints']['GamesApi->get_games']
+        self.assertEqual((stats['calls'], stats['errors'], stats['retries'], stats['rate_limited'], stats['rows']), (3, 1, 1, 1, 4))
+        self.assertEqual(len(summary['series']), 2)
+        self.assertIn(
+            'cfbd_request_retries_total{endpoint="GamesApi->get_games",year="2023",season_type="postseason"} 1',
+            prometheus
+        )
+        self.assertIn(
+            'cfbd_rate_limited_responses_total{endpoint="GamesApi->get_games",year="2023",season_type="postseason"} 1',
+            prometheus
+        )
+        self.assertIn(
+            'cfbd_request_duration_seconds_count{endpoint="GamesApi->get_games",year="2023",season_type="regular"} 1',
+            prometheus
+        )
+
+    def test_nested_runs_write_one_summary(self):
+        @metrics_run()
+        def fetch_talent():
+            run_work_units([WorkUnit(2023)], lambda unit: [{'id': 1}], 'TeamsApi->get_talent')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = os.path.join(tmp_dir, 'metrics.json')
+            with metrics_run(json_path, os.path.join(tmp_dir, 'metrics.prom')):
+                run_work_units([WorkUnit(2023)], lambda unit: [{'id': 1}], 'GamesApi->get_games')
+                # The inner run neither resets the outer one nor writes the default METRICS_FILE
+                fetch_talent()
+            with open(json_path) as f:
+                endpoints = json.load(f)['endpoints']
+        self.assertEqual(set(endpoints), {'GamesApi->get_games', 'TeamsApi->get_talent'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# test_maintenance
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from src.data import warehouse
+from src.data.maintenance import maintain_database, run_maintenance
+from src.data.warehouse import store_raw_data
+
+class TestMaintenance(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'transformed_teams.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE transformed_teams (id INTEGER, team TEXT, notes TEXT)")
+        conn.execute("CREATE INDEX idx_transformed_teams_team ON transformed_teams (team)")
+        conn.executemany("INSERT INTO transformed_teams VALUES (?, ?, ?)", [(i, f"Team {i % 50}", 'x' * 200) for i in range(5000)])
+        conn.commit()
+        conn.execute("DELETE FROM transformed_teams WHERE id >= 1000")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        warehouse.close_connection()
+        self.tmp_dir.cleanup()
+
+    def test_maintain_database(self):
+        report = maintain_database(self.db_path)
+        self.assertEqual(report['integrity'], ['ok'])
+        self.assertGreater(report['pages_before']['freelist_count'], 0)
+        self.assertEqual(report['pages_after']['freelist_count'], 0)
+        self.assertEqual(report['pages_after']['auto_vacuum'], 'incremental')
+        self.assertLess(report['size_after'], report['size_before'])
+        table = report['tables']['transformed_teams']
+        self.assertEqual(table['rows'], 1000)
+        self.assertGreater(table['pages'], 0)
+        self.assertTrue(table['indexes']['idx_transformed_teams_team']['stat'].startswith('1000 '))
+
+        # Already incremental: later runs only release the free pages
+        report = maintain_database(self.db_path, vacuum='incremental')
+        self.assertEqual(report['pages_before']['auto_vacuum'], 'incremental')
+        with self.assertRaises(ValueError):
+            maintain_database(self.db_path, vacuum='sometimes')
+
+    def test_run_maintenance_appends_history(self):
+        original_db_file = warehouse.DB_FILE
+        warehouse.DB_FILE = os.path.join(self.tmp_dir.name, 'college_football.db')
+        history_path = os.path.join(self.tmp_dir.name, 'maintenance_history.jsonl')
+        try:
+            store_raw_data([{'id': 1, 'season': 2023, 'week': 1, 'season_type': 'regular'}], 'games')
+            for _ in range(2):
+                run = run_maintenance(['college_football', self.db_path, 'features_teams'], vacuum='full', history_path=history_path)
+        finally:
+            warehouse.DB_FILE = original_db_file
+        self.assertEqual(set(run['databases']), {'college_football', self.db_path})
+        self.assertEqual(run['databases']['college_football']['tables']['games']['rows'], 1)
+        with open(history_path) as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 2)
+
+if __name__ == '__main__':
+    unittest.main()
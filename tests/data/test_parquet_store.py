@@ -0,0 +1,98 @@
+# test_parquet_store
+
+import importlib.util
+import os
+import tempfile
+import unittest
+from src.data import warehouse, parquet_store
+from src.data.warehouse import (
+    store_raw_data,
+    store_raw_partitions,
+    store_team_game_stats,
+    fetch_raw_data,
+    read_raw_data,
+    get_last_update,
+    set_storage_backend
+)
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+class TestParquetStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = warehouse.DB_FILE
+        self.original_parquet_dir = parquet_store.PARQUET_DIR
+        warehouse.DB_FILE = os.path.join(self.tmp_dir.name, 'college_football.db')
+        parquet_store.PARQUET_DIR = os.path.join(self.tmp_dir.name, 'parquet')
+        set_storage_backend('parquet')
+
+        self.games = [
+            {'id': 1, 'season': 2022, 'week': 1, 'season_type': 'regular', 'home_team': 'Team A', 'home_line_scores': [7, 0, 3, 7]},
+            {'id': 2, 'season': 2022, 'week': 2, 'season_type': 'regular', 'home_team': 'Team B'},
+            {'id': 3, 'season': 2023, 'week': 1, 'season_type': 'regular', 'home_team': 'Team C'},
+            {'id': 4, 'season': 2023, 'week': 1, 'season_type': 'postseason', 'home_team': 'Team D', 'neutral_site': True}
+        ]
+
+    def tearDown(self):
+        set_storage_backend('sqlite')
+        warehouse.close_connection()
+        warehouse.DB_FILE = self.original_db_file
+        parquet_store.PARQUET_DIR = self.original_parquet_dir
+        self.tmp_dir.cleanup()
+
+    def test_store_and_read_games(self):
+        summary = store_raw_data(self.games, 'games')
+        self.assertEqual(summary.row_count, 4)
+        self.assertEqual(sorted(parquet_store.list_partitions('games')), [2022, 2023])
+        games = {game['id']: game for game in fetch_raw_data('games')}
+        self.assertEqual(games[1]['home_line_scores'], [7, 0, 3, 7])
+        self.assertIs(games[4]['neutral_site'], True)
+        self.assertEqual(get_last_update('games'), 2023)
+
+        df = read_raw_data('games', start_year=2023, season_type='postseason', columns=['id', 'home_team'])
+        self.assertEqual(df.to_dict('records'), [{'id': 4, 'home_team': 'Team D'}])
+        table = parquet_store.read_arrow('games', end_year=2022, columns=['id', 'week'])
+        self.assertEqual(table.to_pydict(), {'id': [1, 2], 'week': [1, 2]})
+
+    def test_replace_scope_and_upserts(self):
+        store_raw_data(self.games, 'games')
+        store_raw_data([dict(self.games[1], home_team='Team Z')], 'games', year=2022, week=2, season_type='regular')
+        store_raw_data(self.games[:1], 'games')
+        self.assertEqual(sorted(game['home_team'] for game in fetch_raw_data('games')), ['Team A', 'Team C', 'Team D', 'Team Z'])
+
+        ratings = [{'year': 2022, 'team': 'Team A', 'elo': 1500}, {'year': 2023, 'team': 'Team A', 'elo': 1600}]
+        store_raw_partitions([(2022, ratings[:1]), (2023, ratings[1:])], 'elo_ratings')
+        store_raw_partitions([(2022, iter([])), (2023, [dict(ratings[1], elo=1700)])], 'elo_ratings')
+        self.assertEqual(sorted(rating['elo'] for rating in fetch_raw_data('elo_ratings')), [1500, 1700])
+
+    def test_team_game_stats_are_filtered_through_games(self):
+        store_raw_data(self.games, 'games')
+        teams = [{'school': 'Team A', 'stats': [{'category': 'totalYards', 'stat': '400'}]}]
+        store_team_game_stats([{'id': game['id'], 'teams': teams} for game in self.games], 'team_game_stats')
+        # Filed by their games' seasons
+        self.assertEqual(sorted(parquet_store.list_partitions('team_game_stats')), [2022, 2023])
+        df = read_raw_data('team_game_stats', start_year=2023, season_type='regular')
+        self.assertEqual(df.to_dict('records'), [{'id': 3, 'teams': teams}])
+
+    def test_team_game_stats_are_partitioned_by_year(self):
+        teams = [{'school': 'Team A', 'stats': []}]
+        # Without games to look them up in, records go to the ALL_YEARS file unless a year is given
+        store_team_game_stats([{'id': 1, 'teams': teams}, {'id': 5, 'teams': teams}], 'team_game_stats')
+        self.assertEqual(list(parquet_store.list_partitions('team_game_stats')), [None])
+        store_team_game_stats([{'id': 5, 'teams': teams}], 'team_game_stats', year=2024)
+        self.assertEqual(sorted(parquet_store.list_partitions('team_game_stats'), key=str), [2024, None])
+
+        # Once the games are stored, the next write moves the remaining rows into year files
+        store_raw_data(self.games, 'games')
+        store_team_game_stats([{'id': 3, 'teams': teams}], 'team_game_stats', year=2023)
+        self.assertEqual(sorted(parquet_store.list_partitions('team_game_stats')), [2022, 2023, 2024])
+        self.assertEqual(sorted(record['id'] for record in fetch_raw_data('team_game_stats')), [1, 3, 5])
+
+    def test_export_from_sqlite(self):
+        set_storage_backend('sqlite')
+        store_raw_data(self.games, 'games')
+        self.assertEqual(parquet_store.export_table('games'), 4)
+        set_storage_backend('parquet')
+        self.assertEqual(sorted(game['id'] for game in fetch_raw_data('games')), [1, 2, 3, 4])
+
+if __name__ == '__main__':
+    unittest.main()
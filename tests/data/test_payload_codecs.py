@@ -0,0 +1,61 @@
+# test_payload_codecs
+
+import importlib.util
+import unittest
+from src.data import payload_codecs
+from src.data.payload_codecs import available_codecs, get_codec, set_json_backend, set_typed_decoding, dumps, loads, loads_many
+from src.data.schemas import get_record_type
+
+class TestPayloadCodecs(unittest.TestCase):
+    def test_codecs_round_trip(self):
+        teams = [{'school': 'Team A', 'stats': [{'category': 'totalYards', 'stat': '400'}] * 20, 'points': None}]
+        plain = get_codec('json').encode(teams)
+        for name in available_codecs():
+            codec = get_codec(name)
+            encoded = codec.encode(teams)
+            self.assertEqual(codec.decode(encoded), teams)
+            if name != 'json':
+                self.assertIsInstance(encoded, bytes)
+                self.assertLess(len(encoded), len(plain))
+
+    def test_unknown_codec(self):
+        self.assertIn('zlib-json', available_codecs())
+        with self.assertRaises(ValueError):
+            get_codec('pickle')
+
+    def test_json_backends(self):
+        record = {'id': 1, 'home_line_scores': [7, 0, 3, 14], 'notes': None, 'start_date': 'Sept 2'}
+        original = payload_codecs.JSON_BACKEND
+        try:
+            for name in payload_codecs.JSON_BACKENDS:
+                if name != 'json' and not importlib.util.find_spec(name):
+                    continue
+                self.assertEqual(set_json_backend(name), name)
+                text = dumps(record)
+                self.assertIsInstance(text, str)
+                self.assertEqual(text, '{"id":1,"home_line_scores":[7,0,3,14],"notes":null,"start_date":"Sept 2"}')
+                self.assertEqual(loads(text), record)
+                self.assertEqual(loads_many([text, text]), [record, record])
+        finally:
+            set_json_backend(original)
+
+    @unittest.skipUnless(importlib.util.find_spec('msgspec'), "msgspec is not installed")
+    def test_typed_decoding(self):
+        text = dumps({'id': '5', 'season': 2023, 'home_line_scores': [7, 0], 'unknown': 1})
+        # Off by default: records keep every field as sent
+        self.assertEqual(loads(text, get_record_type('games'))['unknown'], 1)
+        set_typed_decoding(True)
+        try:
+            self.assertEqual(loads(text, get_record_type('games')), {'id': 5, 'season': 2023, 'home_line_scores': [7, 0]})
+            self.assertEqual(loads_many([text], get_record_type('games'))[0]['id'], 5)
+            # A value that does not fit its declared type leaves only that record untyped
+            off_type = dumps({'id': 6, 'home_pregame_elo': 1500.5, 'extra': True})
+            records = loads_many([text, off_type], get_record_type('games'))
+            self.assertEqual(records[0]['id'], 5)
+            self.assertEqual(records[1], {'id': 6, 'home_pregame_elo': 1500.5, 'extra': True})
+        finally:
+            set_typed_decoding(False)
+        self.assertIsNone(get_record_type('calendar'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# test_response_cache
+
+import os
+import tempfile
+import time
+import unittest
+from src.data import response_cache
+from src.data.fetch_executor import WorkUnit, configure_fetch_executor, run_work_units
+from src.data.response_cache import CacheMiss, cached_api_call, current_season, set_cache_mode
+
+class FakeRecord:
+    def __init__(self, data):
+        self.data = data
+
+    def to_dict(self):
+        return self.data
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_cache_file = response_cache.CACHE_FILE
+        response_cache.CACHE_FILE = os.path.join(self.tmp_dir.name, 'cache.db')
+        set_cache_mode('read_through')
+        self.calls = []
+
+    def tearDown(self):
+        # Worker threads keep their own connections; they reconnect once CACHE_FILE changes
+        if getattr(response_cache._local, 'conn', None) is not None:
+            response_cache._local.conn.close()
+            response_cache._local.conn = None
+        response_cache.CACHE_FILE = self.original_cache_file
+        set_cache_mode('read_through')
+        self.tmp_dir.cleanup()
+
+    def get_games(self, **params):
+        self.calls.append(params)
+        return [FakeRecord({'id': 1, 'season': params['year']})]
+
+    def test_closed_season_is_served_from_cache(self):
+        first = cached_api_call('games', self.get_games, year=2010, conference='SEC')
+        second = cached_api_call('games', self.get_games, conference='SEC', year=2010)
+        self.assertEqual(first, [{'id': 1, 'season': 2010}])
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_current_season_expires_after_ttl(self):
+        original_ttl = response_cache.CURRENT_SEASON_TTL
+        response_cache.CURRENT_SEASON_TTL = 0
+        try:
+            cached_api_call('games', self.get_games, year=current_season())
+            cached_api_call('games', self.get_games, year=current_season())
+        finally:
+            response_cache.CURRENT_SEASON_TTL = original_ttl
+        self.assertEqual(len(self.calls), 2)
+
+    def test_offline_mode_never_calls_api(self):
+        cached_api_call('games', self.get_games, year=2010)
+        set_cache_mode('offline')
+        self.assertEqual(cached_api_call('games', self.get_games, year=2010), [{'id': 1, 'season': 2010}])
+        with self.assertRaises(CacheMiss):
+            cached_api_call('games', self.get_games, year=2011)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_cache_hits_take_no_rate_limit_token(self):
+        units = [WorkUnit(2010, conference) for conference in ['SEC', 'ACC', 'Big Ten', 'Big 12', 'Pac-12', 'MAC']]
+
+        def fetch(unit):
+            return cached_api_call('games', self.get_games, year=unit.year, conference=unit.conference)
+
+        configure_fetch_executor(requests_per_second=1000, burst_size=10)
+        run_work_units(units, fetch, 'GamesApi->get_games')
+        # Six requests at one per second would take five seconds; all of them are cache hits
+        configure_fetch_executor(requests_per_second=1, burst_size=1)
+        try:
+            started = time.monotonic()
+            results = run_work_units(units, fetch, 'GamesApi->get_games')
+        finally:
+            configure_fetch_executor(requests_per_second=2.0, burst_size=4)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual([error for _, _, error in results], [None] * len(units))
+        self.assertEqual(len(self.calls), len(units))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+# test_schemas
+
+import unittest
+from src.data.schemas import get_table_schema, to_row, from_row
+
+class TestSchemas(unittest.TestCase):
+    def test_nested_fields_are_flattened(self):
+        columns = {column.name: column.sql_type for column in get_table_schema('advanced_team_game_stats')}
+        self.assertEqual(columns['game_id'], 'INTEGER')
+        self.assertEqual(columns['offense_ppa'], 'REAL')
+        self.assertIn('offense_standard_downs_success_rate', columns)
+        self.assertIsNone(get_table_schema('calendar'))
+
+    def test_round_trip(self):
+        schema = get_table_schema('games')
+        game = {column.path[-1]: None for column in schema}
+        game.update(id=1, season=2023, completed=True, home_line_scores=[7, 0, 3, 14])
+        row = to_row(game, schema)
+        self.assertIn('[7,0,3,14]', row)
+        self.assertEqual(from_row(row, schema), game)
+
+if __name__ == '__main__':
+    unittest.main()
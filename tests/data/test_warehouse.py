@@ -0,0 +1,411 @@
+# test_warehouse
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from src.data import warehouse
+from src.data.warehouse import (
+    store_raw_data,
+    fetch_raw_data,
+    iter_raw_data,
+    read_raw_data,
+    get_last_update,
+    record_fetch,
+    get_complete_partitions,
+    record_failed_units,
+    clear_failed_units,
+    get_failed_units,
+    remove_duplicate_rows,
+    store_raw_partitions,
+    transaction,
+    migrate_raw_table,
+    migrate_content_hashes,
+    recode_raw_tables,
+    store_team_game_stats,
+    store_calendar_data,
+    fetch_calendar_data,
+    create_connection,
+    queued_writes,
+    submit_write,
+    flush_writes,
+    WriteSummary
+)
+from src.data.fetch_executor import WorkUnit
+
+class TestWarehouse(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = warehouse.DB_FILE
+        warehouse.DB_FILE = os.path.join(self.tmp_dir.name, 'college_football.db')
+
+        self.games = [
+            {'id': 1, 'season': 2022, 'week': 1, 'season_type': 'regular', 'home_team': 'Team A'},
+            {'id': 2, 'season': 2022, 'week': 2, 'season_type': 'regular', 'home_team': 'Team B'},
+            {'id': 3, 'season': 2023, 'week': 1, 'season_type': 'regular', 'home_team': 'Team C'},
+            {'id': 4, 'season': 2023, 'week': 1, 'season_type': 'postseason', 'home_team': 'Team D'}
+        ]
+
+    def tearDown(self):
+        warehouse.close_connection()
+        warehouse.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def test_store_raw_data_replaces_one_week(self):
+        store_raw_data(self.games[:2], 'games', year=2022)
+        updated = dict(self.games[1], home_team='Team Z')
+        store_raw_data([updated], 'games', year=2022, week=2, season_type='regular')
+        games = sorted(fetch_raw_data('games'), key=lambda game: game['id'])
+        self.assertEqual([game['home_team'] for game in games], ['Team A', 'Team Z'])
+
+    def test_store_raw_data_replaces_one_season_type(self):
+        store_raw_data(self.games[2:], 'games', year=2023)
+        store_raw_data([self.games[3]], 'games', year=2023, season_type='postseason')
+        self.assertEqual(sorted(game['id'] for game in fetch_raw_data('games')), [3, 4])
+
+    def test_store_raw_data_replaces_one_week_of_one_season_type(self):
+        store_raw_data(self.games[2:], 'games', year=2023)
+        replacement = {'id': 5, 'season': 2023, 'week': 1, 'season_type': 'regular', 'home_team': 'Team E'}
+        store_raw_data([replacement], 'games', year=2023, week=1, season_type='regular')
+        # Game 3 left the regular season week, the postseason game of the same week is kept
+        self.assertEqual(sorted(game['id'] for game in fetch_raw_data('games')), [4, 5])
+
+    def test_store_raw_data_streams_generator(self):
+        summary = store_raw_data((game for game in self.games[:2]), 'games', year=2022)
+        self.assertEqual(summary.row_count, 2)
+        empty = store_raw_data(iter([]), 'games', year=2022)
+        self.assertEqual(empty.row_count, 0)
+        # An empty stream must not clear the stored partition
+        self.assertEqual(len(fetch_raw_data('games')), 2)
+
+    def test_store_raw_partitions_replaces_each_year(self):
+        ratings = [{'year': 2022, 'team': 'Team A', 'elo': 1500}, {'year': 2023, 'team': 'Team A', 'elo': 1600}]
+        store_raw_partitions([(2022, ratings[:1]), (2023, ratings[1:])], 'elo_ratings')
+        updated = dict(ratings[1], elo=1700)
+        summaries = store_raw_partitions([(2022, iter([])), (2023, [updated])], 'elo_ratings')
+        self.assertEqual({year: summary.row_count for year, summary in summaries.items()}, {2022: 0, 2023: 1})
+        # The empty 2022 partition keeps its stored rows
+        self.assertEqual(sorted(row['elo'] for row in fetch_raw_data('elo_ratings')), [1500, 1700])
+
+    def test_transaction_commits_once_or_rolls_back(self):
+        with transaction():
+            store_raw_data(self.games[:2], 'games', year=2022)
+            record_fetch('games', 2022, WriteSummary(2, 'abc'))
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                store_raw_data(self.games[2:], 'games', year=2023)
+                raise RuntimeError("fetch failed")
+        self.assertEqual(sorted(game['id'] for game in fetch_raw_data('games')), [1, 2])
+        self.assertEqual(get_last_update('games'), 2022)
+
+    def test_failed_store_is_not_committed_later(self):
+        store_raw_data(self.games[:2], 'games', year=2022)
+
+        def failing_stream():
+            # One full chunk is written (clearing 2022) before the stream fails
+            yield from (dict(self.games[0], id=index) for index in range(warehouse.STREAM_CHUNK_SIZE))
+            raise RuntimeError("connection reset")
+
+        with self.assertRaises(RuntimeError):
+            store_raw_data(failing_stream(), 'games', year=2022)
+        record_fetch('games', 2022, WriteSummary(0, 'abc'))
+        self.assertEqual(sorted(game['id'] for game in fetch_raw_data('games')), [1, 2])
+
+    def test_migrate_legacy_blob_table(self):
+        conn = create_connection()
+        conn.execute("CREATE TABLE games (year INTEGER, data JSON)")
+        conn.executemany("INSERT INTO games VALUES (?, ?)", [(game['season'], json.dumps(game)) for game in self.games])
+        conn.commit()
+        self.assertEqual(fetch_raw_data('games')[0], self.games[0])
+        self.assertEqual(migrate_raw_table('games'), 4)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(games)")]
+        self.assertIn('home_team', columns)
+        self.assertNotIn('data', columns)
+        store_raw_data([dict(self.games[2], home_team='Team Z')], 'games', year=2023, season_type='regular')
+        self.assertEqual(get_last_update('games'), 2023)
+        self.assertEqual(sorted(game['home_team'] for game in fetch_raw_data('games')), ['Team A', 'Team B', 'Team D', 'Team Z'])
+
+    def test_partition_queries_use_indexes(self):
+        conn = create_connection()
+        conn.execute("CREATE TABLE betting_lines (year INTEGER, data JSON)")
+        conn.executemany("INSERT INTO betting_lines VALUES (?, ?)", [(game['season'], json.dumps(game)) for game in self.games])
+        conn.commit()
+        store_raw_data([self.games[3]], 'betting_lines', year=2023, season_type='postseason')
+        self.assertEqual(get_last_update('betting_lines'), 2023)
+        self.assertEqual(sorted(line['id'] for line in fetch_raw_data('betting_lines')), [1, 2, 3, 4])
+
+        # Legacy tables get generated columns; typed tables index their own columns and key on id
+        store_raw_data(self.games, 'games')
+        for table in ['betting_lines', 'games']:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN DELETE FROM {table} WHERE season = 2023 AND week = 1").fetchall()
+            self.assertIn(f'idx_{table}_partition', plan[0][3])
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM betting_lines WHERE id = 3").fetchall()
+        self.assertIn('idx_betting_lines_key', plan[0][3])
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM games WHERE id = 3").fetchall()
+        self.assertIn('PRIMARY KEY', plan[0][3])
+
+    def test_iter_raw_data_filters_and_projects(self):
+        store_raw_data(self.games, 'games')
+        chunks = list(iter_raw_data('games', start_year=2023, columns=['id', 'season_type'], chunk_size=1))
+        self.assertEqual(sorted(record for chunk in chunks for record in chunk.itertuples(index=False)), [
+            (3, 'regular'),
+            (4, 'postseason')
+        ])
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1])
+        df = read_raw_data('games', end_year=2023, season_type='regular', columns=['id', 'home_team'])
+        self.assertEqual(sorted(df['home_team']), ['Team A', 'Team B', 'Team C'])
+        store_raw_data([{'year': 2023, 'team': 'Team A', 'elo': 1600}], 'elo_ratings')
+        with self.assertRaises(ValueError):
+            read_raw_data('elo_ratings', season_type='regular')
+
+    def test_iter_raw_data_reads_legacy_and_game_tables(self):
+        conn = create_connection()
+        conn.execute("CREATE TABLE team_game_stats (id INTEGER PRIMARY KEY, data JSON)")
+        teams = [{'school': 'Team A', 'stats': [{'category': 'totalYards', 'stat': '400'}]}]
+        conn.executemany("INSERT INTO team_game_stats VALUES (?, ?)", [(game['id'], json.dumps({'id': game['id'], 'teams': teams})) for game in self.games])
+        conn.commit()
+        store_raw_data(self.games, 'games')
+        df = read_raw_data('team_game_stats', start_year=2023, season_type='postseason')
+        self.assertEqual(df.to_dict('records'), [{'id': 4, 'teams': teams}])
+
+    def test_recode_payload_codec(self):
+        teams = [{'school': 'Team A', 'stats': [{'category': category, 'stat': '400'} for category in ('totalYards', 'netPassingYards', 'rushingYards')]}]
+        store_team_game_stats([{'id': game['id'], 'teams': teams} for game in self.games], 'team_game_stats')
+        store_raw_data(self.games, 'games')
+        conn = create_connection()
+        size = conn.execute("SELECT SUM(LENGTH(teams)) FROM team_game_stats").fetchone()[0]
+
+        self.assertEqual(recode_raw_tables('zlib-json', ['team_game_stats', 'games']), {'team_game_stats': 4, 'games': 4})
+        self.assertLess(conn.execute("SELECT SUM(LENGTH(teams)) FROM team_game_stats").fetchone()[0], size)
+        self.assertEqual(
+            conn.execute("SELECT codec FROM payload_codecs WHERE table_name = 'team_game_stats'").fetchone()[0], 'zlib-json'
+        )
+        store_team_game_stats([{'id': 5, 'teams': teams}], 'team_game_stats')
+        self.assertEqual([record['teams'] for record in fetch_raw_data('team_game_stats')], [teams] * 5)
+        df = read_raw_data('team_game_stats', start_year=2023, season_type='regular')
+        self.assertEqual(df.to_dict('records'), [{'id': 3, 'teams': teams}])
+        self.assertEqual(recode_raw_tables('json', ['team_game_stats'])['team_game_stats'], 5)
+        self.assertEqual(json.loads(conn.execute("SELECT teams FROM team_game_stats WHERE id = 5").fetchone()[0]), teams)
+
+    def test_remove_duplicate_rows(self):
+        conn = create_connection()
+        conn.execute("CREATE TABLE games (year INTEGER, data JSON)")
+        rows = self.games[:2] + [dict(self.games[0], home_team='Team Z')]
+        conn.executemany("INSERT INTO games VALUES (?, ?)", [(game['season'], json.dumps(game)) for game in rows])
+        conn.commit()
+        self.assertEqual(remove_duplicate_rows('games'), 1)
+        self.assertEqual(sorted(game['home_team'] for game in fetch_raw_data('games')), ['Team B', 'Team Z'])
+
+    def test_reads_are_cached_until_stored(self):
+        store_raw_data(self.games, 'games')
+        df = read_raw_data('games', start_year=2023, columns=['id', 'home_team'])
+        df.loc[0, 'home_team'] = 'Edited'
+        conn = create_connection()
+        conn.execute("UPDATE games SET home_team = 'Team X' WHERE id = 3")
+        conn.commit()
+        # No store_* call and no other connection: the second read comes from memory
+        df = read_raw_data('games', start_year=2023, columns=['id', 'home_team'])
+        self.assertEqual(sorted(df['home_team']), ['Team C', 'Team D'])
+
+        store_raw_data([dict(self.games[3], home_team='Team Y')], 'games')
+        df = read_raw_data('games', start_year=2023, columns=['id', 'home_team'])
+        self.assertEqual(sorted(df['home_team']), ['Team X', 'Team Y'])
+
+        other = sqlite3.connect(warehouse.DB_FILE)
+        other.execute("UPDATE games SET home_team = 'Team W' WHERE id = 3")
+        other.commit()
+        other.close()
+        df = read_raw_data('games', start_year=2023, columns=['id', 'home_team'])
+        self.assertEqual(sorted(df['home_team']), ['Team W', 'Team Y'])
+
+    def test_game_filtered_reads_follow_games(self):
+        teams = [{'school': 'Team A', 'stats': [{'category': 'totalYards', 'stat': '400'}]}]
+        store_team_game_stats([{'id': game['id'], 'teams': teams} for game in self.games], 'team_game_stats')
+        store_raw_data(self.games, 'games')
+        self.assertEqual(sorted(read_raw_data('team_game_stats', start_year=2023)['id']), [3, 4])
+        store_raw_data([dict(self.games[2], season=2021)], 'games')
+        self.assertEqual(sorted(read_raw_data('team_game_stats', start_year=2023)['id']), [4])
+
+    def test_read_cache_budget(self):
+        store_raw_data(self.games, 'games')
+        original_budget = warehouse.READ_CACHE_BYTES
+        warehouse.READ_CACHE_BYTES = 1
+        try:
+            read_raw_data('games')
+            conn = create_connection()
+            conn.execute("UPDATE games SET home_team = 'Team X' WHERE id = 1")
+            conn.commit()
+            self.assertIn('Team X', list(read_raw_data('games')['home_team']))
+        finally:
+            warehouse.READ_CACHE_BYTES = original_budget
+
+    def test_calendar_reads_are_cached(self):
+        weeks = [{'season': 2023, 'week': 1, 'season_type': 'regular'}]
+        store_calendar_data(weeks, 2023)
+        fetch_calendar_data(2023)[0]['week'] = 99
+        self.assertEqual(fetch_calendar_data(2023), weeks)
+        conn = create_connection()
+        conn.execute("UPDATE calendar SET data = ?", (json.dumps(weeks * 2),))
+        conn.commit()
+        self.assertEqual(len(fetch_calendar_data(2023)), 1)
+        store_calendar_data(weeks, 2024)
+        self.assertEqual(len(fetch_calendar_data(2023)), 2)
+
+    def test_queued_writes_from_worker_threads(self):
+        def store_season(year):
+            records = ({'year': year, 'team': f'Team {index}', 'elo': 1500 + index} for index in range(50))
+            summary = store_raw_data(records, 'elo_ratings', year=year)
+            record_fetch('elo_ratings', year, summary)
+            return summary
+
+        with queued_writes():
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                summaries = list(executor.map(store_season, range(2000, 2024)))
+        self.assertTrue(all(summary.row_count == 50 for summary in summaries))
+        self.assertEqual(len(fetch_raw_data('elo_ratings')), 24 * 50)
+        self.assertEqual(get_last_update('elo_ratings'), 2023)
+
+    def test_queued_writes_are_coalesced(self):
+        release = threading.Event()
+
+        def store_and_fail():
+            store_raw_data([dict(self.games[0], id=9)], 'games')
+            raise ValueError("rejected")
+
+        with queued_writes() as writer:
+            # Hold the writer so the next writes queue up behind it
+            blocked = submit_write(release.wait)
+            futures = [submit_write(store_raw_data, [game], 'games') for game in self.games]
+            failed = submit_write(store_and_fail)
+            release.set()
+            flush_writes()
+            self.assertTrue(blocked.result())
+            self.assertEqual([future.result().row_count for future in futures], [1, 1, 1, 1])
+            with self.assertRaises(ValueError):
+                failed.result()
+            self.assertLessEqual(writer.batches, 2)
+        self.assertEqual(sorted(game['id'] for game in fetch_raw_data('games')), [1, 2, 3, 4])
+
+    def test_rewrites_are_idempotent(self):
+        recruiting = [{'year': 2023, 'rank': 1, 'team': 'Team A', 'points': 300.0}]
+        store_raw_data(recruiting, 'team_recruiting')
+        store_raw_data([dict(recruiting[0], points=310.0)], 'team_recruiting')
+        store_raw_data(self.games + self.games[:1], 'games')
+        store_raw_data(self.games[2:], 'games', year=2023)
+        self.assertEqual(fetch_raw_data('team_recruiting'), [dict(recruiting[0], points=310.0)])
+        self.assertEqual(sorted(game['id'] for game in fetch_raw_data('games')), [1, 2, 3, 4])
+
+    def test_identical_records_are_rejected_by_content_hash(self):
+        store_raw_data(self.games, 'games')
+        conn = create_connection()
+        before = conn.execute("SELECT id, content_hash FROM games ORDER BY id").fetchall()
+        self.assertEqual(len({content_hash for _, content_hash in before}), 4)
+        store_raw_data(self.games, 'games')
+        store_raw_data([dict(self.games[0], home_team='Team Z')], 'games')
+        after = conn.execute("SELECT id, content_hash FROM games ORDER BY id").fetchall()
+        self.assertEqual(after[1:], before[1:])
+        self.assertNotEqual(after[0], before[0])
+        with self.assertRaises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO games (id, content_hash) VALUES (9, ?)", (before[1][1],))
+        conn.rollback()
+
+    def test_legacy_tables_get_content_hashes(self):
+        conn = create_connection()
+        conn.execute("CREATE TABLE betting_lines (year INTEGER, data JSON)")
+        line = {'id': 1, 'season': 2023, 'week': 1, 'season_type': 'regular', 'lines': [{'provider': 'A', 'spread': -3.5}]}
+        conn.executemany("INSERT INTO betting_lines VALUES (?, ?)", [(2023, json.dumps(line))] * 2)
+        conn.commit()
+        store_raw_data([dict(line, id=2)], 'betting_lines')
+        hashes = [row[0] for row in conn.execute("SELECT content_hash FROM betting_lines ORDER BY id")]
+        self.assertEqual(len(hashes), 2)
+        self.assertTrue(all(isinstance(content_hash, bytes) and len(content_hash) == 16 for content_hash in hashes))
+        store_raw_data([line], 'betting_lines')
+        self.assertEqual(conn.execute("SELECT content_hash FROM betting_lines WHERE id = 1").fetchone()[0], hashes[0])
+
+    def test_migrate_content_hashes(self):
+        conn = create_connection()
+        conn.execute("CREATE TABLE games (year INTEGER, data JSON)")
+        rows = [(game['season'], json.dumps(game)) for game in self.games]
+        conn.executemany("INSERT INTO games VALUES (?, ?)", rows + rows[:1])
+        conn.commit()
+        # Reads leave the table as it is
+        self.assertEqual(len(read_raw_data('games', start_year=2022, end_year=2022)), 3)
+        self.assertEqual(get_last_update('games'), 2023)
+        self.assertNotIn('content_hash', [row[1] for row in conn.execute("PRAGMA table_info(games)")])
+        self.assertEqual(migrate_content_hashes(['games', 'team_talent']), {'games': 1, 'team_talent': 0})
+        warehouse.close_connection()
+        conn = create_connection()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM games WHERE content_hash IS NULL").fetchone()[0], 0)
+        store_raw_data(self.games, 'games')
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM games").fetchone()[0], 4)
+        self.assertEqual(migrate_content_hashes(['games']), {'games': 0})
+
+    def test_backfilled_hashes_match_stored_records(self):
+        rating = {'year': 2023, 'team': 'Team A', 'conference': 'SEC', 'fpi': 12, 'resume_ranks': None,
+                  'efficiencies': {'overall': 10.5, 'offense': 5, 'defense': 3.5, 'special_teams': None}}
+        store_raw_data([rating], 'fpi_ratings')
+        conn = create_connection()
+        stored_hash = conn.execute("SELECT content_hash FROM fpi_ratings").fetchone()[0]
+        # A typed table from before content hashes existed, backfilled from its rows
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(fpi_ratings)") if row[1] != 'content_hash']
+        conn.execute(f"CREATE TABLE fpi_ratings_old AS SELECT {', '.join(columns)} FROM fpi_ratings")
+        conn.execute("DROP TABLE fpi_ratings")
+        conn.execute("ALTER TABLE fpi_ratings_old RENAME TO fpi_ratings")
+        conn.commit()
+        migrate_content_hashes(['fpi_ratings'])
+        self.assertEqual(conn.execute("SELECT content_hash FROM fpi_ratings").fetchone()[0], stored_hash)
+        # The record fetched again is skipped rather than rewritten
+        before = conn.execute("SELECT total_changes()").fetchone()[0]
+        store_raw_data([rating], 'fpi_ratings')
+        self.assertEqual(conn.execute("SELECT total_changes()").fetchone()[0], before)
+
+    def test_legacy_duplicates_are_dropped_for_upserts(self):
+        conn = create_connection()
+        conn.execute("CREATE TABLE team_talent (year INTEGER, data JSON)")
+        talent = [{'year': 2023, 'school': 'Team A', 'talent': 900.0}, {'year': 2023, 'school': 'Team A', 'talent': 910.0}]
+        conn.executemany("INSERT INTO team_talent VALUES (?, ?)", [(2023, json.dumps(item)) for item in talent])
+        conn.commit()
+        store_raw_data([{'year': 2022, 'school': 'Team A', 'talent': 880.0}], 'team_talent')
+        store_raw_data([{'year': 2022, 'school': 'Team A', 'talent': 885.0}], 'team_talent')
+        self.assertEqual(sorted(item['talent'] for item in fetch_raw_data('team_talent')), [885.0, 910.0])
+
+    def test_last_update_uses_manifest(self):
+        store_raw_data(self.games[:2], 'games', year=2022)
+        self.assertEqual(get_last_update('games'), 2022)
+        record_fetch('games', 2023, WriteSummary(2, 'abc'), season_type='regular')
+        self.assertEqual(get_last_update('games'), 2023)
+        self.assertIsNone(get_last_update('team_talent'))
+
+    def test_last_update_of_table_without_season(self):
+        # Box scores carry no season, and no partition reached the manifest
+        store_team_game_stats([{'id': 1, 'teams': [{'school_id': 10, 'school': 'Team A', 'stats': []}]}], 'team_game_stats')
+        self.assertIsNone(get_last_update('team_game_stats'))
+        # Once their games are stored, the last season is that of the latest stored box score
+        store_raw_data(self.games, 'games')
+        self.assertEqual(get_last_update('team_game_stats'), 2022)
+        store_team_game_stats([{'id': 3, 'teams': []}], 'team_game_stats')
+        self.assertEqual(get_last_update('team_game_stats'), 2023)
+
+    def test_complete_partitions(self):
+        record_fetch('games', 2022, WriteSummary(2, 'abc'), season_type='regular')
+        record_fetch('games', 2022, WriteSummary(0, 'def'), season_type='postseason', complete=False)
+        record_fetch('team_talent', 2022, WriteSummary(1, 'ghi'))
+        self.assertEqual(get_complete_partitions('games'), {(2022, None, 'regular')})
+        self.assertEqual(get_complete_partitions('team_talent'), {(2022, None, None)})
+
+    def test_failed_units_checkpoint(self):
+        sec, acc = WorkUnit(2023, 'SEC', 'regular'), WorkUnit(2023, 'ACC', 'regular')
+        record_failed_units('games', [(sec, 'timeout'), (acc, 'timeout')])
+        record_failed_units('team_talent', [(WorkUnit(2022), 'timeout')])
+        self.assertEqual(get_failed_units('games'), {'games': [(2023, 'ACC', 'regular', None), (2023, 'SEC', 'regular', None)]})
+        clear_failed_units('games', [sec])
+        self.assertEqual(get_failed_units(), {
+            'games': [(2023, 'ACC', 'regular', None)],
+            'team_talent': [(2022, None, None, None)]
+        })
+
+if __name__ == '__main__':
+    unittest.main()